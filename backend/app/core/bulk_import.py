@@ -0,0 +1,208 @@
+"""
+Incremental parsing for bulk catalog imports.
+
+`iter_records` turns the request body, as an async stream of byte chunks, into
+`(line, record)` pairs one at a time: CSV (first row is the header) or NDJSON
+(one JSON object per line). Only the current record is held in memory, so the
+cost of an import does not depend on the size of the upload. `parse_row`
+validates a record into the dict `app/db/bulk_import.py` writes, or raises
+`RowError`; `ImportReport` collects counts and the first `IMPORT_MAX_ERRORS`
+row errors.
+"""
+import codecs
+import csv
+import json
+import math
+import re
+import time
+
+
+FORMATS = ("csv", "ndjson")
+COLUMNS = ("product_id", "product_name", "brand", "description", "color", "category_id", "price", "stock")
+MAX_RECORD_CHARS = 64 * 1024
+_LIMITS = {"product_name": 200, "brand": 100, "description": 1000, "color": 50}
+_CATEGORY_RE = re.compile(r"[A-Za-z0-9_-]{2,40}")
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(fmt: str | None, content_type: str | None) -> str | None:
+    if fmt:
+        fmt = fmt.strip().lower()
+        return fmt if fmt in FORMATS else None
+    ct = (content_type or "").split(";", 1)[0].strip().lower()
+    if ct in ("text/csv", "application/csv"):
+        return "csv"
+    if ct in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/jsonlines"):
+        return "ndjson"
+    return None
+
+
+async def _lines(chunks):
+    # decode incrementally; a line never straddles a yield
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    skipping = False
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        if skipping:
+            # rest of an oversized line that was already reported
+            end = pending.find("\n")
+            if end < 0:
+                pending = ""
+                continue
+            start, skipping = end + 1, False
+        while True:
+            end = pending.find("\n", start)
+            if end < 0:
+                break
+            yield pending[start:end + 1]
+            start = end + 1
+        pending = pending[start:]
+        if len(pending) > MAX_RECORD_CHARS:
+            # hand over the head of an oversized line so the caller reports it, drop the rest
+            yield pending
+            pending, skipping = "", True
+    pending += decoder.decode(b"", final=True)
+    if pending and not skipping:
+        yield pending
+
+
+async def iter_records(chunks, fmt: str):
+    """Yield `(line, dict)` per record, or `(line, RowError)` for records that do not parse.
+
+    A CSV header naming unknown columns raises `RowError` before any record.
+    """
+    line_no = 0
+    if fmt == "ndjson":
+        async for line in _lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            if len(line) > MAX_RECORD_CHARS:
+                yield line_no, RowError("record too long")
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_no, RowError("invalid JSON")
+                continue
+            yield line_no, (record if isinstance(record, dict) else RowError("expected a JSON object"))
+        return
+    header = None
+    record, first = "", 0
+    async for line in _lines(chunks):
+        line_no += 1
+        if not record:
+            first = line_no
+        record += line
+        # a quoted field may span lines; wait for its closing quote
+        if record.count('"') % 2 and len(record) <= MAX_RECORD_CHARS:
+            continue
+        text, record = record, ""
+        if len(text) > MAX_RECORD_CHARS:
+            yield first, RowError("record too long")
+            continue
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except (csv.Error, StopIteration):
+            yield first, RowError("invalid CSV")
+            continue
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            unknown = [h for h in header if h not in COLUMNS]
+            if unknown:
+                raise RowError(f"unknown column(s): {', '.join(unknown)}")
+            continue
+        if len(values) > len(header):
+            yield first, RowError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield first, dict(zip(header, values))
+    if record.strip():
+        yield first, RowError("unterminated quoted field")
+
+
+def _text(record: dict, key: str) -> str | None:
+    value = record.get(key)
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    limit = _LIMITS.get(key)
+    if limit and len(value) > limit:
+        raise RowError(f"{key} longer than {limit} characters")
+    return value
+
+
+def parse_row(record: dict) -> dict:
+    """Validate one record; raises `RowError` with a message for the caller."""
+    unknown = set(record) - set(COLUMNS)
+    if unknown:
+        raise RowError(f"unknown column(s): {', '.join(sorted(map(str, unknown)))}")
+    row = {key: _text(record, key) for key in ("product_name", "brand", "description", "color")}
+    pid = _text(record, "product_id")
+    try:
+        row["product_id"] = bytes.fromhex(pid) if pid else None
+    except ValueError:
+        raise RowError("invalid product_id")
+    if row["product_id"] is None and not row["product_name"]:
+        raise RowError("product_id or product_name is required")
+    category = _text(record, "category_id")
+    if category is not None and not _CATEGORY_RE.fullmatch(category):
+        raise RowError("invalid category_id")
+    row["category_key"] = category
+    price = _text(record, "price")
+    stock = _text(record, "stock")
+    try:
+        row["price"] = round(float(price), 2) if price is not None else None
+    except ValueError:
+        raise RowError("invalid price")
+    try:
+        row["stock"] = int(stock) if stock is not None else None
+    except ValueError:
+        raise RowError("invalid stock")
+    if row["price"] is not None and not (math.isfinite(row["price"]) and row["price"] >= 0):
+        raise RowError("price must be a non-negative number")
+    if row["stock"] is not None and row["stock"] < 0:
+        raise RowError("stock must be non-negative")
+    return row
+
+
+class ImportReport:
+    def __init__(self, max_errors: int) -> None:
+        self.max_errors = max(0, max_errors)
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.products_created = 0
+        self.listings_created = 0
+        self.listings_updated = 0
+        self.batches = 0
+        self.error_count = 0
+        self.errors: list[dict] = []
+
+    def error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def result(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "imported": self.rows - self.error_count,
+            "products_created": self.products_created,
+            "listings_created": self.listings_created,
+            "listings_updated": self.listings_updated,
+            "batches": self.batches,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+        }
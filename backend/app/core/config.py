@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 from pathlib import Path
 
 
@@ -45,6 +45,29 @@ class Settings(BaseSettings):
     # Verification policy
     require_user_verification: bool = False
 
+    # Search: FTS5 bm25 column weights (product_name, brand, description, color)
+    search_bm25_weights: List[float] = [10.0, 5.0, 1.0, 2.0]
+    # Search: trending score half-life and how often scores are written back
+    trending_half_life_hours: float = 24.0
+    trending_persist_seconds: float = 60.0
+    # Search history write-behind: queue bound, rows per insert batch, max wait before a flush
+    history_queue_size: int = 10000
+    history_batch_size: int = 200
+    history_flush_seconds: float = 1.0
+    # Search response cache (LRU + TTL); a TTL of 0 disables it
+    query_cache_size: int = 1024
+    query_cache_ttl_seconds: float = 30.0
+    # Shop ranking (sort=best): feature weights and how often static shop features reload
+    shop_rank_weights: Dict[str, float] = {"distance": 3.0, "price": 3.0, "stock": 1.0, "rating": 1.0, "open": 2.0}
+    shop_rank_refresh_seconds: float = 300.0
+    # Search synonym groups and unit aliases, compiled at startup
+    search_synonyms_file: str = str(Path(__file__).resolve().parent.parent / "data" / "search_synonyms.txt")
+
+    # Cache-Control max-age for ETag-tagged GET endpoints; 0 makes clients revalidate every time
+    http_cache_max_age_seconds: int = 0
+    # Bulk catalog import: rows per transaction, row errors listed in the response
+    import_batch_size: int = 500
+    import_max_errors: int = 1000
     # Pydantic v2-style settings config; load env from backend/.env regardless of CWD
     model_config = SettingsConfigDict(
         env_file=str(Path(__file__).resolve().parent.parent.parent / ".env"),
@@ -0,0 +1,62 @@
+"""
+Facet counts for search results.
+
+A `FacetCounter` is fed every matching row while the ranked endpoints stream
+their results, so brand/color/category/price-bucket counts for the whole match
+set come out of the same pass that ranks it, with no extra queries. Values are
+grouped case-insensitively and shown as first seen; prices use the product's
+minimum listed price from `Product_Search_Doc`.
+"""
+PRICE_EDGES = (100, 500, 1000, 5000, 10000)
+MAX_VALUES = 20
+
+
+def price_bucket(price) -> int | None:
+    if price is None:
+        return None
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    for i, edge in enumerate(PRICE_EDGES):
+        if price < edge:
+            return i
+    return len(PRICE_EDGES)
+
+
+class FacetCounter:
+    def __init__(self) -> None:
+        self.product_ids: set = set()
+        self._values = {"brand": {}, "color": {}, "category": {}}
+        self._prices = [0] * (len(PRICE_EDGES) + 1)
+
+    def add(self, product_id, brand, color, category, price) -> None:
+        if product_id in self.product_ids:
+            return
+        self.product_ids.add(product_id)
+        for name, value in (("brand", brand), ("color", color), ("category", category)):
+            value = (value or "").strip()
+            if not value:
+                continue
+            counts = self._values[name]
+            cur = counts.get(value.casefold())
+            if cur is None:
+                counts[value.casefold()] = [value, 1]
+            else:
+                cur[1] += 1
+        bucket = price_bucket(price)
+        if bucket is not None:
+            self._prices[bucket] += 1
+
+    def result(self) -> dict:
+        out = {}
+        for name, counts in self._values.items():
+            ranked = sorted(counts.values(), key=lambda vc: (-vc[1], vc[0].casefold()))
+            out[name] = [{"value": v, "count": c} for v, c in ranked[:MAX_VALUES]]
+        edges = (0,) + PRICE_EDGES + (None,)
+        out["price"] = [
+            {"min": edges[i], "max": edges[i + 1], "count": n}
+            for i, n in enumerate(self._prices)
+            if n
+        ]
+        return out
@@ -0,0 +1,143 @@
+"""
+Vectorized distance engine over shop coordinates.
+
+Coordinates live in contiguous float64 arrays (radians, plus a cached cos(lat))
+with parallel arrays of `Shop_Address.rowid` and `shop_id`. A radius or k-nearest
+query is a single NumPy pass over those arrays. Rows are upserted one at a time
+as addresses are written, so the arrays are built once at startup and never
+rebuilt per request.
+"""
+import logging
+
+import numpy as np
+from sqlalchemy import text
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class GeoEngine:
+    def __init__(self, capacity: int = 1024) -> None:
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lon = np.empty(capacity, dtype=np.float64)
+        self._coslat = np.empty(capacity, dtype=np.float64)
+        self._address_ids: list[int] = []
+        self._shop_ids: list = []
+        self._pos: dict[int, int] = {}
+        self._n = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return self._n
+
+    def clear(self) -> None:
+        self._address_ids.clear()
+        self._shop_ids.clear()
+        self._pos.clear()
+        self._n = 0
+
+    def _grow(self) -> None:
+        cap = max(len(self._lat) * 2, 1024)
+        for name in ("_lat", "_lon", "_coslat"):
+            arr = np.empty(cap, dtype=np.float64)
+            arr[: self._n] = getattr(self, name)[: self._n]
+            setattr(self, name, arr)
+
+    def upsert(self, address_id: int, shop_id, lat, lon) -> None:
+        if lat is None or lon is None:
+            self.remove(address_id)
+            return
+        if isinstance(shop_id, memoryview):
+            shop_id = bytes(shop_id)
+        lat_r = np.radians(float(lat))
+        lon_r = np.radians(float(lon))
+        i = self._pos.get(address_id)
+        if i is None:
+            if self._n == len(self._lat):
+                self._grow()
+            i = self._n
+            self._n += 1
+            self._pos[address_id] = i
+            self._address_ids.append(address_id)
+            self._shop_ids.append(shop_id)
+        else:
+            self._shop_ids[i] = shop_id
+        self._lat[i] = lat_r
+        self._lon[i] = lon_r
+        self._coslat[i] = np.cos(lat_r)
+
+    def remove(self, address_id: int) -> None:
+        i = self._pos.pop(address_id, None)
+        if i is None:
+            return
+        last = self._n - 1
+        if i != last:
+            # move the last row into the hole to keep the arrays dense
+            self._lat[i] = self._lat[last]
+            self._lon[i] = self._lon[last]
+            self._coslat[i] = self._coslat[last]
+            self._address_ids[i] = self._address_ids[last]
+            self._shop_ids[i] = self._shop_ids[last]
+            self._pos[self._address_ids[i]] = i
+        self._address_ids.pop()
+        self._shop_ids.pop()
+        self._n = last
+
+    def distances(self, lat: float, lon: float) -> np.ndarray:
+        n = self._n
+        lat0 = np.radians(float(lat))
+        lon0 = np.radians(float(lon))
+        a = (
+            np.sin((self._lat[:n] - lat0) / 2.0) ** 2
+            + np.cos(lat0) * self._coslat[:n] * np.sin((self._lon[:n] - lon0) / 2.0) ** 2
+        )
+        return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def within(self, lat: float, lon: float, radius_km: float | None = None, k: int | None = None) -> list[tuple[int, object, float]]:
+        """Return `(address_id, shop_id, distance_km)` nearest first, limited by radius and/or k."""
+        if self._n == 0:
+            return []
+        dist = self.distances(lat, lon)
+        if radius_km is not None:
+            idx = np.flatnonzero(dist <= radius_km)
+        else:
+            idx = np.arange(self._n)
+        if k is not None and 0 < k < len(idx):
+            idx = idx[np.argpartition(dist[idx], k - 1)[:k]]
+        idx = idx[np.argsort(dist[idx], kind="stable")]
+        return [(self._address_ids[i], self._shop_ids[i], float(dist[i])) for i in idx]
+
+
+geo_engine = GeoEngine()
+
+
+async def load_geo_engine(conn) -> None:
+    geo_engine.clear()
+    geo_engine.loaded = False
+    try:
+        rows = (await conn.exec_driver_sql(
+            "SELECT rowid, shop_id, latitude, longitude FROM Shop_Address "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )).all()
+    except Exception:
+        # nearby lookups stay on the R*Tree (app/db/geo.py) until the next load
+        logging.exception("geo engine not loaded; nearby lookups use the R*Tree index")
+        return
+    for rid, sid, lat, lon in rows:
+        try:
+            geo_engine.upsert(rid, sid, float(lat), float(lon))
+        except (TypeError, ValueError):
+            continue
+    geo_engine.loaded = True
+
+
+async def refresh_shop_location(db, shop_id) -> None:
+    # pick up inserted/updated Shop_Address rows for one shop
+    rows = (await db.execute(
+        text("SELECT rowid, shop_id, latitude, longitude FROM Shop_Address WHERE shop_id = :sid"),
+        {"sid": shop_id},
+    )).all()
+    for rid, sid, lat, lon in rows:
+        try:
+            geo_engine.upsert(rid, sid, lat, lon)
+        except (TypeError, ValueError):
+            geo_engine.remove(rid)
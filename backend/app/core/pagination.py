@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last item on the previous page, JSON-encoded and
+base64url-wrapped so clients treat it as opaque. Plain listings page in SQL with
+`WHERE (created_at, id) < cursor ORDER BY created_at DESC, id DESC LIMIT n + 1`
+(listings whose id is not unique add their row's primary key as a last column);
+ranked results page on their `(score, id)` tuple (see `app.core.ranking`).
+Either way the next page is found by seeking past the cursor, so page 100
+costs the same as page 1.
+
+Endpoints keep returning a bare list when called without `limit`/`cursor`;
+with either, they return `{"items": [...], "next_cursor": str | None}`.
+"""
+import base64
+import json
+
+from fastapi import HTTPException
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _to_json(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b": bytes(value).hex()}
+    if isinstance(value, (tuple, list)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def _from_json(value):
+    if isinstance(value, dict) and "$b" in value:
+        return bytes.fromhex(value["$b"])
+    if isinstance(value, list):
+        return tuple(_from_json(v) for v in value)
+    return value
+
+
+def encode_cursor(key) -> str:
+    raw = json.dumps(_to_json(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = _from_json(json.loads(base64.urlsafe_b64decode(padded.encode("ascii"))))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, tuple):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def is_paginated(limit: int | None, cursor: str | None) -> bool:
+    return limit is not None or bool(cursor)
+
+
+def page_size(limit: int | None) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def keyset_where(columns: tuple[str, ...], key: tuple | None, prefix: str = "ks") -> tuple[str, dict]:
+    """SQL predicate selecting rows strictly after `key` in DESC order of `columns`.
+
+    The last column must make the order total (a primary key), or rows sharing a
+    key can be skipped at a page boundary.
+    """
+    if key is None:
+        return "", {}
+    if len(key) != len(columns):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # (c1 < k1) OR (c1 = k1 AND c2 < k2) OR (c1 = k1 AND c2 = k2 AND c3 < k3) ...
+    terms = []
+    for i, col in enumerate(columns):
+        equal = [f"{columns[j]} = :{prefix}{j}" for j in range(i)]
+        terms.append("(" + " AND ".join(equal + [f"{col} < :{prefix}{i}"]) + ")")
+    return (
+        "(" + " OR ".join(terms) + ")",
+        {f"{prefix}{i}": v for i, v in enumerate(key)},
+    )
+
+
+def trim_page(rows: list, limit: int, key_fn) -> tuple[list, str | None]:
+    # callers fetch limit + 1 rows; the extra one only signals that more exist
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key_fn(rows[-1]))
+    return rows, None
+
+
+def respond(items: list, next_cursor: str | None, paginated: bool):
+    if not paginated:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
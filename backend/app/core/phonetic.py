@@ -0,0 +1,56 @@
+"""
+Phonetic keys for product names typed the way they sound.
+
+A Metaphone-style code tuned for Indian English transliteration: aspirated
+digraphs fold into their plain consonant (bh/dh/kh/gh/th/ph -> b/d/k/g/t/f), the
+sibilants, j/z, v/w and c/k/q pairs are merged, doubled letters collapse, and
+vowels after the first letter are dropped. "surf" and "sarf" both give SRF,
+"maggi" and "maggie" MG, "atta" and "aata" AT, "dhania" and "dhaniya" DN.
+"""
+import re
+
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+_VOWELS = set("aeiouy")
+MAX_KEY = 6
+
+# applied in order; earlier, longer patterns win over the single letters below
+_RULES = [
+    (re.compile(r"chh|ch|tch"), "C"),
+    (re.compile(r"sch|sh"), "S"),
+    (re.compile(r"ph"), "F"),
+    (re.compile(r"ck"), "K"),
+    (re.compile(r"([bdgjkpt])h"), lambda m: m.group(1).upper()),
+    (re.compile(r"c(?=[eiy])"), "S"),
+    (re.compile(r"x"), "KS"),
+    (re.compile(r"[cqk]"), "K"),
+    (re.compile(r"[zj]"), "J"),
+    (re.compile(r"[vw]"), "V"),
+]
+
+
+def phonetic_key(word: str | None) -> str:
+    w = "".join(_WORD_RE.findall((word or "").lower()))
+    if not w:
+        return ""
+    for pattern, repl in _RULES:
+        w = pattern.sub(repl, w)
+    collapsed = [w[0]]
+    for ch in w[1:]:
+        if ch.lower() != collapsed[-1].lower():
+            collapsed.append(ch)
+    first = "A" if collapsed[0] in _VOWELS else collapsed[0].upper()
+    rest = [ch.upper() for ch in collapsed[1:] if ch not in _VOWELS and ch != "h"]
+    return (first + "".join(rest))[:MAX_KEY]
+
+
+def phonetic_keys(value: str | None) -> set[str]:
+    """Keys of every word of `value` long enough to be worth matching."""
+    out = set()
+    for word in _WORD_RE.findall((value or "").lower()):
+        if len(word) < 3:
+            continue
+        key = phonetic_key(word)
+        if len(key) >= 2:
+            out.add(key)
+    return out
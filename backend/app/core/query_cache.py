@@ -0,0 +1,158 @@
+"""
+Bounded LRU + TTL cache for search responses.
+
+Entries are keyed on the endpoint name plus its normalized query parameters.
+Each entry remembers the product ids it contains and a few tags (e.g. "catalog",
+"city:indore"), with reverse maps from both, so a write touching one product
+drops only the cached responses that include it. Writes that can add a product
+to arbitrary results (creating a product, listing it in a shop) drop by tag:
+responses filtered on listings (price, stock) carry "listing", and those scoped
+to a city carry that city's tag instead.
+"""
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+
+CATALOG_TAG = "catalog"
+LISTING_TAG = "listing"
+
+
+def normalize_query(q: str | None) -> str:
+    return " ".join((q or "").lower().split())
+
+
+def city_tag(city: str | None) -> str:
+    return f"city:{normalize_query(city)}"
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0) -> None:
+        self.max_entries = max(max_entries, 1)
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._by_product: dict[object, set] = {}
+        self._by_tag: dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value, _, _ = entry
+        if expires < time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, product_ids=(), tags=()) -> None:
+        if self.ttl <= 0:
+            return
+        if key in self._entries:
+            self._drop(key)
+        pids = frozenset(bytes(p) if isinstance(p, memoryview) else p for p in product_ids)
+        tags = frozenset(tags)
+        self._entries[key] = (time.monotonic() + self.ttl, value, pids, tags)
+        for pid in pids:
+            self._by_product.setdefault(pid, set()).add(key)
+        for tag in tags:
+            self._by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, _, pids, tags = entry
+        for pid in pids:
+            keys = self._by_product.get(pid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_product[pid]
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate_products(self, *product_ids) -> int:
+        keys = set()
+        for pid in product_ids:
+            if isinstance(pid, memoryview):
+                pid = bytes(pid)
+            keys |= self._by_product.get(pid, set())
+        for key in keys:
+            self._drop(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def invalidate_tags(self, *tags: str) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self._by_tag.get(tag, set())
+        for key in keys:
+            self._drop(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_product.clear()
+        self._by_tag.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+query_cache = QueryCache(settings.query_cache_size, settings.query_cache_ttl_seconds)
+
+
+def invalidate_new_product() -> None:
+    # a new product can match any cached query
+    query_cache.invalidate_tags(CATALOG_TAG)
+
+
+async def invalidate_listing(db, shop_id, *product_ids) -> None:
+    # Shop_Product rows changed: drop responses holding the products, plus the
+    # in-city listings of the shop's cities and the price/stock filtered searches
+    # where they may have just appeared
+    query_cache.invalidate_products(*product_ids)
+    try:
+        rows = (await db.execute(text(
+            "SELECT s.city, a.city FROM Shops s LEFT JOIN Shop_Address a ON a.shop_id = s.shop_id WHERE s.shop_id = :sid"
+        ), {"sid": shop_id})).all()
+    except Exception:
+        query_cache.invalidate_tags(CATALOG_TAG)
+        return
+    query_cache.invalidate_tags(LISTING_TAG, *{city_tag(c) for row in rows for c in row if c})
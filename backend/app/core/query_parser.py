@@ -0,0 +1,95 @@
+"""
+Structured product queries.
+
+`parse_query("red nike brand:puma price:<500 city:indore instock")` splits a
+search box string into free text plus field filters:
+
+- `brand:`, `color:`, `category:`, `city:` take a word or a "quoted phrase"
+- `price:<500`, `price:<=500`, `price:>100`, `price:>=100`, `price:100-500`
+  (a bare `price:500` means at most 500); `under 500` / `below 500` and
+  `above 500` / `over 500` are read the same way
+- `instock` (or `in:stock`) keeps products some shop has stock of
+
+Anything it does not recognise stays in the free text.
+"""
+import re
+from dataclasses import dataclass, field
+
+
+_FIELD_RE = re.compile(r'(?<!\S)(brand|color|colour|category|cat|city|price):(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+_INSTOCK_RE = re.compile(r"(?<!\S)(instock|in:stock|in-stock)(?!\S)", re.IGNORECASE)
+_NATURAL_PRICE_RE = re.compile(
+    r"(?<!\S)(under|below|upto|up to|above|over)\s+(?:rs\.?\s*|₹\s*)?(\d+(?:\.\d+)?)(?!\S)", re.IGNORECASE
+)
+_PRICE_RE = re.compile(r"^(<=|>=|<|>)?\s*(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?$")
+
+_ALIASES = {"colour": "color", "cat": "category"}
+
+
+@dataclass
+class ParsedQuery:
+    text: str = ""
+    brand: str | None = None
+    color: str | None = None
+    category: str | None = None
+    city: str | None = None
+    prices: list[tuple[str, float]] = field(default_factory=list)
+    instock: bool = False
+    qualifiers: list[str] = field(default_factory=list)
+
+    @property
+    def has_filters(self) -> bool:
+        return bool(self.brand or self.color or self.category or self.city or self.prices or self.instock)
+
+    @property
+    def needs_listing(self) -> bool:
+        # filters answered from Shop_Product / Shop_Address rather than Products
+        return bool(self.city or self.prices or self.instock)
+
+
+def _parse_price(value: str) -> list[tuple[str, float]]:
+    m = _PRICE_RE.match(value.strip().replace("₹", ""))
+    if not m:
+        return []
+    op, lo, hi = m.groups()
+    if hi is not None:
+        return [(">=", float(lo)), ("<=", float(hi))]
+    return [(op or "<=", float(lo))]
+
+
+def parse_query(q: str | None) -> ParsedQuery:
+    parsed = ParsedQuery()
+    rest = q or ""
+
+    def _field(m: re.Match) -> str:
+        name = _ALIASES.get(m.group(1).lower(), m.group(1).lower())
+        value = (m.group(2) if m.group(2) is not None else m.group(3)).strip()
+        if not value:
+            return m.group(0)
+        if name == "price":
+            prices = _parse_price(value)
+            if not prices:
+                return m.group(0)
+            parsed.prices.extend(prices)
+        else:
+            setattr(parsed, name, value)
+        parsed.qualifiers.append(m.group(0))
+        return " "
+
+    def _natural(m: re.Match) -> str:
+        word = m.group(1).lower()
+        op = ">=" if word in ("above", "over") else "<="
+        parsed.prices.append((op, float(m.group(2))))
+        parsed.qualifiers.append(m.group(0))
+        return " "
+
+    def _instock(m: re.Match) -> str:
+        parsed.instock = True
+        parsed.qualifiers.append(m.group(0))
+        return " "
+
+    rest = _FIELD_RE.sub(_field, rest)
+    rest = _NATURAL_PRICE_RE.sub(_natural, rest)
+    rest = _INSTOCK_RE.sub(_instock, rest)
+    parsed.text = " ".join(rest.split())
+    return parsed
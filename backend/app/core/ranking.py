@@ -0,0 +1,56 @@
+"""
+Bounded top-K selection shared by the ranked search endpoints.
+
+Rows are pushed straight from the DB cursor as `(key, seq, row)` tuples, where
+`key` is the sort key (score first, id last) that also serves as the page cursor.
+Only the best `limit + 1` survive on a min-heap, so the work per extra row is one
+comparison, and callers build response dicts for the winners alone. Without
+`limit`/`cursor` every row is kept and sorted, matching the unpaginated endpoints.
+"""
+import heapq
+
+from fastapi import HTTPException
+
+from app.core.pagination import decode_cursor, encode_cursor, page_size
+
+
+class TopK:
+    def __init__(self, limit: int | None = None, cursor: str | None = None) -> None:
+        self.after = decode_cursor(cursor)
+        self.limit = None if (limit is None and self.after is None) else page_size(limit)
+        self.scanned = 0
+        self._heap: list[tuple] = []
+        self._seq = 0
+
+    def push(self, key: tuple, row) -> None:
+        self.scanned += 1
+        if self.after is not None:
+            try:
+                if not key < self.after:
+                    return
+            except TypeError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        # -seq: among equal keys the row seen first ranks first
+        self._seq += 1
+        item = (key, -self._seq, row)
+        if self.limit is None:
+            self._heap.append(item)
+        elif len(self._heap) <= self.limit:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def page(self) -> tuple[list[tuple], str | None]:
+        """Return the winners as `(key, row)` best first, and the next cursor."""
+        ranked = sorted(self._heap, reverse=True)
+        next_cursor = None
+        if self.limit is not None and len(ranked) > self.limit:
+            ranked = ranked[: self.limit]
+            next_cursor = encode_cursor(ranked[-1][0])
+        return [(key, row) for key, _, row in ranked], next_cursor
+
+    def stats_header(self, returned: int) -> str:
+        return f"scanned={self.scanned}; returned={returned}"
+
+
+STATS_HEADER = "X-Search-Rows"
@@ -0,0 +1,23 @@
+"""
+In-memory search structures a new product has to join.
+
+Every product create path calls `products_created` after its commit, so the
+trigram, autocomplete and spelling indexes pick the product up at once instead
+of at the next restart, and cached searches it may now belong to are dropped.
+Phonetic keys are rows in the database and are written inside the transaction
+(`app/db/phonetic.py`), not here.
+"""
+from app.core.query_cache import invalidate_new_product
+from app.core.spelling import learn_product
+from app.core.suggest import suggest_product
+from app.core.trigram import index_product
+
+
+def products_created(*products) -> None:
+    """Register `(product_id, product_name, brand)` tuples that were just committed."""
+    for pid, name, brand in products:
+        index_product(pid, name, brand)
+        suggest_product(name, brand)
+        learn_product(name, brand)
+    if products:
+        invalidate_new_product()
@@ -0,0 +1,174 @@
+"""
+Multi-factor shop ranking for `sort=best`.
+
+Per-shop static features (review rating and the weekly opening schedule) are
+loaded into NumPy arrays at startup and reloaded once they are older than
+`SHOP_RANK_REFRESH_SECONDS`. A request only supplies the dynamic features of its
+candidates (distance, price, stock); open-now is evaluated for all of them with
+one mask over the schedule arrays, and the weighted score is a single vectorized
+expression. Every feature is scaled to [0, 1] with 1 best; a feature a request
+does not have (no location, no price) drops out of the weighted mean.
+
+There are no shop reviews, so a shop's rating is the average review rating of
+the products it lists.
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+import pytz
+from sqlalchemy import text
+
+from app.core.config import settings
+
+
+FEATURES = ("distance", "price", "stock", "rating", "open")
+SORTS = ("best",)
+_DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_TZ = pytz.timezone("Asia/Kolkata")
+STOCK_CAP = 10
+
+
+def _minutes(value) -> int:
+    # "10:00:00.000000" / time objects -> minutes after midnight, -1 when closed or unknown
+    if value is None:
+        return -1
+    if hasattr(value, "hour"):
+        return value.hour * 60 + value.minute
+    try:
+        hh, mm = str(value).split(":")[:2]
+        return int(hh) * 60 + int(mm)
+    except ValueError:
+        return -1
+
+
+def _scaled(values: np.ndarray, lower_is_better: bool) -> np.ndarray:
+    """Min-max scale to [0, 1] over the finite entries; missing values score 0."""
+    out = np.zeros(len(values))
+    ok = np.isfinite(values)
+    if not ok.any():
+        return out
+    lo, hi = values[ok].min(), values[ok].max()
+    if hi > lo:
+        frac = (values[ok] - lo) / (hi - lo)
+        out[ok] = 1.0 - frac if lower_is_better else frac
+    else:
+        out[ok] = 1.0
+    return out
+
+
+class ShopFeatures:
+    def __init__(self) -> None:
+        self._pos: dict = {}
+        self._rating = np.empty(0)
+        self._open = np.empty((0, 7), dtype=np.int32)
+        self._close = np.empty((0, 7), dtype=np.int32)
+        self.loaded_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def stale(self) -> bool:
+        return time.monotonic() - self.loaded_at > settings.shop_rank_refresh_seconds
+
+    async def load(self, conn) -> None:
+        # `conn` is an AsyncConnection at startup and an AsyncSession on reload
+        shop_ids = [sid for (sid,) in (await conn.execute(text("SELECT shop_id FROM Shops"))).all()]
+        pos = {bytes(sid) if isinstance(sid, memoryview) else sid: i for i, sid in enumerate(shop_ids)}
+        rating = np.full(len(pos), np.nan)
+        opens = np.full((len(pos), 7), -1, dtype=np.int32)
+        closes = np.full((len(pos), 7), -1, dtype=np.int32)
+        for sid, avg in (await conn.execute(text(
+            "SELECT sp.shop_id, AVG(r.rating) FROM Shop_Product sp "
+            "JOIN Product_Reviews r ON r.product_id = sp.product_id GROUP BY sp.shop_id"
+        ))).all():
+            i = pos.get(sid)
+            if i is not None and avg is not None:
+                rating[i] = float(avg)
+        for sid, day, open_time, close_time in (await conn.execute(text(
+            "SELECT shop_id, day, open_time, close_time FROM Shop_Timings"
+        ))).all():
+            i = pos.get(sid)
+            d = _DAYS.index(day.strip().lower()) if (day or "").strip().lower() in _DAYS else None
+            if i is None or d is None:
+                continue
+            opens[i, d] = _minutes(open_time)
+            closes[i, d] = _minutes(close_time)
+        self._pos, self._rating, self._open, self._close = pos, rating, opens, closes
+        self.loaded_at = time.monotonic()
+
+    def _rows(self, shop_ids) -> np.ndarray:
+        return np.array([self._pos.get(bytes(s) if isinstance(s, memoryview) else s, -1) for s in shop_ids], dtype=np.int64)
+
+    def open_now(self, shop_ids, now: datetime | None = None) -> np.ndarray:
+        now = now or datetime.now(_TZ)
+        rows = self._rows(shop_ids)
+        if not self._pos:
+            return np.zeros(len(rows), dtype=bool)
+        known = rows >= 0
+        day, minute = now.weekday(), now.hour * 60 + now.minute
+        o = np.where(known, self._open[rows, day], -1)
+        c = np.where(known, self._close[rows, day], -1)
+        same_day = (o <= c) & (o <= minute) & (minute <= c)
+        overnight = (o > c) & ((minute >= o) | (minute <= c))
+        return (o >= 0) & (c >= 0) & (same_day | overnight)
+
+    def rating(self, shop_ids) -> np.ndarray:
+        rows = self._rows(shop_ids)
+        if not self._pos:
+            return np.full(len(rows), np.nan)
+        return np.where(rows >= 0, self._rating[rows], np.nan)
+
+    def score(self, shop_ids, distance=None, price=None, stock=None, now: datetime | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return `(score, open_now)` arrays for the candidates, in input order."""
+        n = len(shop_ids)
+        is_open = self.open_now(shop_ids, now)
+        rating = self.rating(shop_ids)
+        parts = {
+            "open": is_open.astype(float),
+            # unrated shops sit in the middle of the 1-5 scale
+            "rating": np.where(np.isfinite(rating), (rating - 1.0) / 4.0, 0.5),
+        }
+        if distance is not None:
+            parts["distance"] = _scaled(np.asarray(distance, dtype=float), lower_is_better=True)
+        if price is not None:
+            parts["price"] = _scaled(np.asarray(price, dtype=float), lower_is_better=True)
+        if stock is not None:
+            parts["stock"] = np.clip(np.nan_to_num(np.asarray(stock, dtype=float)), 0, STOCK_CAP) / STOCK_CAP
+        weights = settings.shop_rank_weights
+        total = np.zeros(n)
+        weight_sum = 0.0
+        for name, values in parts.items():
+            w = float(weights.get(name, 0.0))
+            if w > 0:
+                total += w * values
+                weight_sum += w
+        return (total / weight_sum if weight_sum else total), is_open
+
+
+shop_features = ShopFeatures()
+
+
+async def load_shop_features(conn) -> None:
+    await shop_features.load(conn)
+
+
+async def ensure_shop_features(db) -> ShopFeatures:
+    if shop_features.stale():
+        await shop_features.load(db)
+    return shop_features
+
+
+async def rank_best(db, items: list[dict], shop_ids: list, **dynamic) -> list[dict]:
+    """Attach `score` and `is_open` to `items` and return them best first.
+
+    Ties keep the incoming order, so callers pass items in their default sort.
+    """
+    if not items:
+        return items
+    features = await ensure_shop_features(db)
+    score, is_open = features.score(shop_ids, **dynamic)
+    for item, s, o in zip(items, score, is_open):
+        item["score"] = round(float(s), 4)
+        item["is_open"] = bool(o)
+    return sorted(items, key=lambda x: -x["score"])
@@ -0,0 +1,108 @@
+"""
+Request coalescing (single-flight) for read endpoints.
+
+`@coalesce` keys each call on the endpoint and its query/path arguments, leaving
+out the DB session, request and response objects. The first caller for a key
+runs the endpoint; identical calls that arrive while it is still running await
+the same future and get its result, or its exception, instead of repeating the
+DB work. Headers the leader set on its `response` are copied to each follower's,
+except CORS headers, which depend on the caller's origin.
+
+Only endpoints without side effects and without per-user dependencies should be
+decorated: calls whose arguments are not plain hashable values (an authenticated
+owner, an upload) simply run on their own.
+"""
+import asyncio
+import functools
+import inspect
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+_SKIP_TYPES = (AsyncSession, Request, Response)
+_PLAIN_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def _counter(self, name: str) -> dict[str, int]:
+        return self._stats.setdefault(name, {"executions": 0, "coalesced": 0, "errors": 0})
+
+    async def run(self, name: str, key: tuple, call, response: Response | None):
+        fut = self._inflight.get(key)
+        if fut is not None:
+            try:
+                result, headers = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # the leader was cancelled (client went away); do the work ourselves
+                return await self.run(name, key, call, response)
+            self._counter(name)["coalesced"] += 1
+            if response is not None:
+                for k, v in headers:
+                    response.headers[k] = v
+            return result
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        stats = self._counter(name)
+        stats["executions"] += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            stats["errors"] += 1
+            fut.set_exception(e)
+            # followers re-raise it; mark it retrieved so a lone leader does not log it
+            fut.exception()
+            raise
+        else:
+            headers = []
+            if response is not None:
+                headers = [(k, v) for k, v in response.headers.items() if not k.lower().startswith("access-control-")]
+            fut.set_result((result, headers))
+            return result
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executions": sum(s["executions"] for s in self._stats.values()),
+            "coalesced": sum(s["coalesced"] for s in self._stats.values()),
+            "endpoints": {name: dict(s) for name, s in sorted(self._stats.items())},
+        }
+
+
+single_flight = SingleFlight()
+
+
+def coalesce(func):
+    sig = inspect.signature(func)
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key_parts = []
+        response = None
+        for arg, value in bound.arguments.items():
+            if isinstance(value, Response):
+                response = value
+            if isinstance(value, _SKIP_TYPES):
+                continue
+            if not isinstance(value, _PLAIN_TYPES):
+                return await func(*args, **kwargs)
+            key_parts.append((arg, value))
+        key = (name, tuple(key_parts))
+        return await single_flight.run(name, key, lambda: func(*args, **kwargs), response)
+
+    return wrapper
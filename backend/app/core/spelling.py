@@ -0,0 +1,133 @@
+"""
+"Did you mean" suggestions using symmetric-delete lookup (SymSpell).
+
+Every vocabulary word from product names, brands and category names is stored
+together with all strings obtained by deleting up to `max_distance` characters
+from its first `prefix_length` characters. A misspelled query word generates its
+own deletes the same way, and any shared delete names a candidate, so finding
+corrections is a handful of dict lookups rather than an edit distance against
+every word. Candidates are then verified with a bounded Damerau-Levenshtein
+distance and ranked by (distance, -frequency).
+"""
+import re
+from itertools import combinations
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def words(value: str | None) -> list[str]:
+    return _WORD_RE.findall((value or "").lower())
+
+
+def _has_digit(word: str) -> bool:
+    return any(c.isdigit() for c in word)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            row_min = min(row_min, v)
+        if row_min > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= max_distance else max_distance + 1
+
+
+class SpellDictionary:
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7) -> None:
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._counts: dict[str, int] = {}
+        self._deletes: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def clear(self) -> None:
+        self._counts.clear()
+        self._deletes.clear()
+
+    def _variants(self, word: str) -> set[str]:
+        key = word[: self.prefix_length]
+        out = {key}
+        for d in range(1, min(self.max_distance, len(key) - 1) + 1):
+            for drop in combinations(range(len(key)), d):
+                out.add("".join(c for i, c in enumerate(key) if i not in drop))
+        return out
+
+    def add_word(self, word: str, count: int = 1) -> None:
+        if len(word) < 3 or _has_digit(word):
+            return
+        if word in self._counts:
+            self._counts[word] += count
+            return
+        self._counts[word] = count
+        for v in self._variants(word):
+            self._deletes.setdefault(v, set()).add(word)
+
+    def add_text(self, value: str | None) -> None:
+        for w in words(value):
+            self.add_word(w)
+
+    def _allowed(self, word: str) -> int:
+        # short words tolerate one edit, longer ones max_distance
+        return 1 if len(word) <= 4 else self.max_distance
+
+    def correct_word(self, word: str) -> str:
+        # sizes like "5000g" are quantities, not misspellings
+        if word in self._counts or len(word) < 3 or _has_digit(word):
+            return word
+        allowed = self._allowed(word)
+        candidates: set[str] = set()
+        for v in self._variants(word):
+            candidates |= self._deletes.get(v, set())
+        best = None
+        for cand in candidates:
+            d = edit_distance(word, cand, allowed)
+            if d > allowed:
+                continue
+            rank = (d, -self._counts[cand], cand)
+            if best is None or rank < best:
+                best = rank
+        return best[2] if best else word
+
+    def suggest(self, q: str | None) -> str | None:
+        """Return the corrected query, or None when every word is already known."""
+        tokens = words(q)
+        corrected = [self.correct_word(t) for t in tokens]
+        if corrected == tokens:
+            return None
+        return " ".join(corrected)
+
+
+spelling = SpellDictionary()
+
+
+def learn_product(product_name: str | None, brand: str | None) -> None:
+    spelling.add_text(product_name)
+    spelling.add_text(brand)
+
+
+async def load_spelling(conn) -> None:
+    spelling.clear()
+    for name, brand in (await conn.exec_driver_sql("SELECT product_name, brand FROM Products")).all():
+        learn_product(name, brand)
+    for (name,) in (await conn.exec_driver_sql("SELECT category_name FROM Product_Categories")).all():
+        spelling.add_text(name)
+    # synonyms are valid search words even when no product name uses them
+    from app.core.synonyms import synonyms
+    for term in synonyms.terms():
+        spelling.add_text(term)
@@ -0,0 +1,207 @@
+"""
+Prefix autocomplete over product names, brands, category names and shop names.
+
+Instead of a pointer-per-character trie the index keeps one sorted list of
+normalized keys, which is the flattened leaf order of a trie: every prefix maps
+to a contiguous slice found with two bisects. Weights live in a parallel
+`array('d')` and a segment tree of leaf positions answers "heaviest entry in a
+slice" in O(log n), so the top-K completions of any prefix cost O(k log n)
+however many names share it. A million names take roughly 100 MB, mostly
+the key and display strings themselves.
+
+Names added after the last build go to a small pending dict that lookups scan
+directly; it is folded into the sorted arrays once it passes `_MAX_PENDING`.
+Weights are the `Search_Terms` hit counts for the name and grow in place as
+searches are recorded.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+
+
+_SEP = "\x00"
+_MAX_PENDING = 2048
+
+
+def normalize(value: str | None) -> str:
+    return " ".join((value or "").lower().split())
+
+
+class PrefixIndex:
+    def __init__(self) -> None:
+        self._keys: list[str] = []
+        self._display: list[str] = []
+        self._weights = array("d")
+        self._tree = array("l")
+        self._size = 0
+        self._pending: dict[str, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._pending)
+
+    def build(self, entries) -> None:
+        """Replace the index with `(text, kind, weight)` entries."""
+        merged: dict[str, list] = {}
+        for value, kind, weight in entries:
+            norm = normalize(value)
+            if not norm:
+                continue
+            key = f"{norm}{_SEP}{kind}"
+            cur = merged.get(key)
+            if cur is None:
+                merged[key] = [value.strip(), float(weight)]
+            else:
+                cur[1] = max(cur[1], float(weight))
+        self._pending.clear()
+        self._load(merged)
+
+    def _load(self, merged: dict) -> None:
+        keys = sorted(merged)
+        self._keys = keys
+        self._display = [merged[k][0] for k in keys]
+        self._weights = array("d", (merged[k][1] for k in keys))
+        self._build_tree()
+
+    def _build_tree(self) -> None:
+        n = len(self._keys)
+        size = 1
+        while size < max(n, 1):
+            size *= 2
+        tree = array("l", [-1]) * (2 * size)
+        for i in range(n):
+            tree[size + i] = i
+        w = self._weights
+        for node in range(size - 1, 0, -1):
+            a, b = tree[2 * node], tree[2 * node + 1]
+            tree[node] = a if b < 0 or (a >= 0 and w[a] >= w[b]) else b
+        self._tree = tree
+        self._size = size
+
+    def _better(self, a: int, b: int) -> int:
+        if a < 0:
+            return b
+        if b < 0:
+            return a
+        return a if self._weights[a] >= self._weights[b] else b
+
+    def _argmax(self, lo: int, hi: int) -> int:
+        # heaviest position in [lo, hi), ties going to the alphabetically first
+        best = -1
+        lo += self._size
+        hi += self._size
+        right = -1
+        while lo < hi:
+            if lo & 1:
+                best = self._better(best, self._tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                right = self._better(self._tree[hi], right)
+            lo //= 2
+            hi //= 2
+        return self._better(best, right)
+
+    def _update(self, i: int) -> None:
+        node = (self._size + i) // 2
+        tree = self._tree
+        while node:
+            tree[node] = self._better(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+
+    def add(self, value: str | None, kind: str, weight: float = 0.0) -> None:
+        norm = normalize(value)
+        if not norm:
+            return
+        key = f"{norm}{_SEP}{kind}"
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            if weight > self._weights[i]:
+                self._weights[i] = weight
+                self._update(i)
+            return
+        cur = self._pending.get(key)
+        if cur is None:
+            self._pending[key] = [value.strip(), float(weight)]
+        elif weight > cur[1]:
+            cur[1] = float(weight)
+        if len(self._pending) > _MAX_PENDING:
+            merged = {k: [d, w] for k, d, w in zip(self._keys, self._display, self._weights)}
+            merged.update(self._pending)
+            self._pending.clear()
+            self._load(merged)
+
+    def bump(self, value: str | None, amount: float = 1.0) -> None:
+        # a search for `value` makes every entry with exactly that name heavier
+        norm = normalize(value)
+        if not norm:
+            return
+        prefix = norm + _SEP
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            self._weights[i] += amount
+            self._update(i)
+            i += 1
+        for key, cur in self._pending.items():
+            if key.startswith(prefix):
+                cur[1] += amount
+
+    def complete(self, prefix: str | None, k: int = 10, kinds: tuple[str, ...] | None = None) -> list[tuple[str, str, float]]:
+        """Return up to `k` `(text, kind, weight)` completions of `prefix`, heaviest first."""
+        norm = normalize(prefix)
+        if not norm or k <= 0:
+            return []
+        lo = bisect_left(self._keys, norm)
+        hi = bisect_left(self._keys, norm + "\uffff")
+        out = []
+        heap = []
+        if lo < hi:
+            i = self._argmax(lo, hi)
+            heap.append((-self._weights[i], i, lo, hi))
+        # pop the heaviest slice maximum, then split the slice around it
+        while heap and len(out) < k:
+            negw, i, a, b = heapq.heappop(heap)
+            kind = self._keys[i].rsplit(_SEP, 1)[1]
+            if kinds is None or kind in kinds:
+                out.append((self._display[i], kind, -negw))
+            for x, y in ((a, i), (i + 1, b)):
+                if x < y:
+                    j = self._argmax(x, y)
+                    heapq.heappush(heap, (-self._weights[j], j, x, y))
+        if self._pending:
+            for key, (display, weight) in self._pending.items():
+                if key.startswith(norm):
+                    kind = key.rsplit(_SEP, 1)[1]
+                    if kinds is None or kind in kinds:
+                        out.append((display, kind, weight))
+            out.sort(key=lambda x: -x[2])
+        return out[:k]
+
+
+suggest_index = PrefixIndex()
+
+
+def suggest_product(product_name: str | None, brand: str | None) -> None:
+    suggest_index.add(product_name, "product")
+    suggest_index.add(brand, "brand")
+
+
+def suggest_shop(shop_name: str | None) -> None:
+    suggest_index.add(shop_name, "shop")
+
+
+async def load_suggest_index(conn) -> None:
+    hits = {}
+    try:
+        for term, count in (await conn.exec_driver_sql("SELECT term, hits FROM Search_Terms")).all():
+            hits[normalize(term)] = float(count or 0)
+    except Exception:
+        pass
+    entries = []
+    for name, brand in (await conn.exec_driver_sql("SELECT product_name, brand FROM Products")).all():
+        entries.append((name, "product", hits.get(normalize(name), 0.0)))
+        entries.append((brand, "brand", hits.get(normalize(brand), 0.0)))
+    for (name,) in (await conn.exec_driver_sql("SELECT category_name FROM Product_Categories")).all():
+        entries.append((name, "category", hits.get(normalize(name), 0.0)))
+    for (name,) in (await conn.exec_driver_sql("SELECT shop_name FROM Shops")).all():
+        entries.append((name, "shop", hits.get(normalize(name), 0.0)))
+    suggest_index.build((v, kind, w) for v, kind, w in entries if v)
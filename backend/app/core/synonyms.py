@@ -0,0 +1,139 @@
+"""
+Synonym and unit expansion for product queries.
+
+`app/data/search_synonyms.txt` (or `SEARCH_SYNONYMS_FILE`) is compiled at
+startup into a dict from every term, as a tuple of words, to its synonym group,
+plus a dict from unit alias to `(factor, base unit)`. `expand` walks the query
+tokens once, taking the longest known term at each position (up to the longest
+term in the file), and turns quantities such as "1kg", "1 kg" or "1000g" into
+every whole-number spelling of the same amount. The result feeds one FTS5 MATCH
+expression, so an expanded query is still a single index lookup.
+"""
+import logging
+import re
+from pathlib import Path
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NUMBER_RE = re.compile(r"^\d+(?:\.\d+)?$")
+_QUANTITY_RE = re.compile(r"^(\d+(?:\.\d+)?)([a-z]+)$")
+_UNIT_RE = re.compile(r"^(.+?)=\s*(\d+(?:\.\d+)?)\s*(\w+)\s*$")
+
+
+def _words(value: str) -> tuple[str, ...]:
+    return tuple(_WORD_RE.findall(value.lower()))
+
+
+class SynonymTable:
+    def __init__(self) -> None:
+        self._groups: dict[tuple[str, ...], tuple[tuple[str, ...], ...]] = {}
+        self._units: dict[str, tuple[float, str]] = {}
+        self._spellings: dict[str, list[tuple[float, str]]] = {}
+        self._max_words = 1
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def clear(self) -> None:
+        self._groups.clear()
+        self._units.clear()
+        self._spellings.clear()
+        self._max_words = 1
+
+    def terms(self) -> list[str]:
+        return [" ".join(term) for term in self._groups]
+
+    def load_lines(self, lines) -> None:
+        self.clear()
+        section = None
+        for raw in lines:
+            line = raw.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1].strip().lower()
+            elif section == "synonyms":
+                self._add_group(line)
+            elif section == "units":
+                self._add_unit(line)
+
+    def _add_group(self, line: str) -> None:
+        group = tuple(dict.fromkeys(w for w in (_words(t) for t in line.split(",")) if w))
+        if len(group) < 2:
+            return
+        for term in group:
+            # a term listed in two groups keeps the union of both
+            known = self._groups.get(term, ())
+            self._groups[term] = known + tuple(t for t in group if t not in known)
+            self._max_words = max(self._max_words, len(term))
+
+    def _add_unit(self, line: str) -> None:
+        m = _UNIT_RE.match(line)
+        if not m:
+            return
+        aliases = [a.strip().lower() for a in m.group(1).split(",") if a.strip()]
+        factor, base = float(m.group(2)), m.group(3).lower()
+        if not aliases or factor <= 0:
+            return
+        for alias in aliases:
+            self._units[alias] = (factor, base)
+        self._spellings.setdefault(base, []).append((factor, aliases[0]))
+
+    def _quantity(self, value: str, unit: str) -> tuple[tuple[str, ...], ...] | None:
+        known = self._units.get(unit)
+        if known is None:
+            return None
+        amount = float(value) * known[0]
+        out = [(f"{value}{unit}",), (value, unit)]
+        for factor, name in self._spellings[known[1]]:
+            n = amount / factor
+            if 1 <= n < 10000 and abs(n - round(n)) < 1e-9:
+                n = str(int(round(n)))
+                out += [(f"{n}{name}",), (n, name)]
+        return tuple(dict.fromkeys(out))
+
+    def expand(self, tokens: list[str]) -> list[tuple[tuple[tuple[str, ...], ...], bool]]:
+        """Split `tokens` into `(alternatives, is_quantity)` slots.
+
+        Alternatives are word sequences; quantities should match exactly rather
+        than as prefixes, so "1 l" does not also find "1 large".
+        """
+        slots = []
+        i = 0
+        while i < len(tokens):
+            tok = tokens[i]
+            if _NUMBER_RE.match(tok) and i + 1 < len(tokens):
+                alts = self._quantity(tok, tokens[i + 1])
+                if alts:
+                    slots.append((alts, True))
+                    i += 2
+                    continue
+            m = _QUANTITY_RE.match(tok)
+            alts = self._quantity(m.group(1), m.group(2)) if m else None
+            if alts:
+                slots.append((alts, True))
+                i += 1
+                continue
+            for n in range(min(self._max_words, len(tokens) - i), 0, -1):
+                group = self._groups.get(tuple(tokens[i:i + n]))
+                if group:
+                    slots.append((group, False))
+                    i += n
+                    break
+            else:
+                slots.append((((tok,),), False))
+                i += 1
+        return slots
+
+
+synonyms = SynonymTable()
+
+
+def load_synonyms(path: str | None = None) -> None:
+    from app.core.config import settings
+    path = Path(path or settings.search_synonyms_file)
+    try:
+        synonyms.load_lines(path.read_text(encoding="utf-8").splitlines())
+    except OSError:
+        logging.exception("search synonyms file %s unavailable", path)
+        synonyms.clear()
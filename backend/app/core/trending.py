@@ -0,0 +1,196 @@
+"""
+Time-decayed trending scores for products, globally and per city.
+
+Scores use forward exponential decay: an event at time t adds exp(lam * (t - t0))
+to its key's weight, where t0 is a shared landmark, so recording a search is one
+dict update regardless of how old the other scores are. The decayed score at
+`now` is weight * exp(-lam * (now - t0)); the factor is the same for every key,
+so ranking compares raw weights. The landmark is moved forward (rescaling every
+weight once) before the exponent gets large.
+
+Searches are credited from the search-history write-behind flush, which
+resolves the cities of a whole batch of hits in one query.
+
+Scores are persisted to `Trending_Scores` every `trending_persist_seconds` and on
+shutdown, and reloaded (decayed to the current time) at startup.
+"""
+import asyncio
+import heapq
+import logging
+import math
+import time
+
+from app.core.config import settings
+
+
+TRENDING_TABLE = "Trending_Scores"
+GLOBAL_SCOPE = ""
+# rebase once the landmark exponent passes this (exp(50) is far from overflow)
+_MAX_EXPONENT = 50.0
+# decayed scores below this are dropped when persisting
+_MIN_SCORE = 1e-3
+
+
+class TrendingEngine:
+    def __init__(self, half_life_hours: float = 24.0) -> None:
+        self.lam = math.log(2) / (max(half_life_hours, 1e-6) * 3600.0)
+        self.t0 = time.time()
+        self._weights: dict[str, dict] = {}
+        self._dirty: set[tuple[str, object]] = set()
+
+    def _landmark(self, now: float) -> None:
+        if self.lam * (now - self.t0) <= _MAX_EXPONENT:
+            return
+        factor = math.exp(-self.lam * (now - self.t0))
+        for scope in self._weights.values():
+            for key in scope:
+                scope[key] *= factor
+        self.t0 = now
+
+    def record(self, product_id, cities=(), weight: float = 1.0, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        self._landmark(now)
+        if isinstance(product_id, memoryview):
+            product_id = bytes(product_id)
+        w = weight * math.exp(self.lam * (now - self.t0))
+        for scope in (GLOBAL_SCOPE, *{(c or "").strip().lower() for c in cities if c}):
+            bucket = self._weights.setdefault(scope, {})
+            bucket[product_id] = bucket.get(product_id, 0.0) + w
+            self._dirty.add((scope, product_id))
+
+    def score(self, product_id, city: str | None = None, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        bucket = self._weights.get((city or "").strip().lower(), {})
+        return bucket.get(product_id, 0.0) * math.exp(-self.lam * (now - self.t0))
+
+    def top(self, k: int, city: str | None = None, among=None, now: float | None = None) -> list[tuple[object, float]]:
+        """Return `(product_id, score)` for the `k` highest scores, optionally restricted to `among`."""
+        now = time.time() if now is None else now
+        bucket = self._weights.get((city or "").strip().lower(), {})
+        if among is not None:
+            items = ((pid, bucket[pid]) for pid in among if pid in bucket)
+        else:
+            items = bucket.items()
+        decay = math.exp(-self.lam * (now - self.t0))
+        return [(pid, w * decay) for pid, w in heapq.nlargest(k, items, key=lambda x: x[1])]
+
+    def load(self, scope: str, product_id, score: float, updated_at: float) -> None:
+        if isinstance(product_id, memoryview):
+            product_id = bytes(product_id)
+        # stored scores are as of updated_at; convert to a weight against t0
+        w = float(score) * math.exp(self.lam * (float(updated_at) - self.t0))
+        if w > 0:
+            self._weights.setdefault(scope, {})[product_id] = w
+
+    def drain_dirty(self, now: float | None = None) -> list[tuple[str, object, float, float]]:
+        now = time.time() if now is None else now
+        decay = math.exp(-self.lam * (now - self.t0))
+        out = []
+        for scope, pid in self._dirty:
+            w = self._weights.get(scope, {}).get(pid)
+            if w is None:
+                continue
+            out.append((scope, pid, w * decay, now))
+        self._dirty.clear()
+        return out
+
+    def prune(self, now: float | None = None) -> list[tuple[str, object]]:
+        now = time.time() if now is None else now
+        decay = math.exp(-self.lam * (now - self.t0))
+        dropped = []
+        for scope, bucket in self._weights.items():
+            for pid in [pid for pid, w in bucket.items() if w * decay < _MIN_SCORE]:
+                del bucket[pid]
+                dropped.append((scope, pid))
+        return dropped
+
+
+trending = TrendingEngine(settings.trending_half_life_hours)
+
+
+async def ensure_trending_table(conn) -> None:
+    await conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {TRENDING_TABLE} ("
+        "scope TEXT NOT NULL, product_id BLOB NOT NULL, score REAL NOT NULL, updated_at REAL NOT NULL, "
+        "PRIMARY KEY (scope, product_id))"
+    )
+
+
+async def load_trending(conn) -> None:
+    await ensure_trending_table(conn)
+    rows = (await conn.exec_driver_sql(f"SELECT scope, product_id, score, updated_at FROM {TRENDING_TABLE}")).all()
+    for scope, pid, score, updated_at in rows:
+        try:
+            trending.load(scope, pid, score, updated_at)
+        except (TypeError, ValueError):
+            continue
+
+
+async def record_search_hits(conn, hits) -> None:
+    """Credit `(product_ids, searched_at)` hits globally and in every city that stocks each product."""
+    product_ids = list({bytes(pid) if isinstance(pid, memoryview) else pid for pids, _ in hits for pid in pids})
+    if not product_ids:
+        return
+    placeholders = ", ".join("?" * len(product_ids))
+    rows = (await conn.exec_driver_sql(
+        "SELECT DISTINCT sp.product_id, COALESCE(a.city, s.city) FROM Shop_Product sp "
+        "JOIN Shops s ON s.shop_id = sp.shop_id LEFT JOIN Shop_Address a ON a.shop_id = sp.shop_id "
+        f"WHERE sp.product_id IN ({placeholders})",
+        tuple(product_ids),
+    )).all()
+    cities: dict = {}
+    for pid, city in rows:
+        cities.setdefault(pid, set()).add(city)
+    for pids, searched_at in hits:
+        for pid in pids:
+            trending.record(pid, cities.get(pid, ()), now=searched_at)
+
+
+async def persist_trending() -> int:
+    from app.db.session import engine
+
+    rows = trending.drain_dirty()
+    dropped = trending.prune()
+    if not rows and not dropped:
+        return 0
+    async with engine.begin() as conn:
+        if rows:
+            await conn.exec_driver_sql(
+                f"INSERT OR REPLACE INTO {TRENDING_TABLE}(scope, product_id, score, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        if dropped:
+            await conn.exec_driver_sql(f"DELETE FROM {TRENDING_TABLE} WHERE scope = ? AND product_id = ?", dropped)
+    return len(rows)
+
+
+async def _persist_loop() -> None:
+    while True:
+        await asyncio.sleep(max(settings.trending_persist_seconds, 1.0))
+        try:
+            await persist_trending()
+        except Exception:
+            logging.exception("failed to persist trending scores")
+
+
+_task: dict = {"persist": None}
+
+
+def start_trending_persistence() -> None:
+    if _task["persist"] is None:
+        _task["persist"] = asyncio.get_running_loop().create_task(_persist_loop())
+
+
+async def stop_trending_persistence() -> None:
+    task = _task["persist"]
+    _task["persist"] = None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    try:
+        await persist_trending()
+    except Exception:
+        logging.exception("failed to persist trending scores on shutdown")
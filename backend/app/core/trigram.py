@@ -0,0 +1,132 @@
+"""
+In-memory trigram index for typo-tolerant name lookup.
+
+Entries are `(kind, key, text)` triples, e.g. ("product", product_id, "Surf Excel").
+Each text is split into padded character trigrams (pg_trgm style) and the index
+keeps an inverted list trigram -> entry ids, so a query only touches entries that
+share at least one trigram with it instead of scoring every row.
+"""
+import re
+from collections import defaultdict
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def trigrams(value: str | None) -> frozenset[str]:
+    grams: set[str] = set()
+    for word in _WORD_RE.findall((value or "").lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return frozenset(grams)
+
+
+def similarity(a: str | None, b: str | None) -> float:
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    shared = len(ta & tb)
+    return shared / (len(ta) + len(tb) - shared)
+
+
+class TrigramIndex:
+    def __init__(self) -> None:
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._entries: dict[int, tuple[str, object, str, frozenset[str]]] = {}
+        self._ids: dict[tuple[str, object], int] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._entries.clear()
+        self._ids.clear()
+        self._next_id = 0
+
+    def add(self, kind: str, key, value: str | None) -> None:
+        if isinstance(key, memoryview):
+            key = bytes(key)
+        self.remove(kind, key)
+        grams = trigrams(value)
+        if not grams:
+            return
+        eid = self._next_id
+        self._next_id += 1
+        self._ids[(kind, key)] = eid
+        self._entries[eid] = (kind, key, value, grams)
+        for g in grams:
+            self._postings[g].add(eid)
+
+    def remove(self, kind: str, key) -> None:
+        eid = self._ids.pop((kind, key), None)
+        if eid is None:
+            return
+        _, _, _, grams = self._entries.pop(eid)
+        for g in grams:
+            posting = self._postings.get(g)
+            if posting is not None:
+                posting.discard(eid)
+                if not posting:
+                    del self._postings[g]
+
+    def search(self, q: str, kinds: tuple[str, ...] | None = None, threshold: float = 0.45, limit: int | None = 200) -> list[tuple[str, object, str, float]]:
+        """Return `(kind, key, text, score)` for entries similar to `q`, best first.
+
+        An entry is a candidate when it contains at least `threshold` of the query's
+        trigrams; its score blends that coverage with whole-string similarity so
+        exact names outrank names that merely contain the query. `limit=None`
+        returns every candidate.
+        """
+        qgrams = trigrams(q)
+        if not qgrams:
+            return []
+        counts: dict[int, int] = defaultdict(int)
+        for g in qgrams:
+            for eid in self._postings.get(g, ()):
+                counts[eid] += 1
+        nq = len(qgrams)
+        out = []
+        for eid, shared in counts.items():
+            coverage = shared / nq
+            if coverage < threshold:
+                continue
+            kind, key, value, grams = self._entries[eid]
+            if kinds is not None and kind not in kinds:
+                continue
+            sim = shared / (nq + len(grams) - shared)
+            out.append((kind, key, value, (coverage + sim) / 2.0))
+        out.sort(key=lambda x: x[3], reverse=True)
+        return out[:limit]
+
+    def best_scores(self, q: str, kinds: tuple[str, ...], threshold: float = 0.45, limit: int | None = 200) -> dict:
+        # collapse entries of several kinds (e.g. product name + brand) onto their key
+        best: dict = {}
+        for _, key, _, score in self.search(q, kinds=kinds, threshold=threshold, limit=limit):
+            if score > best.get(key, 0.0):
+                best[key] = score
+        return best
+
+
+trigram_index = TrigramIndex()
+
+
+def index_product(product_id, product_name: str | None, brand: str | None) -> None:
+    trigram_index.add("product", product_id, product_name)
+    trigram_index.add("brand", product_id, brand)
+
+
+def index_shop(shop_id, shop_name: str | None) -> None:
+    trigram_index.add("shop", shop_id, shop_name)
+
+
+async def load_trigram_index(conn) -> None:
+    trigram_index.clear()
+    for pid, name, brand in (await conn.exec_driver_sql("SELECT product_id, product_name, brand FROM Products")).all():
+        index_product(pid, name, brand)
+    for sid, name in (await conn.exec_driver_sql("SELECT shop_id, shop_name FROM Shops")).all():
+        index_shop(sid, name)
+    # category_key may hold raw bytes, so categories are keyed by rowid
+    for rid, name in (await conn.exec_driver_sql("SELECT rowid, category_name FROM Product_Categories")).all():
+        trigram_index.add("category", rid, name)
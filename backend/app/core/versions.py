@@ -0,0 +1,146 @@
+"""
+Per-entity version counters and conditional GET.
+
+Write paths call `bump_version(kind, *ids)` after they commit; `@conditional`
+endpoints tag their responses with a strong ETag built from the kind, the
+normalized entity id and its version, and answer a matching `If-None-Match`
+with 304 from memory, before any session is used. A 304 is only given for an
+entity this process has already served since its last bump, so an id that does
+not exist (or `If-None-Match: *`) always reaches the endpoint and gets its 404.
+Counters start at 0 and live in this process only, so the ETag carries a random
+per-process epoch: after a restart every old tag simply misses.
+
+Kinds in use:
+- `shop` (shop id): `GET /api/shops/{shop_id}`
+- `shop_products` (shop id): `GET /api/shops/{shop_id}/products`
+- `product` (product id): `GET /api/products/id/{product_id}` and `GET /api/products/{product_id}`
+- `shops` (no id): `GET /api/shops/`
+"""
+import functools
+import inspect
+import secrets
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.core.singleflight import coalesce
+
+
+_EPOCH = secrets.token_hex(4)
+
+
+def _key(kind: str, entity_id=None) -> tuple:
+    if isinstance(entity_id, memoryview):
+        entity_id = bytes(entity_id)
+    if isinstance(entity_id, (bytes, bytearray)):
+        entity_id = entity_id.hex()
+    elif entity_id is not None:
+        entity_id = str(entity_id).strip().lower()
+    return (kind, entity_id)
+
+
+class EntityVersions:
+    def __init__(self) -> None:
+        self._versions: dict[tuple, int] = {}
+        self._served: set[tuple] = set()
+        self.not_modified = 0
+
+    def current(self, kind: str, entity_id=None) -> int:
+        return self._versions.get(_key(kind, entity_id), 0)
+
+    def bump(self, kind: str, *entity_ids) -> None:
+        for entity_id in entity_ids or (None,):
+            key = _key(kind, entity_id)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            # the write may have deleted it; the next read has to confirm it exists
+            self._served.discard(key)
+
+    def etag(self, kind: str, entity_id=None) -> str:
+        _, entity = _key(kind, entity_id)
+        name = kind if entity is None else f"{kind}-{entity}"
+        return f'"{_EPOCH}-{name}-{self.current(kind, entity_id)}"'
+
+    def mark_served(self, kind: str, entity_id=None) -> None:
+        self._served.add(_key(kind, entity_id))
+
+    def served(self, kind: str, entity_id=None) -> bool:
+        return _key(kind, entity_id) in self._served
+
+    def stats(self) -> dict:
+        return {"tracked": len(self._versions), "served": len(self._served), "not_modified": self.not_modified}
+
+
+versions = EntityVersions()
+
+
+def bump_version(kind: str, *entity_ids) -> None:
+    versions.bump(kind, *entity_ids)
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"max-age={max(0, settings.http_cache_max_age_seconds)}, must-revalidate"}
+
+
+def conditional(kind: str, id_param: str | None = None):
+    """Version-tagged, coalesced GET endpoint; use in place of `@coalesce`.
+
+    The ETag is taken before the endpoint reads, inside the coalesced call, so
+    followers get the tag of the read they share; the `If-None-Match` check runs
+    outside it, so a 304 is never handed to a caller that did not ask for one.
+    """
+    def decorator(func):
+        sig = inspect.signature(func)
+        params = list(sig.parameters.values())
+        names = {p.name for p in params}
+        extra = [
+            inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, default=None, annotation=ann)
+            for name, ann in (("request", Request), ("response", Response))
+            if name not in names
+        ]
+        full_sig = sig.replace(parameters=params + extra)
+        passed = {p.name for p in extra}
+
+        def _entity(args, kwargs):
+            if id_param is None:
+                return None
+            return full_sig.bind_partial(*args, **kwargs).arguments.get(id_param)
+
+        @functools.wraps(func)
+        async def tagged(*args, **kwargs):
+            response = kwargs.get("response")
+            entity = _entity(args, kwargs)
+            etag = versions.etag(kind, entity)
+            result = await func(*args, **{k: v for k, v in kwargs.items() if k not in passed})
+            versions.mark_served(kind, entity)
+            if response is not None:
+                response.headers.update(_cache_headers(etag))
+            return result
+
+        tagged.__signature__ = full_sig
+        shared = coalesce(tagged)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs.get("request")
+            entity = _entity(args, kwargs)
+            if request is not None and versions.served(kind, entity):
+                etag = versions.etag(kind, entity)
+                if _matches(request.headers.get("if-none-match"), etag):
+                    versions.not_modified += 1
+                    return Response(status_code=304, headers=_cache_headers(etag))
+            return await shared(*args, **kwargs)
+
+        wrapper.__signature__ = full_sig
+        return wrapper
+
+    return decorator
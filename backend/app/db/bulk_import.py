@@ -0,0 +1,111 @@
+"""
+Batched writes for bulk catalog imports (`POST /api/shops/{shop_id}/products/import`).
+
+`apply_batch` writes one batch of parsed rows (`app/core/bulk_import.py`) in the
+caller's transaction with a fixed number of statements, whatever the batch size:
+lookups for referenced product ids, for existing products by name and brand and
+for the shop's existing listings, then `executemany` inserts for new products
+and their phonetic keys, and an `executemany` UPDATE plus an `executemany`
+INSERT for the listings. Shop_Product has no unique key on (shop_id, product_id)
+in every database, so the listing upsert does not rely on ON CONFLICT.
+
+A row without `product_id` reuses the product with the same name and brand
+(case-insensitive) and creates one otherwise. Listing columns left empty keep
+their current value.
+"""
+import uuid
+
+from sqlalchemy import text
+
+from app.db.phonetic import add_phonetic_keys_many
+
+
+def _in_clause(prefix: str, values: list) -> tuple[str, dict]:
+    params = {f"{prefix}{i}": v for i, v in enumerate(values)}
+    return ", ".join(f":{k}" for k in params), params
+
+
+def _name_key(name: str | None, brand: str | None) -> tuple[str, str]:
+    return ((name or "").casefold(), (brand or "").casefold())
+
+
+async def apply_batch(db, shop_id: bytes, rows: list[tuple[int, dict]]) -> dict:
+    """Write `rows` (`(line, row)` pairs) without committing.
+
+    Returns the created products as `(product_id, name, brand)`, the ids of every
+    product listed, counts of created and updated listings, and `(line, message)`
+    for rows that were skipped.
+    """
+    ids = list({row["product_id"] for _, row in rows if row["product_id"] is not None})
+    known = set()
+    if ids:
+        clause, params = _in_clause("pid", ids)
+        known = {bytes(pid) for (pid,) in (await db.execute(
+            text(f"SELECT product_id FROM Products WHERE product_id IN ({clause})"), params
+        )).all()}
+    names = list({row["product_name"] for _, row in rows if row["product_id"] is None})
+    by_name: dict[tuple[str, str], bytes] = {}
+    if names:
+        clause, params = _in_clause("name", names)
+        for pid, pname, pbrand in (await db.execute(text(
+            f"SELECT product_id, product_name, brand FROM Products WHERE product_name COLLATE NOCASE IN ({clause}) "
+            "ORDER BY created_at"
+        ), params)).all():
+            by_name.setdefault(_name_key(pname, pbrand), bytes(pid))
+
+    created = []
+    errors = []
+    listings: dict[bytes, dict] = {}
+    for line, row in rows:
+        pid = row["product_id"]
+        if pid is not None:
+            if pid not in known:
+                errors.append((line, "unknown product_id"))
+                continue
+        else:
+            key = _name_key(row["product_name"], row["brand"])
+            pid = by_name.get(key)
+            if pid is None:
+                pid = by_name[key] = uuid.uuid4().bytes
+                created.append({
+                    "pid": pid, "name": row["product_name"], "cat_key": row["category_key"],
+                    "brand": row["brand"], "desc": row["description"], "color": row["color"],
+                })
+        # a product listed twice in one batch: later non-empty values win
+        listing = listings.setdefault(pid, {"sid": shop_id, "pid": pid, "price": None, "stock": None})
+        for field in ("price", "stock"):
+            if row[field] is not None:
+                listing[field] = row[field]
+
+    if created:
+        await db.execute(text(
+            "INSERT INTO Products (product_id, product_name, category_key, brand, description, color, created_at) "
+            "VALUES (:pid, :name, :cat_key, :brand, :desc, :color, CURRENT_TIMESTAMP)"
+        ), created)
+        await add_phonetic_keys_many(db, [(p["pid"], p["name"], p["brand"]) for p in created])
+    updates, inserts = [], []
+    if listings:
+        clause, params = _in_clause("pid", list(listings))
+        params["sid"] = shop_id
+        existing = {bytes(pid) for (pid,) in (await db.execute(text(
+            f"SELECT DISTINCT product_id FROM Shop_Product WHERE shop_id = :sid AND product_id IN ({clause})"
+        ), params)).all()}
+        updates = [v for pid, v in listings.items() if pid in existing]
+        inserts = [v for pid, v in listings.items() if pid not in existing]
+        if updates:
+            await db.execute(text(
+                "UPDATE Shop_Product SET price = COALESCE(:price, price), stock = COALESCE(:stock, stock), "
+                "updated_at = CURRENT_TIMESTAMP WHERE shop_id = :sid AND product_id = :pid"
+            ), updates)
+        if inserts:
+            await db.execute(text(
+                "INSERT INTO Shop_Product (shop_product_id, shop_id, product_id, price, stock, created_at) "
+                "VALUES (randomblob(16), :sid, :pid, :price, :stock, CURRENT_TIMESTAMP)"
+            ), inserts)
+    return {
+        "created": [(p["pid"], p["name"], p["brand"]) for p in created],
+        "listed": list(listings),
+        "listings_created": len(inserts),
+        "listings_updated": len(updates),
+        "errors": errors,
+    }
@@ -0,0 +1,103 @@
+"""
+SQLite FTS5 index over Products.
+
+`Products_fts` is an external-content FTS5 table keyed on `Products.rowid`.
+Triggers created by `ensure_product_fts` keep it in sync with inserts,
+updates and deletes on `Products`, so routers only ever read from it.
+"""
+import logging
+import re
+
+from app.core.config import settings
+from app.core.synonyms import synonyms
+
+
+FTS_TABLE = "Products_fts"
+FTS_COLUMNS = ("product_name", "brand", "description", "color")
+
+_state = {"enabled": False}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+async def ensure_product_fts(conn) -> bool:
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    try:
+        existed = (await conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        )).first()
+        await conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{cols}, content='Products', content_rowid='rowid', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_fts_ai AFTER INSERT ON Products BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.rowid, {new_cols}); END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_fts_ad AFTER DELETE ON Products BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols}); END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_fts_au AFTER UPDATE ON Products BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.rowid, {new_cols}); END"
+        )
+        if not existed:
+            # backfill rows written before the index existed
+            await conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        _state["enabled"] = True
+    except Exception:
+        # SQLite builds without FTS5 fall back to LIKE scans
+        logging.exception("FTS5 index unavailable; product search falls back to LIKE")
+        _state["enabled"] = False
+    return _state["enabled"]
+
+
+def fts_enabled() -> bool:
+    return _state["enabled"]
+
+
+def build_match(q: str | None) -> str | None:
+    # every token must match, each as a prefix so partial keystrokes still hit;
+    # synonyms and unit spellings of a token become an OR group in its place
+    tokens = _TOKEN_RE.findall((q or "").lower())
+    if not tokens:
+        return None
+    parts = []
+    for alts, exact in synonyms.expand(tokens):
+        terms = [f'"{" ".join(words)}"' + ("" if exact else "*") for words in alts]
+        parts.append(terms[0] if len(terms) == 1 else "(" + " OR ".join(terms) + ")")
+    return " AND ".join(parts)
+
+
+def bm25_expr() -> str:
+    weights = list(settings.search_bm25_weights or [])
+    weights = (weights + [1.0] * len(FTS_COLUMNS))[: len(FTS_COLUMNS)]
+    return f"bm25({FTS_TABLE}, " + ", ".join(str(float(w)) for w in weights) + ")"
+
+
+def product_text_filter(q: str | None, alias: str = "p") -> tuple[str, str, str | None, dict]:
+    """Return (join_sql, where_sql, rank_sql, params) matching `q` against Products.
+
+    `rank_sql` is a bm25 expression (lower is better) when the FTS index is used,
+    or None when the caller must fall back to its own scoring.
+    """
+    match = build_match(q) if fts_enabled() else None
+    if match is not None:
+        return (
+            f"JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = {alias}.rowid",
+            f"{FTS_TABLE} MATCH :fts_q",
+            bm25_expr(),
+            {"fts_q": match},
+        )
+    return (
+        "",
+        f"(LOWER({alias}.product_name) LIKE LOWER(:pat) OR LOWER({alias}.brand) LIKE LOWER(:pat) "
+        f"OR LOWER({alias}.description) LIKE LOWER(:pat))",
+        None,
+        {"pat": f"%{q or ''}%"},
+    )
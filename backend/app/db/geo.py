@@ -0,0 +1,176 @@
+"""
+Spatial lookup for shops.
+
+Nearby lookups are served by the in-memory `geo_engine`, loaded at startup; SQL
+only fetches details for the shops it places inside the radius.
+
+`Shop_Address_rtree` is an R*Tree over `Shop_Address(latitude, longitude)` keyed
+on `Shop_Address.rowid` and maintained by triggers created in `init_db`. It is
+only queried while the engine is not loaded: before startup has built it, or
+when building it failed. Then `shops_within` uses it as a bounding-box prefilter
+and runs exact haversine on the rows that survive. The triggers keep it current
+regardless, so this cold-start fallback never serves stale coordinates.
+"""
+import logging
+from math import radians, sin, cos, sqrt, atan2
+
+from sqlalchemy import text
+
+from app.core.geo_engine import geo_engine
+
+
+RTREE_TABLE = "Shop_Address_rtree"
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.045
+
+_state = {"enabled": False}
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    # slightly padded so float32 rounding in the R*Tree never drops an edge point
+    pad = 1.001
+    dlat = radius_km / KM_PER_DEG_LAT * pad
+    coslat = max(cos(radians(lat)), 0.01)
+    dlon = radius_km / (KM_PER_DEG_LAT * coslat) * pad
+    return (
+        max(lat - dlat, -90.0),
+        min(lat + dlat, 90.0),
+        max(lon - dlon, -180.0),
+        min(lon + dlon, 180.0),
+    )
+
+
+async def ensure_shop_rtree(conn) -> bool:
+    try:
+        existed = (await conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (RTREE_TABLE,)
+        )).first()
+        await conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_shop_address_rtree_ai AFTER INSERT ON Shop_Address "
+            f"WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+            f"INSERT OR REPLACE INTO {RTREE_TABLE} VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude); END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_shop_address_rtree_au AFTER UPDATE OF latitude, longitude ON Shop_Address BEGIN "
+            f"DELETE FROM {RTREE_TABLE} WHERE id = old.rowid; "
+            f"INSERT INTO {RTREE_TABLE} SELECT new.rowid, new.latitude, new.latitude, new.longitude, new.longitude "
+            f"WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_shop_address_rtree_ad AFTER DELETE ON Shop_Address BEGIN "
+            f"DELETE FROM {RTREE_TABLE} WHERE id = old.rowid; END"
+        )
+        if not existed:
+            await conn.exec_driver_sql(
+                f"INSERT OR REPLACE INTO {RTREE_TABLE} SELECT rowid, latitude, latitude, longitude, longitude "
+                "FROM Shop_Address WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+            )
+        _state["enabled"] = True
+    except Exception:
+        logging.exception("R*Tree index unavailable; nearby lookups fall back to a bounding-box scan")
+        _state["enabled"] = False
+    return _state["enabled"]
+
+
+def nearby_shop_ids(lat: float, lon: float, radius_km: float) -> list | None:
+    """Shop ids within `radius_km`, nearest first, straight from the in-memory engine.
+
+    Returns None when the engine is not loaded so callers can use `shops_within`.
+    """
+    if not geo_engine.loaded:
+        return None
+    return [sid for _, sid, _ in geo_engine.within(lat, lon, radius_km)]
+
+
+async def shop_distances(db, lat: float, lon: float, radius_km: float) -> dict:
+    """`{shop_id: distance_km}` for shops within `radius_km`, nearest first, one entry per shop."""
+    if geo_engine.loaded:
+        hits = [(sid, d) for _, sid, d in geo_engine.within(lat, lon, radius_km)]
+    else:
+        hits = [(s["shop_id"], s["distance_km"]) for s in await shops_within(db, lat, lon, radius_km)]
+    out = {}
+    for sid, distance in hits:
+        out.setdefault(sid, distance)
+    return out
+
+
+async def shops_within(db, lat: float, lon: float, radius_km: float) -> list[dict]:
+    """Shops whose address lies within `radius_km` of (lat, lon), nearest first."""
+    if geo_engine.loaded:
+        return await _shops_within_engine(db, lat, lon, radius_km)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    params = {"min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon}
+    select_sql = "SELECT s.shop_id, s.shop_name, s.shop_image, a.city, a.area, a.latitude, a.longitude "
+    if _state["enabled"]:
+        sql = (
+            select_sql
+            + f"FROM {RTREE_TABLE} r JOIN Shop_Address a ON a.rowid = r.id JOIN Shops s ON s.shop_id = a.shop_id "
+            "WHERE r.min_lat <= :max_lat AND r.max_lat >= :min_lat AND r.min_lon <= :max_lon AND r.max_lon >= :min_lon"
+        )
+    else:
+        sql = (
+            select_sql
+            + "FROM Shop_Address a JOIN Shops s ON s.shop_id = a.shop_id "
+            "WHERE a.latitude BETWEEN :min_lat AND :max_lat AND a.longitude BETWEEN :min_lon AND :max_lon"
+        )
+    rows = (await db.execute(text(sql), params)).all()
+    out = []
+    for sid, name, img, city, area, slat, slon in rows:
+        try:
+            slat = float(slat)
+            slon = float(slon)
+        except (TypeError, ValueError):
+            continue
+        distance = haversine(slat, slon, float(lat), float(lon))
+        if distance <= radius_km:
+            out.append({
+                "shop_id": sid,
+                "shop_name": name,
+                "shop_image": img,
+                "city": city,
+                "area": area,
+                "lat": slat,
+                "lon": slon,
+                "distance_km": distance,
+            })
+    out.sort(key=lambda x: x["distance_km"])
+    return out
+
+
+async def _shops_within_engine(db, lat: float, lon: float, radius_km: float) -> list[dict]:
+    hits = geo_engine.within(lat, lon, radius_km)
+    if not hits:
+        return []
+    dist = {rid: d for rid, _, d in hits}
+    placeholders = ", ".join(f":rid{i}" for i in range(len(hits)))
+    params = {f"rid{i}": rid for i, (rid, _, _) in enumerate(hits)}
+    rows = (await db.execute(text(
+        "SELECT a.rowid, s.shop_id, s.shop_name, s.shop_image, a.city, a.area, a.latitude, a.longitude "
+        "FROM Shop_Address a JOIN Shops s ON s.shop_id = a.shop_id "
+        f"WHERE a.rowid IN ({placeholders})"
+    ), params)).all()
+    out = []
+    for rid, sid, name, img, city, area, slat, slon in rows:
+        out.append({
+            "shop_id": sid,
+            "shop_name": name,
+            "shop_image": img,
+            "city": city,
+            "area": area,
+            "lat": float(slat),
+            "lon": float(slon),
+            "distance_km": dist[rid],
+        })
+    out.sort(key=lambda x: x["distance_km"])
+    return out
@@ -0,0 +1,153 @@
+"""
+Write-behind buffer for `Search_History`.
+
+Searches enqueue `(user_id, search_item, timestamp)` rows, plus the product ids the
+search credits towards trending, instead of opening a write transaction per request. A background task drains the bounded queue and
+writes one `executemany` batch whenever `history_batch_size` rows are waiting or
+`history_flush_seconds` have passed since the first one arrived. When the queue
+is full new rows are dropped and counted rather than blocking the request.
+After each batch its trending hits are resolved to cities in one query, so the
+request path never does that lookup.
+Whatever is still queued at shutdown is flushed before the engine closes.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.trending import record_search_hits
+
+
+_INSERT_SQL = (
+    "INSERT INTO Search_History (history_id, user_id, search_item, timestamp) "
+    "VALUES (randomblob(16), ?, ?, ?)"
+)
+
+
+class HistoryWriter:
+    def __init__(self, max_size: int, batch_size: int, flush_seconds: float) -> None:
+        self.max_size = max(max_size, 1)
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = max(flush_seconds, 0.01)
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def enqueue(self, user_id, search_item: str, product_ids=()) -> bool:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        row = (user_id, search_item, datetime.utcnow().isoformat(sep=" "), tuple(product_ids), time.time())
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        # drain everything that is still queued
+        while self._queue is not None and not self._queue.empty():
+            await self._flush(self._take(self.batch_size))
+
+    def _take(self, n: int) -> list[tuple]:
+        batch = []
+        while len(batch) < n and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_seconds
+            try:
+                while len(batch) < self.batch_size:
+                    batch.extend(self._take(self.batch_size - len(batch)))
+                    remaining = deadline - loop.time()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # shutdown while collecting: put the rows back for stop() to write
+                for row in batch:
+                    try:
+                        self._queue.put_nowait(row)
+                    except asyncio.QueueFull:
+                        self.dropped += 1
+                raise
+            flush = asyncio.ensure_future(self._flush(batch))
+            try:
+                await asyncio.shield(flush)
+            except asyncio.CancelledError:
+                # let an in-flight batch finish instead of losing or duplicating it
+                await flush
+                raise
+
+    async def _flush(self, batch: list[tuple]) -> None:
+        if not batch:
+            return
+        from app.db.session import engine
+
+        rows = [row[:3] for row in batch]
+        try:
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql(_INSERT_SQL, rows)
+            self.written += len(rows)
+        except Exception:
+            # one bad row (e.g. unknown user_id) must not take the batch down with it
+            logging.warning("search history batch failed; retrying rows one by one")
+            for row in rows:
+                try:
+                    async with engine.begin() as conn:
+                        await conn.exec_driver_sql(_INSERT_SQL, row)
+                    self.written += 1
+                except Exception:
+                    self.failed += 1
+        hits = [(row[3], row[4]) for row in batch if row[3]]
+        if hits:
+            try:
+                async with engine.connect() as conn:
+                    await record_search_hits(conn, hits)
+            except Exception:
+                logging.exception("failed to record trending hits")
+        self.flushes += 1
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": self.max_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+history_writer = HistoryWriter(
+    settings.history_queue_size,
+    settings.history_batch_size,
+    settings.history_flush_seconds,
+)
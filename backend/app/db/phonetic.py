@@ -0,0 +1,99 @@
+"""
+Phonetic key side table for product search.
+
+`Product_Phonetic(pkey, product_id)` holds one row per distinct phonetic key of
+the words in a product's name and brand (`app/core/phonetic.py`). It is a
+WITHOUT ROWID table keyed on `(pkey, product_id)`, so a query's keys resolve to
+products with a primary-key range lookup; rows go away with their product
+through the foreign key. SQLite cannot compute the keys itself, so the product
+write paths call `add_phonetic_keys` in their transaction and `sync_phonetic_keys`
+fills in products inserted any other way at startup.
+"""
+import logging
+
+from sqlalchemy import text
+
+from app.core.phonetic import phonetic_keys
+
+
+PHONETIC_TABLE = "Product_Phonetic"
+MAX_CANDIDATES = 200
+
+
+async def ensure_phonetic_index(conn) -> bool:
+    try:
+        await conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {PHONETIC_TABLE} ("
+            "pkey TEXT NOT NULL, "
+            "product_id BLOB NOT NULL REFERENCES Products(product_id) ON DELETE CASCADE, "
+            "PRIMARY KEY (pkey, product_id)) WITHOUT ROWID"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_product_phonetic_product ON {PHONETIC_TABLE}(product_id)"
+        )
+    except Exception:
+        logging.exception("phonetic index unavailable")
+        return False
+    return True
+
+
+def _key_rows(product_id, *values) -> list[dict]:
+    keys = set()
+    for value in values:
+        keys |= phonetic_keys(value)
+    return [{"pkey": key, "pid": product_id} for key in sorted(keys)]
+
+
+async def add_phonetic_keys(db, product_id, product_name: str | None, brand: str | None) -> None:
+    """Write the keys of one product; runs inside the caller's transaction."""
+    if product_id is None:
+        return
+    rows = _key_rows(product_id, product_name, brand)
+    await db.execute(text(f"DELETE FROM {PHONETIC_TABLE} WHERE product_id = :pid"), {"pid": product_id})
+    if rows:
+        await db.execute(text(f"INSERT OR IGNORE INTO {PHONETIC_TABLE}(pkey, product_id) VALUES (:pkey, :pid)"), rows)
+
+
+async def add_phonetic_keys_many(db, products) -> None:
+    """Keys for new products given as `(product_id, name, brand)`, in one executemany."""
+    rows = []
+    for pid, name, brand in products:
+        rows.extend(_key_rows(pid, name, brand))
+    if rows:
+        await db.execute(text(f"INSERT OR IGNORE INTO {PHONETIC_TABLE}(pkey, product_id) VALUES (:pkey, :pid)"), rows)
+
+
+async def sync_phonetic_keys(conn) -> int:
+    """Add keys for products that have none yet (seeds, rows written outside the API)."""
+    try:
+        missing = (await conn.exec_driver_sql(
+            "SELECT product_id, product_name, brand FROM Products p "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {PHONETIC_TABLE} ph WHERE ph.product_id = p.product_id)"
+        )).all()
+        rows = []
+        for pid, name, brand in missing:
+            rows.extend((r["pkey"], r["pid"]) for r in _key_rows(pid, name, brand))
+        if rows:
+            await conn.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {PHONETIC_TABLE}(pkey, product_id) VALUES (?, ?)", rows
+            )
+        return len(rows)
+    except Exception:
+        logging.exception("phonetic key sync failed")
+        return 0
+
+
+async def phonetic_candidates(db, q: str | None) -> dict:
+    """`{product_id: share of the query's keys it matches}` for products matching at least half."""
+    keys = sorted(phonetic_keys(q))
+    if not keys:
+        return {}
+    placeholders = ", ".join(f":pk{i}" for i in range(len(keys)))
+    params = {f"pk{i}": key for i, key in enumerate(keys)}
+    params["need"] = (len(keys) + 1) // 2
+    params["cap"] = MAX_CANDIDATES
+    rows = (await db.execute(text(
+        f"SELECT product_id, COUNT(*) AS hits FROM {PHONETIC_TABLE} WHERE pkey IN ({placeholders}) "
+        "GROUP BY product_id HAVING hits >= :need ORDER BY hits DESC LIMIT :cap"
+    ), params)).all()
+    return {pid: hits / len(keys) for pid, hits in rows}
@@ -0,0 +1,85 @@
+"""
+Search popularity rollup.
+
+`Search_Terms` counts searches per normalized term (`lower(trim(search_item))`)
+and `Product_Popularity` carries one row per product with the hit count of the
+term matching its name. Both are maintained by triggers on `Search_History` and
+`Products`, so recording a search is the only thing needed to keep them current
+and `/api/search/popular` reads a top-K straight off `ix_product_popularity_hits`.
+"""
+import logging
+
+
+TERMS_TABLE = "Search_Terms"
+POPULARITY_TABLE = "Product_Popularity"
+
+_TERM = "lower(trim({}))"
+
+
+async def ensure_popularity_rollup(conn) -> bool:
+    new_term = _TERM.format("new.search_item")
+    old_term = _TERM.format("old.search_item")
+    new_name = _TERM.format("new.product_name")
+    try:
+        existed = (await conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (POPULARITY_TABLE,)
+        )).first()
+        await conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {TERMS_TABLE} ("
+            "term TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, last_searched DATETIME)"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {POPULARITY_TABLE} ("
+            "product_id BLOB PRIMARY KEY, term TEXT NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_product_popularity_hits ON {POPULARITY_TABLE}(hits DESC, product_id)"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_product_popularity_term ON {POPULARITY_TABLE}(term)"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_search_history_pop_ai AFTER INSERT ON Search_History "
+            f"WHEN {new_term} <> '' BEGIN "
+            f"INSERT INTO {TERMS_TABLE}(term, hits, last_searched) VALUES ({new_term}, 1, new.timestamp) "
+            f"ON CONFLICT(term) DO UPDATE SET hits = hits + 1, last_searched = excluded.last_searched; "
+            f"UPDATE {POPULARITY_TABLE} SET hits = hits + 1 WHERE term = {new_term}; END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_search_history_pop_ad AFTER DELETE ON Search_History "
+            f"WHEN {old_term} <> '' BEGIN "
+            f"UPDATE {TERMS_TABLE} SET hits = MAX(hits - 1, 0) WHERE term = {old_term}; "
+            f"UPDATE {POPULARITY_TABLE} SET hits = MAX(hits - 1, 0) WHERE term = {old_term}; END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_pop_ai AFTER INSERT ON Products BEGIN "
+            f"INSERT OR REPLACE INTO {POPULARITY_TABLE}(product_id, term, hits) VALUES (new.product_id, {new_name}, "
+            f"COALESCE((SELECT hits FROM {TERMS_TABLE} WHERE term = {new_name}), 0)); END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_pop_au AFTER UPDATE OF product_id, product_name ON Products BEGIN "
+            f"DELETE FROM {POPULARITY_TABLE} WHERE product_id = old.product_id; "
+            f"INSERT OR REPLACE INTO {POPULARITY_TABLE}(product_id, term, hits) VALUES (new.product_id, {new_name}, "
+            f"COALESCE((SELECT hits FROM {TERMS_TABLE} WHERE term = {new_name}), 0)); END"
+        )
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_pop_ad AFTER DELETE ON Products BEGIN "
+            f"DELETE FROM {POPULARITY_TABLE} WHERE product_id = old.product_id; END"
+        )
+        if not existed:
+            # backfill from the history recorded before the rollup existed
+            await conn.exec_driver_sql(f"DELETE FROM {TERMS_TABLE}")
+            await conn.exec_driver_sql(
+                f"INSERT INTO {TERMS_TABLE}(term, hits, last_searched) "
+                f"SELECT {_TERM.format('search_item')} AS t, COUNT(*), MAX(timestamp) FROM Search_History "
+                "WHERE t <> '' GROUP BY t"
+            )
+            await conn.exec_driver_sql(
+                f"INSERT OR REPLACE INTO {POPULARITY_TABLE}(product_id, term, hits) "
+                f"SELECT p.product_id, {_TERM.format('p.product_name')}, COALESCE(st.hits, 0) FROM Products p "
+                f"LEFT JOIN {TERMS_TABLE} st ON st.term = {_TERM.format('p.product_name')}"
+            )
+    except Exception:
+        logging.exception("popularity rollup unavailable")
+        return False
+    return True
@@ -0,0 +1,50 @@
+"""
+SQL predicates for the field filters of a `ParsedQuery`.
+
+Product columns compare with `COLLATE NOCASE` so they can use the NOCASE
+indexes created in `init_db`. Shop-side filters (city, price, instock) become a
+`product_id IN (SELECT ...)` over `Shop_Product`, driven from the city or price
+index, so SQLite looks up only the matching products by primary key instead of
+testing every product row. All conditions of one filter apply to the same
+listing: `city:indore price:<500` means a shop in Indore sells it under 500.
+"""
+from app.core.query_parser import ParsedQuery
+
+
+def product_filter_sql(parsed: ParsedQuery, alias: str = "p") -> tuple[list[str], dict]:
+    """Return (where clauses, params) restricting `alias` (a Products row) to the filters."""
+    clauses: list[str] = []
+    params: dict = {}
+    if parsed.brand:
+        clauses.append(f"{alias}.brand = :qf_brand COLLATE NOCASE")
+        params["qf_brand"] = parsed.brand
+    if parsed.color:
+        clauses.append(f"{alias}.color = :qf_color COLLATE NOCASE")
+        params["qf_color"] = parsed.color
+    if parsed.category:
+        clauses.append(
+            f"{alias}.category_key IN (SELECT category_key FROM Product_Categories "
+            "WHERE category_name = :qf_category COLLATE NOCASE)"
+        )
+        params["qf_category"] = parsed.category
+    if parsed.needs_listing:
+        conds = []
+        for i, (op, value) in enumerate(parsed.prices):
+            conds.append(f"sp.price {op} :qf_price{i}")
+            params[f"qf_price{i}"] = value
+        if parsed.instock:
+            conds.append("sp.stock > 0")
+        extra = "".join(f" AND {c}" for c in conds)
+        if parsed.city:
+            params["qf_city"] = parsed.city
+            clauses.append(
+                f"{alias}.product_id IN ("
+                "SELECT sp.product_id FROM Shop_Address a JOIN Shop_Product sp ON sp.shop_id = a.shop_id "
+                f"WHERE a.city = :qf_city COLLATE NOCASE{extra} "
+                "UNION "
+                "SELECT sp.product_id FROM Shops s JOIN Shop_Product sp ON sp.shop_id = s.shop_id "
+                f"WHERE s.city = :qf_city COLLATE NOCASE{extra})"
+            )
+        else:
+            clauses.append(f"{alias}.product_id IN (SELECT sp.product_id FROM Shop_Product sp WHERE {' AND '.join(conds)})")
+    return clauses, params
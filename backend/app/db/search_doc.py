@@ -0,0 +1,83 @@
+"""
+Denormalized product search documents.
+
+`Product_Search_Doc` holds one row per product with everything a search result
+needs: name, brand, color, category name, primary image, min/max listed price,
+the number of shops with stock and the review aggregate. Triggers on `Products`,
+`Product_Categories`, `Shop_Product`, `Product_Images` and `Product_Reviews`
+rebuild the affected product's row inside the writing transaction, so search
+endpoints join one row per hit instead of querying images and listings again.
+"""
+import logging
+
+
+DOC_TABLE = "Product_Search_Doc"
+
+_COLUMNS = (
+    "product_id, product_name, brand, color, category_name, image_url, "
+    "min_price, max_price, in_stock_shops, rating_avg, rating_count"
+)
+
+
+def _refresh(where: str) -> str:
+    # rebuild the rows of the products matched by `where` (over Products p)
+    return (
+        f"INSERT OR REPLACE INTO {DOC_TABLE}({_COLUMNS}) "
+        "SELECT p.product_id, p.product_name, p.brand, p.color, "
+        "COALESCE((SELECT c.category_name FROM Product_Categories c WHERE c.category_key = p.category_key LIMIT 1), "
+        "(SELECT c.category_name FROM Product_Categories c WHERE c.category_id = p.category_id)), "
+        "(SELECT i.image_url FROM Product_Images i WHERE i.product_id = p.product_id ORDER BY i.rowid LIMIT 1), "
+        "(SELECT MIN(sp.price) FROM Shop_Product sp WHERE sp.product_id = p.product_id), "
+        "(SELECT MAX(sp.price) FROM Shop_Product sp WHERE sp.product_id = p.product_id), "
+        "(SELECT COUNT(DISTINCT sp.shop_id) FROM Shop_Product sp WHERE sp.product_id = p.product_id AND sp.stock > 0), "
+        "(SELECT AVG(r.rating) FROM Product_Reviews r WHERE r.product_id = p.product_id), "
+        "(SELECT COUNT(*) FROM Product_Reviews r WHERE r.product_id = p.product_id) "
+        f"FROM Products p WHERE {where}; "
+    )
+
+
+def _child_triggers(table: str, name: str) -> list[str]:
+    # rows of `table` carry a product_id; any change refreshes the old and new product
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{name}_doc_ai AFTER INSERT ON {table} BEGIN "
+        + _refresh("p.product_id = new.product_id") + "END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{name}_doc_au AFTER UPDATE ON {table} BEGIN "
+        + _refresh("p.product_id = old.product_id") + _refresh("p.product_id = new.product_id") + "END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{name}_doc_ad AFTER DELETE ON {table} BEGIN "
+        + _refresh("p.product_id = old.product_id") + "END",
+    ]
+
+
+async def ensure_search_doc(conn) -> bool:
+    try:
+        existed = (await conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (DOC_TABLE,)
+        )).first()
+        await conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {DOC_TABLE} ("
+            "product_id BLOB PRIMARY KEY, product_name TEXT, brand TEXT, color TEXT, category_name TEXT, "
+            "image_url TEXT, min_price NUMERIC, max_price NUMERIC, in_stock_shops INTEGER NOT NULL DEFAULT 0, "
+            "rating_avg REAL, rating_count INTEGER NOT NULL DEFAULT 0)"
+        )
+        statements = [
+            "CREATE TRIGGER IF NOT EXISTS trg_products_doc_ai AFTER INSERT ON Products BEGIN "
+            + _refresh("p.product_id = new.product_id") + "END",
+            "CREATE TRIGGER IF NOT EXISTS trg_products_doc_au AFTER UPDATE ON Products BEGIN "
+            f"DELETE FROM {DOC_TABLE} WHERE product_id = old.product_id; "
+            + _refresh("p.product_id = new.product_id") + "END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_products_doc_ad AFTER DELETE ON Products BEGIN "
+            f"DELETE FROM {DOC_TABLE} WHERE product_id = old.product_id; END",
+            "CREATE TRIGGER IF NOT EXISTS trg_product_categories_doc_au AFTER UPDATE OF category_name ON Product_Categories BEGIN "
+            + _refresh("p.category_key = new.category_key OR p.category_id = new.category_id") + "END",
+        ]
+        statements += _child_triggers("Shop_Product", "shop_product")
+        statements += _child_triggers("Product_Images", "product_images")
+        statements += _child_triggers("Product_Reviews", "product_reviews")
+        for sql in statements:
+            await conn.exec_driver_sql(sql)
+        if not existed:
+            await conn.exec_driver_sql(_refresh("1 = 1").rstrip("; "))
+    except Exception:
+        logging.exception("product search documents unavailable")
+        return False
+    return True
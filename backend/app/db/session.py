@@ -1,3 +1,4 @@
+import asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import event
 from pathlib import Path
@@ -36,6 +37,37 @@ async def init_db():
         # Indexes for search performance
         await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shops_city ON Shops(city)")
         await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shop_address_city ON Shop_Address(city)")
+        # Keyset pagination indexes: listings page on (created_at, id)
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_products_created_at ON Products(created_at, product_id)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shops_created_at ON Shops(created_at, shop_id)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_users_created_at ON Users(created_at, user_id)")
+        # NOCASE indexes behind structured search filters (brand:, color:, category:, city:, price:)
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_products_brand_nocase ON Products(brand COLLATE NOCASE)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_products_color_nocase ON Products(color COLLATE NOCASE)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_product_categories_name_nocase ON Product_Categories(category_name COLLATE NOCASE)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shop_address_city_nocase ON Shop_Address(city COLLATE NOCASE)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shops_city_nocase ON Shops(city COLLATE NOCASE)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shop_product_price ON Shop_Product(price, stock, product_id)")
+        # Bulk import: match existing products by name, listings by (shop, product)
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_products_name_nocase ON Products(product_name COLLATE NOCASE)")
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shop_product_shop_product ON Shop_Product(shop_id, product_id)")
+        # Product page: newest reviews of a product
+        await conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_product_reviews_product ON Product_Reviews(product_id, created_at)")
+        # Full-text index over Products, kept in sync by triggers
+        from app.db.fts import ensure_product_fts
+        await ensure_product_fts(conn)
+        # R*Tree over shop coordinates for nearby lookups
+        from app.db.geo import ensure_shop_rtree
+        await ensure_shop_rtree(conn)
+        # Search popularity rollup, kept current by triggers on Search_History
+        from app.db.popularity import ensure_popularity_rollup
+        await ensure_popularity_rollup(conn)
+        # One search document per product, rebuilt by triggers on its source tables
+        from app.db.search_doc import ensure_search_doc
+        await ensure_search_doc(conn)
+        # Phonetic keys per product word, written by the product create paths
+        from app.db.phonetic import ensure_phonetic_index, sync_phonetic_keys
+        await ensure_phonetic_index(conn)
         # Seed: ensure 'Surf' product exists for search testing
         try:
             exists = await conn.exec_driver_sql("SELECT COUNT(1) FROM Products WHERE LOWER(product_name) = 'surf'")
@@ -106,6 +138,28 @@ async def init_db():
             await _seed_products(conn, banaras_sid, "Banaras Product")
         except Exception:
             pass
+        # keys for seeded products and rows inserted outside the API
+        await sync_phonetic_keys(conn)
+
+async def load_search_indexes():
+    # In-memory search structures are built once at startup and updated by write paths
+    from app.core.trigram import load_trigram_index
+    from app.core.geo_engine import load_geo_engine
+    from app.core.trending import load_trending
+    from app.core.suggest import load_suggest_index
+    from app.core.spelling import load_spelling
+    from app.core.synonyms import load_synonyms
+    load_synonyms()
+    from app.core.shop_ranking import load_shop_features
+    async with engine.connect() as conn:
+        await load_trigram_index(conn)
+        await load_geo_engine(conn)
+        await load_suggest_index(conn)
+        await load_spelling(conn)
+        await load_shop_features(conn)
+    async with engine.begin() as conn:
+        await load_trending(conn)
+
 
 # Also enforce SQLite foreign keys for every new connection
 @event.listens_for(engine.sync_engine, "connect")
@@ -123,3 +177,15 @@ def _set_sqlite_pragma(dbapi_connection, connection_record):
 async def get_session() -> AsyncSession:
     async with SessionLocal() as session:
         yield session
+
+
+async def gather_reads(*reads):
+    """Run independent reads concurrently, each `read(session)` on its own pooled session.
+
+    SQLite in WAL mode serves readers on separate connections in parallel, so the
+    total latency is close to the slowest read rather than the sum.
+    """
+    async def _run(read):
+        async with SessionLocal() as session:
+            return await read(session)
+    return await asyncio.gather(*(_run(read) for read in reads))
@@ -1,7 +1,7 @@
 from .user import User, UserCreate, UserLogin, UserRead
 from .shop import Shop, ShopAddress, ShopTiming
 from .owner import ShopOwner, OwnerLogin, OwnerRead
-from .product import Product, ProductImage, ShopProduct, ProductCreate, ProductRead
+from .product import Product, ProductImage, ShopProduct, ProductCreate, ProductRead, ProductBatchRequest
 from .category import ProductCategory
 from .review import ProductReview, ReviewCreate, ReviewRead
 from .history import SearchHistory
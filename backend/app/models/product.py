@@ -88,6 +88,10 @@ class ProductCreate(BaseModel):
         return v.strip() if isinstance(v, str) else v
 
 
+class ProductBatchRequest(BaseModel):
+    ids: list[str]
+
+
 class ProductRead(BaseModel):
     product_id: int | str
     product_name: str
@@ -180,6 +180,45 @@ class ShopProductAdd(BaseModel):
 class ShopInventoryUpdate(BaseModel):
     price: float | None = None
     stock: int | None = None
+
+
+class ShopInventoryItem(BaseModel):
+    product_id: str
+    price: float | None = None
+    stock: int | None = None
+
+    @field_validator("product_id")
+    @classmethod
+    def _hex_id(cls, v: str) -> str:
+        # product ids are 16-byte blobs: exactly 32 hex characters
+        v = v.strip().lower()
+        try:
+            if len(v) != 32:
+                raise ValueError
+            bytes.fromhex(v)
+        except ValueError:
+            raise ValueError("Invalid product id format")
+        return v
+
+    @field_validator("price", "stock")
+    @classmethod
+    def _non_negative(cls, v):
+        if v is not None and not v >= 0:
+            raise ValueError("Must be non-negative")
+        return v
+
+
+class ShopInventoryBatch(BaseModel):
+    items: list[ShopInventoryItem]
+
+    @field_validator("items")
+    @classmethod
+    def _size(cls, v: list[ShopInventoryItem]) -> list[ShopInventoryItem]:
+        if not v:
+            raise ValueError("At least one item is required")
+        if len(v) > 1000:
+            raise ValueError("At most 1000 items per batch")
+        return v
 """
 Shop-related models.
 Relationships:
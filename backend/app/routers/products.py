@@ -2,10 +2,19 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, R
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 
-from app.db.session import get_session
+from app.db.session import get_session, gather_reads
+from app.db.fts import product_text_filter
+from app.db.phonetic import add_phonetic_keys
+from app.db.geo import shop_distances
 from app.core.auth import get_current_owner
-from app.models import Product, ShopProduct, Shop, ShopAddress, ProductImage, Log, ProductCreate, ProductRead
+from app.models import Product, ShopProduct, Shop, ShopAddress, ProductImage, Log, ProductCreate, ProductRead, ProductBatchRequest
 from app.core.imagekit import ImageKitClient
+from app.core.search_indexes import products_created
+from app.core.query_cache import query_cache, normalize_query, city_tag, CATALOG_TAG
+from app.core.pagination import decode_cursor, is_paginated, keyset_where, page_size, respond, trim_page
+from app.core.singleflight import coalesce
+from app.core.versions import bump_version, conditional
+from app.core.shop_ranking import rank_best
 from sqlalchemy.exc import IntegrityError
 
 
@@ -26,10 +35,12 @@ async def create_product(payload: ProductCreate, db: AsyncSession = Depends(get_
         ), {"name": name, "cat_key": cat_key, "brand": payload.brand, "desc": payload.description, "color": payload.color})).first()
         if not prow:
             raise HTTPException(status_code=500, detail="Failed to create product")
+        await add_phonetic_keys(db, prow[0], prow[1], prow[3])
         await db.commit()
     except IntegrityError:
         raise HTTPException(status_code=409, detail="Product already exists")
     pid, pname, pcat, pbrand, pdesc, pcolor = prow
+    products_created((pid, pname, pbrand))
     return {
         "product_id": (pid.hex() if isinstance(pid, (bytes, bytearray)) else pid),
         "product_name": pname,
@@ -41,13 +52,23 @@ async def create_product(payload: ProductCreate, db: AsyncSession = Depends(get_
 
 
 @router.get("/")
-async def list_products(db: AsyncSession = Depends(get_session)):
-    res = await db.execute(text(
-        "SELECT product_id, product_name, brand, description, color FROM Products ORDER BY created_at DESC"
-    ))
-    rows = res.all()
+@coalesce
+async def list_products(limit: int | None = None, cursor: str | None = None, db: AsyncSession = Depends(get_session)):
+    paginated = is_paginated(limit, cursor)
+    where, params = keyset_where(("created_at", "product_id"), decode_cursor(cursor))
+    sql = "SELECT product_id, product_name, brand, description, color, created_at FROM Products"
+    if where:
+        sql += f" WHERE {where}"
+    sql += " ORDER BY created_at DESC, product_id DESC"
+    if paginated:
+        sql += " LIMIT :lim"
+        params["lim"] = page_size(limit) + 1
+    rows = (await db.execute(text(sql), params)).all()
+    next_cursor = None
+    if paginated:
+        rows, next_cursor = trim_page(rows, page_size(limit), lambda r: (r[5], r[0]))
     items = []
-    for pid, pname, pbrand, pdesc, pcolor in rows:
+    for pid, pname, pbrand, pdesc, pcolor, _ in rows:
         items.append({
             "product_id": (pid.hex() if isinstance(pid, (bytes, bytearray)) else pid),
             "product_name": pname,
@@ -56,13 +77,12 @@ async def list_products(db: AsyncSession = Depends(get_session)):
             "color": pcolor,
             "category_id": None,
         })
-    return items
+    return respond(items, next_cursor, paginated)
 
 
 # ProductPrice endpoints removed to comply strictly with db.txt
 
-@router.get("/id/{product_id}")
-async def product_detail(product_id: str, db: AsyncSession = Depends(get_session)):
+async def _product_detail(product_id: str, db: AsyncSession) -> dict:
     pid_bytes = None
     pid_int = None
     try:
@@ -80,7 +100,7 @@ async def product_detail(product_id: str, db: AsyncSession = Depends(get_session
         ), {"pid": pid_bytes})).first()
         if not row:
             raise HTTPException(status_code=404, detail="Product not found")
-        img = await db.execute(select(ProductImage).where(ProductImage.product_id == pid_bytes))
+        img = await db.execute(select(ProductImage).where(ProductImage.product_id == pid_bytes).order_by(text("rowid")))
         image_url = None
         first = img.scalars().first()
         if first:
@@ -98,7 +118,7 @@ async def product_detail(product_id: str, db: AsyncSession = Depends(get_session
     product = res.scalar_one_or_none()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    img = await db.execute(select(ProductImage).where(ProductImage.product_id == pid_int))
+    img = await db.execute(select(ProductImage).where(ProductImage.product_id == pid_int).order_by(text("rowid")))
     image_url = None
     first = img.scalars().first()
     if first:
@@ -112,9 +132,155 @@ async def product_detail(product_id: str, db: AsyncSession = Depends(get_session
         "image_url": image_url,
     }
 
+
+@router.get("/id/{product_id}")
+@conditional("product", "product_id")
+async def product_detail(product_id: str, db: AsyncSession = Depends(get_session)):
+    return await _product_detail(product_id, db)
+
+MAX_BATCH_IDS = 300
+
+
+async def _products_by_ids(db: AsyncSession, ids: list[str]) -> dict:
+    # same id handling as product_detail: hex ids, then integer ids; one query for
+    # the products and one for their images, whatever the number of ids
+    wanted = {}
+    for raw in ids:
+        pid = raw.strip()
+        if not pid:
+            continue
+        try:
+            wanted.setdefault(pid, bytes.fromhex(pid))
+        except ValueError:
+            try:
+                wanted.setdefault(pid, int(pid))
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"Invalid product id format: {pid}")
+    if len(wanted) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    if not wanted:
+        return {"items": {}, "missing": []}
+    keys = {f"pid{i}": pid for i, pid in enumerate(set(wanted.values()))}
+    in_clause = ", ".join(":" + k for k in keys)
+    rows = {}
+    for pid, name, brand, color, desc in (await db.execute(text(
+        f"SELECT product_id, product_name, brand, color, description FROM Products WHERE product_id IN ({in_clause})"
+    ), keys)).all():
+        rows[bytes(pid) if isinstance(pid, memoryview) else pid] = (name, brand, color, desc)
+    images = {}
+    if rows:
+        # the first image by insertion order, as product_detail and the search doc pick it
+        for pid, url in (await db.execute(text(
+            f"SELECT product_id, image_url FROM Product_Images WHERE product_id IN ({in_clause}) ORDER BY rowid"
+        ), keys)).all():
+            images.setdefault(bytes(pid) if isinstance(pid, memoryview) else pid, url)
+    items = {}
+    missing = []
+    for raw, pid in wanted.items():
+        row = rows.get(pid)
+        if row is None:
+            missing.append(raw)
+            continue
+        items[raw] = {
+            "product_id": raw if isinstance(pid, bytes) else pid,
+            "product_name": row[0],
+            "brand": row[1],
+            "color": row[2],
+            "description": row[3],
+            "image_url": images.get(pid),
+        }
+    return {"items": items, "missing": missing}
+
+
+@router.get("/batch")
+@coalesce
+async def products_batch(ids: str = "", db: AsyncSession = Depends(get_session)):
+    return await _products_by_ids(db, ids.split(","))
+
+
+@router.post("/batch")
+async def products_batch_post(payload: ProductBatchRequest, db: AsyncSession = Depends(get_session)):
+    return await _products_by_ids(db, payload.ids)
+
+
+@router.get("/in_city")
+@coalesce
+async def products_in_city(city: str, q: str | None = None, limit: int | None = None, cursor: str | None = None, db: AsyncSession = Depends(get_session)):
+    from sqlalchemy import text
+    city_norm = (city or "").strip()
+    if not city_norm:
+        raise HTTPException(status_code=400, detail="City is required")
+    import re
+    if not re.fullmatch(r"[A-Za-z\s\-]{2,100}", city_norm):
+        raise HTTPException(status_code=422, detail="Invalid city format")
+    paginated = is_paginated(limit, cursor)
+    key = ("products_in_city", normalize_query(city_norm), normalize_query(q), limit, cursor)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return respond(cached[0], cached[1], paginated)
+    exists = (await db.execute(text(
+        "SELECT 1 FROM Shops WHERE LOWER(city) = LOWER(:c) UNION SELECT 1 FROM Shop_Address WHERE LOWER(city) = LOWER(:c) LIMIT 1"
+    ), {"c": city_norm})).first()
+    if not exists:
+        raise HTTPException(status_code=404, detail="City not found")
+    params = {"c": city_norm}
+    fts_join, fts_where = "", ""
+    if q and q.strip():
+        fts_join, fts_where, _, fts_params = product_text_filter(q)
+        params.update(fts_params)
+    ks_where, ks_params = keyset_where(("p.created_at", "p.product_id"), decode_cursor(cursor))
+    params.update(ks_params)
+    # one row per product: SQLite returns the bare columns of the MIN(price) row
+    sql = (
+        "SELECT p.product_id, p.product_name, p.brand, p.description, MIN(sp.price) AS price, sp.stock, a.city, p.created_at "
+        "FROM Shop_Product sp "
+        "JOIN Shops s ON sp.shop_id = s.shop_id "
+        "LEFT JOIN Shop_Address a ON a.shop_id = s.shop_id "
+        f"JOIN Products p ON p.product_id = sp.product_id {fts_join} "
+        "WHERE (LOWER(s.city) = LOWER(:c) OR LOWER(a.city) = LOWER(:c)) "
+        "AND (sp.stock IS NOT NULL AND sp.stock > 0)"
+    )
+    if fts_where:
+        sql += f" AND {fts_where}"
+    if ks_where:
+        sql += f" AND {ks_where}"
+    sql += " GROUP BY p.product_id ORDER BY p.created_at DESC, p.product_id DESC"
+    if paginated:
+        sql += " LIMIT :lim"
+        params["lim"] = page_size(limit) + 1
+    rows = (await db.execute(text(sql), params)).all()
+    next_cursor = None
+    if paginated:
+        rows, next_cursor = trim_page(rows, page_size(limit), lambda r: (r[7], r[0]))
+    out = []
+    def _hex_or_plain(val):
+        if isinstance(val, (bytes, bytearray)):
+            return val.hex()
+        try:
+            if type(val).__name__ == 'memoryview':
+                return bytes(val).hex()
+        except Exception:
+            pass
+        return val
+    for pid, pname, brand, desc, price, stock, c, _ in rows:
+        out.append({
+            "product_id": _hex_or_plain(pid),
+            "product_name": pname,
+            "brand": brand,
+            "description": desc,
+            "price": float(price) if price is not None else None,
+            "stock": stock,
+            "city": c,
+        })
+    query_cache.put(key, (out, next_cursor), product_ids=[r[0] for r in rows], tags=(CATALOG_TAG, city_tag(city_norm)))
+    return respond(out, next_cursor, paginated)
+
+
+# catch-all: fixed GET paths (/batch, /in_city) must be declared above it
 @router.get("/{product_id}")
+@conditional("product", "product_id")
 async def product_detail_alias(product_id: str, db: AsyncSession = Depends(get_session)):
-    return await product_detail(product_id, db)
+    return await _product_detail(product_id, db)
 
 
 @router.post("/{product_id}/image")
@@ -213,6 +379,8 @@ async def upload_product_image(
     except Exception:
         pass
     await db.commit()
+    bump_version("product", product_key)
+    query_cache.invalidate_products(product_key)
     return {"product_id": product_id, "image_url": image_url}
 
 
@@ -232,6 +400,7 @@ async def create_product_with_image(
     product = Product(product_name=product_name, category_id=category_id, brand=brand, description=description, color=color)
     db.add(product)
     await db.flush()
+    await add_phonetic_keys(db, product.product_id, product_name, brand)
 
     # Reject any image upload attempts
     if file or file_url:
@@ -249,70 +418,25 @@ async def create_product_with_image(
         raise HTTPException(status_code=403, detail="Image uploads are currently disabled")
 
     await db.commit()
+    products_created((product.product_id, product_name, brand))
     await db.refresh(product)
     return {"product_id": product.product_id, "product_name": product.product_name, "image_url": None}
 
 
-@router.get("/in_city")
-async def products_in_city(city: str, q: str | None = None, db: AsyncSession = Depends(get_session)):
-    from sqlalchemy import text
-    city_norm = (city or "").strip()
-    if not city_norm:
-        raise HTTPException(status_code=400, detail="City is required")
-    import re
-    if not re.fullmatch(r"[A-Za-z\s\-]{2,100}", city_norm):
-        raise HTTPException(status_code=422, detail="Invalid city format")
-    exists = (await db.execute(text(
-        "SELECT 1 FROM Shops WHERE LOWER(city) = LOWER(:c) UNION SELECT 1 FROM Shop_Address WHERE LOWER(city) = LOWER(:c) LIMIT 1"
-    ), {"c": city_norm})).first()
-    if not exists:
-        raise HTTPException(status_code=404, detail="City not found")
-    sql = (
-        "SELECT p.product_id, p.product_name, p.brand, p.description, sp.price, sp.stock, a.city "
-        "FROM Shop_Product sp "
-        "JOIN Shops s ON sp.shop_id = s.shop_id "
-        "LEFT JOIN Shop_Address a ON a.shop_id = s.shop_id "
-        "JOIN Products p ON p.product_id = sp.product_id "
-        "WHERE (LOWER(s.city) = LOWER(:c) OR LOWER(a.city) = LOWER(:c)) "
-        "AND (sp.stock IS NOT NULL AND sp.stock > 0)"
-    )
-    params = {"c": city_norm}
-    if q and q.strip():
-        params["pat"] = f"%{q}%"
-        sql += " AND (LOWER(p.product_name) LIKE LOWER(:pat) OR LOWER(p.brand) LIKE LOWER(:pat) OR LOWER(p.description) LIKE LOWER(:pat))"
-    rows = (await db.execute(text(sql), params)).all()
-    out = []
-    def _hex_or_plain(val):
-        if isinstance(val, (bytes, bytearray)):
-            return val.hex()
-        try:
-            if type(val).__name__ == 'memoryview':
-                return bytes(val).hex()
-        except Exception:
-            pass
-        return val
-    for pid, pname, brand, desc, price, stock, c in rows:
-        out.append({
-            "product_id": _hex_or_plain(pid),
-            "product_name": pname,
-            "brand": brand,
-            "description": desc,
-            "price": float(price) if price is not None else None,
-            "stock": stock,
-            "city": c,
-        })
-    dedup: dict[str, dict] = {}
-    for item in out:
-        pid = str(item["product_id"])
-        if pid not in dedup or (
-            (item["price"] is not None and (dedup[pid]["price"] is None or item["price"] < dedup[pid]["price"]))
-        ):
-            dedup[pid] = item
-    return list(dedup.values())
-
-
 @router.get("/{product_id}/prices")
-async def product_prices(product_id: str, db: AsyncSession = Depends(get_session)):
+@coalesce
+async def product_prices(
+    product_id: str,
+    sort: str = "price",
+    lat: float | None = None,
+    lon: float | None = None,
+    radius_km: float = 25.0,
+    db: AsyncSession = Depends(get_session),
+):
+    if sort not in ("price", "best", "distance"):
+        raise HTTPException(status_code=422, detail="sort must be 'price', 'best' or 'distance'")
+    if sort == "distance" and (lat is None or lon is None):
+        raise HTTPException(status_code=422, detail="sort=distance needs lat and lon")
     pid_bytes = None
     pid_int = None
     try:
@@ -336,8 +460,14 @@ async def product_prices(product_id: str, db: AsyncSession = Depends(get_session
                 "shop_name": sname,
                 "price": float(price) if price is not None else None,
                 "stock": stock,
+                "_sid": sid,
             })
-        return sorted(out, key=lambda x: (x["price"] is None, x["price"] or 0.0))
+        out = sorted(out, key=lambda x: (x["price"] is None, x["price"] or 0.0))
+        if sort != "price":
+            out = await _sort_offers(db, out, sort, lat, lon, radius_km)
+        for x in out:
+            del x["_sid"]
+        return out
     # integer fallback
     stmt = (
         select(ShopProduct, Shop, ShopAddress)
@@ -357,5 +487,111 @@ async def product_prices(product_id: str, db: AsyncSession = Depends(get_session
             "city": getattr(addr, "city", None),
             "area": getattr(addr, "area", None),
             "shop_image": s.shop_image,
+            "_sid": s.shop_id,
         })
-    return sorted(out, key=lambda x: (x["price"] is None, x["price"] or 0.0))
+    out = sorted(out, key=lambda x: (x["price"] is None, x["price"] or 0.0))
+    if sort != "price":
+        out = await _sort_offers(db, out, sort, lat, lon, radius_km)
+    for x in out:
+        del x["_sid"]
+    return out
+
+
+async def _sort_offers(db, offers: list[dict], sort: str, lat, lon, radius_km: float) -> list[dict]:
+    # offers arrive cheapest first; distance only counts when the caller gave a
+    # location, and shops outside the radius have none
+    distance = None
+    if lat is not None and lon is not None:
+        near = await shop_distances(db, float(lat), float(lon), radius_km)
+        distance = [near.get(x["_sid"], float("nan")) for x in offers]
+        for x, d in zip(offers, distance):
+            x["distance_km"] = round(d, 2) if d == d else None
+    if sort == "distance":
+        return sorted(offers, key=lambda x: (x["distance_km"] is None, x["distance_km"] or 0.0))
+    return await rank_best(
+        db, offers, [x["_sid"] for x in offers],
+        distance=distance,
+        price=[x["price"] if x["price"] is not None else float("nan") for x in offers],
+        stock=[x["stock"] for x in offers],
+    )
+
+
+MAX_PAGE_REVIEWS = 50
+
+
+@router.get("/{product_id}/page")
+@coalesce
+async def product_page(
+    product_id: str,
+    lat: float | None = None,
+    lon: float | None = None,
+    radius_km: float = 25.0,
+    reviews_limit: int = 10,
+):
+    # detail, images, offers and reviews in one response; the four reads are
+    # independent, so each runs concurrently on its own pooled session
+    try:
+        pid = bytes.fromhex(product_id)
+    except ValueError:
+        try:
+            pid = int(product_id)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid product id format")
+    lim = max(1, min(int(reviews_limit), MAX_PAGE_REVIEWS))
+    located = lat is not None and lon is not None
+
+    async def detail(db):
+        return (await db.execute(text(
+            "SELECT product_name, brand, color, description FROM Products WHERE product_id = :pid"
+        ), {"pid": pid})).first()
+
+    async def images(db):
+        rows = (await db.execute(text(
+            "SELECT image_url FROM Product_Images WHERE product_id = :pid ORDER BY rowid"
+        ), {"pid": pid})).all()
+        return [url for (url,) in rows]
+
+    async def offers(db):
+        return await product_prices(
+            product_id, sort="distance" if located else "price", lat=lat, lon=lon, radius_km=radius_km, db=db,
+        )
+
+    async def reviews(db):
+        avg, count = (await db.execute(text(
+            "SELECT AVG(rating), COUNT(*) FROM Product_Reviews WHERE product_id = :pid"
+        ), {"pid": pid})).first()
+        rows = (await db.execute(text(
+            "SELECT review_id, user_id, rating, review_text, created_at FROM Product_Reviews "
+            "WHERE product_id = :pid ORDER BY created_at DESC LIMIT :lim"
+        ), {"pid": pid, "lim": lim})).all()
+        return {
+            "rating_avg": round(float(avg), 2) if avg is not None else None,
+            "rating_count": count,
+            "items": [
+                {
+                    "review_id": (rid.hex() if isinstance(rid, (bytes, bytearray)) else rid),
+                    "user_id": (uid.hex() if isinstance(uid, (bytes, bytearray)) else uid),
+                    "rating": rating,
+                    "review_text": body,
+                    "created_at": created,
+                }
+                for rid, uid, rating, body, created in rows
+            ],
+        }
+
+    row, image_urls, offer_rows, review_page = await gather_reads(detail, images, offers, reviews)
+    if not row:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {
+        "product": {
+            "product_id": product_id if isinstance(pid, bytes) else pid,
+            "product_name": row[0],
+            "brand": row[1],
+            "color": row[2],
+            "description": row[3],
+            "image_url": image_urls[0] if image_urls else None,
+        },
+        "images": image_urls,
+        "offers": offer_rows,
+        "reviews": review_page,
+    }
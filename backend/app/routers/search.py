@@ -1,14 +1,33 @@
-from fastapi import APIRouter, Depends, Request, Response
-import difflib
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
+from sqlalchemy import text
 from app.db.session import get_session
-from app.models import Product, ProductImage, SearchHistory, Shop, ShopAddress, ProductCategory, ShopProduct
-from math import radians, sin, cos, sqrt, atan2
+from app.db.fts import product_text_filter
+from app.db.query_filters import product_filter_sql
+from app.db.search_doc import DOC_TABLE
+from app.db.phonetic import phonetic_candidates
+from app.db.geo import shops_within, nearby_shop_ids, shop_distances
+from app.core.trigram import trigram_index, similarity
+from app.core.pagination import is_paginated, respond
+from app.core.ranking import TopK, STATS_HEADER
+from app.core.trending import trending
+from app.db.history_writer import history_writer
+from app.core.query_cache import query_cache, normalize_query, city_tag, CATALOG_TAG, LISTING_TAG
+from app.core.suggest import suggest_index
+from app.core.spelling import spelling
+from app.core.query_parser import parse_query
+from app.core.facets import FacetCounter
+from app.core.singleflight import coalesce
 
 
 router = APIRouter()
 
+# best hits of a recorded search that count towards trending
+TRENDING_HITS_PER_SEARCH = 3
+# searches with fewer hits than this get a "did you mean" suggestion
+SUGGEST_BELOW_RESULTS = 3
+
 def score_match(name: str, q: str) -> float:
     if not name:
         return 0.0
@@ -20,170 +39,321 @@ def score_match(name: str, q: str) -> float:
         return 90.0
     if q_l in name_l:
         return 75.0
-    return difflib.SequenceMatcher(None, name_l, q_l).ratio() * 60.0
+    return similarity(name_l, q_l) * 60.0
+
+
+def _in_params(prefix: str, values) -> tuple[str, dict]:
+    values = list(values)
+    placeholders = ", ".join(f":{prefix}{i}" for i in range(len(values)))
+    return placeholders, {f"{prefix}{i}": v for i, v in enumerate(values)}
+
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+async def _history_user(db: AsyncSession, user_id: str):
+    # checked before the search runs: the write-behind queue would only find a
+    # bad id at flush time, after the request had already succeeded
+    # user ids are 16-byte blobs sent as hex; older clients send integers
+    try:
+        uid = bytes.fromhex(user_id) if len(user_id) == 32 else int(user_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid user id format")
+    if not (await db.execute(text("SELECT 1 FROM Users WHERE user_id = :uid"), {"uid": uid})).first():
+        raise HTTPException(status_code=422, detail="Unknown user id")
+    return uid
 
 
 @router.get("/products")
-async def search_products(q: str, user_id: int | None = None, db: AsyncSession = Depends(get_session)):
-    rows = (await db.execute(text(
-        "SELECT product_id, product_name, brand, color FROM Products "
-        "WHERE LOWER(product_name) LIKE LOWER(:pat) "
-        "OR LOWER(brand) LIKE LOWER(:pat) "
-        "OR LOWER(description) LIKE LOWER(:pat)"
-    ), {"pat": f"%{q}%"})).all()
-    product_ids = [pid for pid, _, _, _ in rows]
-    img_map = {}
-    if product_ids:
-        imgs = await db.execute(select(ProductImage).where(ProductImage.product_id.in_(product_ids)))
-        for img in imgs.scalars().all():
-            img_map.setdefault(img.product_id, img.image_url)
-    if user_id is not None:
-        db.add(SearchHistory(user_id=user_id, search_item=q))
-        await db.commit()
-    out = []
-    for pid, pname, brand, color in rows:
-        name = pname or ""
-        brand_s = brand or ""
-        base = score_match(name, q)
-        bonus = 12.0 if q.lower() in brand_s.lower() else 0.0
-        pid_out = _hex_or_plain(pid)
-        out.append({
-            "product_id": pid_out,
+async def search_products(q: str, user_id: str | None = None, limit: int | None = None, cursor: str | None = None, facets: bool = False, db: AsyncSession = Depends(get_session), response: Response = None):
+    # facets=true always answers with the {items, next_cursor, ...} envelope
+    paginated = is_paginated(limit, cursor) or facets
+    uid = await _history_user(db, user_id) if user_id is not None else None
+    cached, facet_data = await _cached_ranking("search_products", _rank_products, q, limit, cursor, facets, db, _cache_tags(q))
+    if uid is not None:
+        # trending credit is resolved to cities by the write-behind flush, off the request path
+        history_writer.enqueue(uid, q, cached["product_ids"][:TRENDING_HITS_PER_SEARCH] if cursor is None else ())
+        suggest_index.bump(q)
+    body = respond(cached["items"], cached["next_cursor"], paginated)
+    if paginated:
+        body["suggestion"] = cached["suggestion"]
+    if facets:
+        body["facets"] = facet_data
+    if response is not None:
+        response.headers[STATS_HEADER] = cached["stats"]
+        if cached["suggestion"] and not paginated:
+            # bare-array responses carry the suggestion in a header to stay compatible
+            response.headers["X-Search-Suggestion"] = quote(cached["suggestion"])
+    return body
+
+
+def _cache_tags(q: str) -> tuple[str, ...]:
+    # listing filters can start matching a product when a shop lists it, which
+    # the product ids of the cached result cannot catch
+    parsed = parse_query(q)
+    if parsed.city:
+        return (CATALOG_TAG, city_tag(parsed.city))
+    if parsed.needs_listing:
+        return (CATALOG_TAG, LISTING_TAG)
+    return (CATALOG_TAG,)
+
+
+async def _cached_ranking(name: str, rank, q: str, limit: int | None, cursor: str | None, facets: bool, db: AsyncSession, tags: tuple[str, ...] = (CATALOG_TAG,)) -> tuple[dict, dict | None]:
+    """Return the cached page for `rank` and, when asked, its facets.
+
+    Facets cover the whole match set, so they are cached once per query rather than
+    per page and depend on every matched product, not only the ones on the page.
+    """
+    key = (name, normalize_query(q), limit, cursor)
+    facet_key = (f"{name}_facets", normalize_query(q))
+    cached = query_cache.get(key)
+    facet_data = query_cache.get(facet_key) if facets else None
+    counter = FacetCounter() if facets and facet_data is None else None
+    if cached is None or counter is not None:
+        fresh = await rank(q, limit, cursor, db, counter)
+        if cached is None:
+            cached = fresh
+            query_cache.put(key, cached, product_ids=cached["product_ids"], tags=tags)
+        if counter is not None:
+            facet_data = counter.result()
+            query_cache.put(facet_key, facet_data, product_ids=counter.product_ids, tags=tags)
+    return cached, facet_data
+
+
+def _product_score(q: str, q_l: str, pname, brand, rank) -> tuple:
+    if rank is not None:
+        # bm25 is negative, lower is better
+        return (1, -float(rank))
+    bonus = 12.0 if q_l in (brand or "").lower() else 0.0
+    return (1, score_match(pname or "", q) + bonus)
+
+
+def _suggest(parsed) -> str | None:
+    corrected = spelling.suggest(parsed.text)
+    if corrected is None:
+        return None
+    return " ".join([corrected] + parsed.qualifiers)
+
+
+async def _rank_products(q: str, limit: int | None, cursor: str | None, db: AsyncSession, counter: FacetCounter | None = None) -> dict:
+    top = TopK(limit, cursor)
+    parsed = parse_query(q)
+    text_q = parsed.text
+    q_l = text_q.lower()
+    filters, params = product_filter_sql(parsed)
+    fts_join, rank_sql = "", None
+    where = list(filters)
+    if text_q:
+        fts_join, fts_where, rank_sql, fts_params = product_text_filter(text_q)
+        where.append(fts_where)
+        params.update(fts_params)
+    direct = set()
+    sql = (
+        f"SELECT p.product_id, p.product_name, p.brand, p.color, {rank_sql or 'NULL'} AS rank, "
+        "d.image_url, d.category_name, d.min_price "
+        f"FROM Products p {fts_join} LEFT JOIN {DOC_TABLE} d ON d.product_id = p.product_id"
+    )
+    # an empty query lists every product, as the LIKE '%%' search did
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    result = await db.stream(text(sql), params)
+    async for row in result:
+        pid, pname, brand, color, rank, _, category, min_price = row
+        direct.add(pid)
+        if counter is not None:
+            counter.add(pid, brand, color, category, min_price)
+        score = _product_score(text_q, q_l, pname, brand, rank) if text_q else (1, 0.0)
+        top.push((score, _hex_or_plain(pid)), row)
+    # typo-tolerant and sound-alike candidates that the text filter missed
+    fuzzy = trigram_index.best_scores(text_q, kinds=("product", "brand")) if text_q else {}
+    if text_q:
+        for pid, share in (await phonetic_candidates(db, text_q)).items():
+            fuzzy[pid] = max(fuzzy.get(pid, 0.0), share)
+    missing = [pid for pid in fuzzy if pid not in direct]
+    if missing:
+        placeholders, in_params = _in_params("pid", missing)
+        filters, filter_params = product_filter_sql(parsed)
+        in_params.update(filter_params)
+        result = await db.stream(text(
+            "SELECT p.product_id, p.product_name, p.brand, p.color, NULL AS rank, d.image_url, d.category_name, d.min_price "
+            "FROM Products p "
+            f"LEFT JOIN {DOC_TABLE} d ON d.product_id = p.product_id WHERE {' AND '.join([f'p.product_id IN ({placeholders})'] + filters)}"
+        ), in_params)
+        async for row in result:
+            if counter is not None:
+                counter.add(row[0], row[2], row[3], row[6], row[7])
+            # fuzzy-only hits rank below every direct text match
+            top.push(((0, fuzzy.get(row[0], 0.0) * 60.0), _hex_or_plain(row[0])), row)
+    winners, next_cursor = top.page()
+    items = [
+        {
+            "product_id": k[1],
             "product_name": pname,
             "brand": brand,
             "color": color,
-            "image_url": img_map.get(pid),
-            "_score": base + bonus,
-        })
-    out.sort(key=lambda x: x["_score"], reverse=True)
-    return [{k: v for k, v in d.items() if k != "_score"} for d in out]
+            "image_url": image_url,
+        }
+        for k, (_, pname, brand, color, _, image_url, _, _) in winners
+    ]
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "product_ids": [row[0] for _, row in winners],
+        "suggestion": _suggest(parsed) if top.scanned < SUGGEST_BELOW_RESULTS else None,
+        "stats": top.stats_header(len(items)),
+    }
+
+
+@router.get("/suggest")
+async def suggest(prefix: str, limit: int = 10, kind: str | None = None):
+    # served from memory only; kind narrows to product, brand, category or shop
+    kinds = tuple(k.strip() for k in kind.split(",") if k.strip()) if kind else None
+    return [
+        {"text": value, "kind": k, "score": weight}
+        for value, k, weight in suggest_index.complete(prefix, k=max(1, min(limit, 50)), kinds=kinds)
+    ]
 
 
 @router.get("/shops")
-async def search_shops(q: str, db: AsyncSession = Depends(get_session)):
-    res = await db.execute(
-        select(Shop, ShopAddress).join(ShopAddress, ShopAddress.shop_id == Shop.shop_id).where(Shop.shop_name.ilike(f"%{q}%"))
-    )
-    rows = res.all()
-    out = []
-    for s, addr in rows:
-        sid = s.shop_id
-        if isinstance(sid, (bytes, bytearray)):
-            sid = sid.hex()
-        out.append({
-            "shop_id": sid,
-            "shop_name": s.shop_name,
-            "city": addr.city,
-            "area": addr.area,
-            "shop_image": s.shop_image,
-            "_score": score_match(s.shop_name or "", q),
-        })
-    out.sort(key=lambda x: x["_score"], reverse=True)
-    return [{k: v for k, v in d.items() if k != "_score"} for d in out]
+@coalesce
+async def search_shops(q: str, limit: int | None = None, cursor: str | None = None, db: AsyncSession = Depends(get_session), response: Response = None):
+    paginated = is_paginated(limit, cursor)
+    top = TopK(limit, cursor)
+    # substring matches plus every typo-tolerant candidate; TopK does the paging
+    fuzzy = trigram_index.best_scores(q, kinds=("shop",), limit=None)
+    placeholders, params = _in_params("sid", fuzzy)
+    params["pat"] = f"%{q}%"
+    where = "LOWER(s.shop_name) LIKE LOWER(:pat)"
+    if fuzzy:
+        where += f" OR s.shop_id IN ({placeholders})"
+    result = await db.stream(text(
+        "SELECT s.shop_id, s.shop_name, s.shop_image, a.city, a.area "
+        "FROM Shops s JOIN Shop_Address a ON a.shop_id = s.shop_id "
+        f"WHERE {where}"
+    ), params)
+    async for row in result:
+        top.push((score_match(row[1] or "", q), _hex_or_plain(row[0])), row)
+    winners, next_cursor = top.page()
+    items = [
+        {"shop_id": k[1], "shop_name": name, "city": city, "area": area, "shop_image": img}
+        for k, (_, name, img, city, area) in winners
+    ]
+    if response is not None:
+        response.headers[STATS_HEADER] = top.stats_header(len(items))
+    return respond(items, next_cursor, paginated)
 
 
 @router.get("/categories")
-async def search_by_category(q: str, db: AsyncSession = Depends(get_session)):
-    rows = (await db.execute(text(
-        "SELECT p.product_id, p.product_name, p.brand, p.color, c.category_name "
-        "FROM Products p LEFT JOIN Product_Categories c ON c.category_key = p.category_key "
-        "WHERE LOWER(c.category_name) LIKE LOWER(:pat)"
-    ), {"pat": f"%{q}%"})).all()
-    product_ids = [pid for pid, _, _, _, _ in rows]
-    img_map = {}
-    if product_ids:
-        imgs = await db.execute(select(ProductImage).where(ProductImage.product_id.in_(product_ids)))
-        for img in imgs.scalars().all():
-            img_map.setdefault(img.product_id, img.image_url)
-    out = []
-    for pid, pname, brand, color, cat_name in rows:
-        out.append({
-            "product_id": _hex_or_plain(pid),
+@coalesce
+async def search_by_category(q: str, limit: int | None = None, cursor: str | None = None, facets: bool = False, db: AsyncSession = Depends(get_session), response: Response = None):
+    paginated = is_paginated(limit, cursor) or facets
+    cached, facet_data = await _cached_ranking("search_by_category", _rank_category, q, limit, cursor, facets, db)
+    if response is not None:
+        response.headers[STATS_HEADER] = cached["stats"]
+    body = respond(cached["items"], cached["next_cursor"], paginated)
+    if facets:
+        body["facets"] = facet_data
+    return body
+
+
+async def _rank_category(q: str, limit: int | None, cursor: str | None, db: AsyncSession, counter: FacetCounter | None = None) -> dict:
+    top = TopK(limit, cursor)
+    fuzzy = trigram_index.best_scores(q, kinds=("category",), limit=None)
+    placeholders, params = _in_params("cid", fuzzy)
+    params["pat"] = f"%{q}%"
+    where = "LOWER(c.category_name) LIKE LOWER(:pat)"
+    if fuzzy:
+        where += f" OR c.rowid IN ({placeholders})"
+    result = await db.stream(text(
+        "SELECT p.product_id, p.product_name, p.brand, p.color, c.category_name, d.image_url, d.min_price "
+        "FROM Product_Categories c JOIN Products p ON p.category_key = c.category_key "
+        f"LEFT JOIN {DOC_TABLE} d ON d.product_id = p.product_id "
+        f"WHERE {where}"
+    ), params)
+    async for row in result:
+        if counter is not None:
+            counter.add(row[0], row[2], row[3], row[4], row[6])
+        top.push((score_match(row[4] or "", q), _hex_or_plain(row[0])), row)
+    winners, next_cursor = top.page()
+    items = [
+        {
+            "product_id": k[1],
             "product_name": pname,
             "brand": brand,
             "color": color,
             "category": cat_name,
-            "image_url": img_map.get(pid),
-            "_score": score_match(cat_name or "", q),
-        })
-    out.sort(key=lambda x: x["_score"], reverse=True)
-    return [{k: v for k, v in d.items() if k != "_score"} for d in out]
+            "image_url": image_url,
+        }
+        for k, (_, pname, brand, color, cat_name, image_url, _) in winners
+    ]
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "product_ids": [row[0] for _, row in winners],
+        "stats": top.stats_header(len(items)),
+    }
+
 
 @router.get("/products_nearby")
-async def products_nearby(q: str | None = None, lat: float = None, lon: float = None, radius_km: float = 5.0, db: AsyncSession = Depends(get_session), request: Request = None, response: Response = None):
+@coalesce
+async def products_nearby(q: str | None = None, lat: float = None, lon: float = None, radius_km: float = 5.0, limit: int | None = None, db: AsyncSession = Depends(get_session), request: Request = None, response: Response = None):
     if lat is None or lon is None:
         # fallback to normal search
         return await search_products(q or "", db=db)
     # find nearby shops
-    res = await db.execute(select(Shop, ShopAddress).join(ShopAddress, ShopAddress.shop_id == Shop.shop_id))
-    shops = []
-    for s, addr in res.all():
-        if addr.latitude is None or addr.longitude is None:
-            continue
-        distance = haversine(float(addr.latitude), float(addr.longitude), lat, lon)
-        if distance <= radius_km:
-            shops.append(s.shop_id)
+    shops = nearby_shop_ids(lat, lon, radius_km)
+    if shops is None:
+        shops = [s["shop_id"] for s in await shops_within(db, lat, lon, radius_km)]
     if not shops:
         return []
     # fetch products available in those shops
     # Build raw SQL with dynamic placeholders to avoid ORM decoding issues
-    placeholders = ", ".join([f":sid{i}" for i in range(len(shops))])
-    params = {f"sid{i}": shops[i] for i in range(len(shops))}
+    placeholders, params = _in_params("sid", shops)
+    fts_join, fts_where, rank_sql = "", "", None
+    has_q = bool(q and q.strip())
+    if has_q:
+        fts_join, fts_where, rank_sql, fts_params = product_text_filter(q)
+        params.update(fts_params)
     sql = (
-        f"SELECT sp.product_id, sp.price, sp.stock, p.product_name, p.brand, p.color "
-        f"FROM Shop_Product sp JOIN Products p ON sp.product_id = p.product_id "
+        f"SELECT sp.product_id, sp.price, sp.stock, p.product_name, p.brand, p.color, {rank_sql or 'NULL'} AS rank, d.image_url "
+        f"FROM Shop_Product sp JOIN Products p ON sp.product_id = p.product_id {fts_join} "
+        f"LEFT JOIN {DOC_TABLE} d ON d.product_id = p.product_id "
         f"WHERE sp.shop_id IN ({placeholders})"
     )
-    if q and q.strip():
-        params["pat"] = f"%{q}%"
-        sql += " AND (LOWER(p.product_name) LIKE LOWER(:pat) OR LOWER(p.brand) LIKE LOWER(:pat) OR LOWER(p.description) LIKE LOWER(:pat))"
-    res2 = await db.execute(text(sql), params)
-    rows = res2.all()
-    product_ids = list({pid for pid, _, _, _, _, _ in rows})
-    img_map = {}
-    if product_ids:
-        imgs = await db.execute(select(ProductImage).where(ProductImage.product_id.in_(product_ids)))
-        for img in imgs.scalars().all():
-            img_map.setdefault(img.product_id, img.image_url)
-    out = []
-    for pid, price, stock, pname, brand, color in rows:
-        if q and q.strip():
-            name = pname or ""
-            brand_s = brand or ""
-            base = score_match(name, q)
-            bonus = (12.0 if q.lower() in brand_s.lower() else 0.0)
-            total = base + bonus
+    if fts_where:
+        sql += f" AND {fts_where}"
+    q_l = (q or "").lower()
+    # one (score, row) per product, keeping its best-scoring listing
+    best = {}
+    scanned = 0
+    result = await db.stream(text(sql), params)
+    async for row in result:
+        scanned += 1
+        pid, price, _, pname, brand, _, rank, _ = row
+        if has_q:
+            score = _product_score(q, q_l, pname, brand, rank)[1]
         else:
             # no query: prefer availability and lower price
-            total = 50.0 - (float(price) if price is not None else 0.0)
-        pid_out = _hex_or_plain(pid)
-        out.append({
-            "product_id": pid_out,
+            score = 50.0 - (float(price) if price is not None else 0.0)
+        cur = best.get(pid)
+        if cur is None or score > cur[0]:
+            best[pid] = (score, row)
+    top = TopK(limit)
+    for score, row in best.values():
+        top.push((score,), row)
+    top.scanned = scanned
+    winners, _ = top.page()
+    out = [
+        {
+            "product_id": _hex_or_plain(pid),
             "product_name": pname,
             "brand": brand,
             "color": color,
             "price": float(price) if price is not None else None,
             "stock": stock,
-            "image_url": img_map.get(pid),
-            "_score": total,
-        })
-    # deduplicate by product_id keeping highest score
-    best = {}
-    for d in out:
-        pid = d["product_id"]
-        if pid not in best or d["_score"] > best[pid]["_score"]:
-            best[pid] = d
-    final = list(best.values())
-    final.sort(key=lambda x: x["_score"], reverse=True)
+            "image_url": image_url,
+        }
+        for _, (pid, price, stock, pname, brand, color, _, image_url) in winners
+    ]
     try:
+        response.headers[STATS_HEADER] = top.stats_header(len(out))
         origin = request.headers.get("origin") if request else None
         if origin:
             response.headers.setdefault("Vary", "Origin")
@@ -193,56 +363,150 @@ async def products_nearby(q: str | None = None, lat: float = None, lon: float =
                 response.headers["Access-Control-Allow-Credentials"] = "true"
     except Exception:
         pass
-    return [{k: v for k, v in d.items() if k != "_score"} for d in final]
+    return out
+
+@router.get("/best_price")
+@coalesce
+async def best_price(lat: float, lon: float, q: str | None = None, radius_km: float = 5.0, limit: int = 20, db: AsyncSession = Depends(get_session)):
+    # cheapest in-stock listing per product within the radius, plus the nearest in-stock shop
+    distances = await shop_distances(db, lat, lon, radius_km)
+    if not distances:
+        return []
+    values = ", ".join(f"(:sid{i}, :dist{i})" for i in range(len(distances)))
+    params = {"k": max(1, min(limit, 100))}
+    for i, (sid, distance) in enumerate(distances.items()):
+        params[f"sid{i}"] = sid
+        params[f"dist{i}"] = distance
+    join, where = "", []
+    if q and q.strip():
+        parsed = parse_query(q)
+        where, filter_params = product_filter_sql(parsed)
+        params.update(filter_params)
+        if parsed.text:
+            join, fts_where, _, fts_params = product_text_filter(parsed.text)
+            where.append(fts_where)
+            params.update(fts_params)
+    extra = "".join(f" AND {c}" for c in where)
+    rows = (await db.execute(text(
+        f"WITH near(shop_id, distance_km) AS (VALUES {values}), "
+        "ranked AS ("
+        "SELECT sp.product_id, sp.shop_id, sp.price, n.distance_km, "
+        "ROW_NUMBER() OVER (PARTITION BY sp.product_id ORDER BY sp.price, n.distance_km) AS price_rank, "
+        "ROW_NUMBER() OVER (PARTITION BY sp.product_id ORDER BY n.distance_km, sp.price) AS near_rank, "
+        "DENSE_RANK() OVER (PARTITION BY sp.product_id ORDER BY sp.shop_id) AS shop_seq "
+        "FROM near n JOIN Shop_Product sp ON sp.shop_id = n.shop_id "
+        f"JOIN Products p ON p.product_id = sp.product_id {join} "
+        f"WHERE sp.stock > 0 AND sp.price IS NOT NULL{extra}), "
+        "best AS ("
+        "SELECT product_id, "
+        "MAX(CASE WHEN price_rank = 1 THEN shop_id END) AS shop_id, "
+        "MAX(CASE WHEN price_rank = 1 THEN price END) AS price, "
+        "MAX(CASE WHEN price_rank = 1 THEN distance_km END) AS distance_km, "
+        "MAX(CASE WHEN near_rank = 1 THEN shop_id END) AS nearest_shop_id, "
+        "MAX(CASE WHEN near_rank = 1 THEN price END) AS nearest_price, "
+        "MAX(CASE WHEN near_rank = 1 THEN distance_km END) AS nearest_distance_km, "
+        "MAX(shop_seq) AS shop_count "
+        "FROM ranked GROUP BY product_id) "
+        "SELECT b.product_id, d.product_name, d.brand, d.image_url, b.shop_id, b.price, b.distance_km, "
+        "b.nearest_shop_id, b.nearest_price, b.nearest_distance_km, b.shop_count "
+        f"FROM best b JOIN {DOC_TABLE} d ON d.product_id = b.product_id "
+        "ORDER BY b.price, b.distance_km, d.product_name LIMIT :k"
+    ), params)).all()
+    return [
+        {
+            "product_id": _hex_or_plain(pid),
+            "product_name": name,
+            "brand": brand,
+            "image_url": image_url,
+            "shop_id": _hex_or_plain(sid),
+            "price": float(price),
+            "distance_km": round(distance, 3),
+            "shop_count": shop_count,
+            "nearest_shop_id": _hex_or_plain(near_sid),
+            "nearest_price": float(near_price),
+            "nearest_distance_km": round(near_distance, 3),
+        }
+        for pid, name, brand, image_url, sid, price, distance, near_sid, near_price, near_distance, shop_count in rows
+    ]
+
 
 @router.get("/popular")
+@coalesce
 async def popular_products(lat: float | None = None, lon: float | None = None, radius_km: float = 5.0, limit: int = 12, db: AsyncSession = Depends(get_session)):
-    # popularity from search history counts
-    res = await db.execute(select(Product))
-    products = res.scalars().all()
-    # nearby shops filter if location provided
-    nearby_shop_ids = None
+    # popularity comes from the Product_Popularity rollup kept by Search_History triggers
+    shop_ids = []
+    if lat is not None and lon is not None:
+        shop_ids = nearby_shop_ids(lat, lon, radius_km)
+        if shop_ids is None:
+            shop_ids = [s["shop_id"] for s in await shops_within(db, lat, lon, radius_km)]
+    if not shop_ids:
+        rows = (await db.execute(text(
+            "SELECT d.product_id, d.product_name, d.brand, d.image_url FROM Product_Popularity pp "
+            f"JOIN {DOC_TABLE} d ON d.product_id = pp.product_id "
+            "ORDER BY pp.hits DESC LIMIT :k"
+        ), {"k": limit})).all()
+    else:
+        # a product nearby is worth 20 points, one search 5: the winners are either in the
+        # global top-K or in the top-K of what the nearby shops stock
+        placeholders, params = _in_params("sid", shop_ids)
+        params["k"] = limit
+        rows = (await db.execute(text(
+            f"WITH nearby AS (SELECT DISTINCT product_id FROM Shop_Product WHERE shop_id IN ({placeholders})), "
+            "cand AS ("
+            "SELECT product_id FROM (SELECT product_id FROM Product_Popularity ORDER BY hits DESC LIMIT :k) "
+            "UNION "
+            "SELECT product_id FROM (SELECT pp.product_id FROM nearby n JOIN Product_Popularity pp ON pp.product_id = n.product_id "
+            "ORDER BY pp.hits DESC LIMIT :k)) "
+            "SELECT d.product_id, d.product_name, d.brand, d.image_url FROM cand c "
+            "JOIN Product_Popularity pp ON pp.product_id = c.product_id "
+            f"JOIN {DOC_TABLE} d ON d.product_id = c.product_id "
+            "LEFT JOIN nearby n ON n.product_id = c.product_id "
+            "ORDER BY pp.hits * 5.0 + (CASE WHEN n.product_id IS NULL THEN 0.0 ELSE 20.0 END) DESC, pp.hits DESC "
+            "LIMIT :k"
+        ), params)).all()
+    return [
+        {"product_id": _hex_or_plain(pid), "product_name": name, "brand": brand, "image_url": image_url}
+        for pid, name, brand, image_url in rows
+    ]
+
+
+@router.get("/trending")
+@coalesce
+async def trending_products(city: str | None = None, lat: float | None = None, lon: float | None = None, radius_km: float = 5.0, limit: int = 20, db: AsyncSession = Depends(get_session)):
+    # scores decay with settings.trending_half_life_hours; city and radius filters combine
+    among = None
     if lat is not None and lon is not None:
-        res_shops = await db.execute(select(Shop, ShopAddress).join(ShopAddress, ShopAddress.shop_id == Shop.shop_id))
-        nearby_shop_ids = []
-        for s, addr in res_shops.all():
-            if addr.latitude is None or addr.longitude is None:
-                continue
-            distance = haversine(float(addr.latitude), float(addr.longitude), lat, lon)
-            if distance <= radius_km:
-                nearby_shop_ids.append(s.shop_id)
-    # calculate popularity
-    # naive approach: presence in nearby shops and global name frequency in search history
-    freq = {}
-    hist = await db.execute(select(SearchHistory))
-    for h in hist.scalars().all():
-        key = (h.search_item or "").strip().lower()
-        if key:
-            freq[key] = freq.get(key, 0) + 1
-    # image map
-    ids = [p.product_id for p in products]
-    img_map = {}
-    if ids:
-        imgs = await db.execute(select(ProductImage).where(ProductImage.product_id.in_(ids)))
-        for img in imgs.scalars().all():
-            img_map.setdefault(img.product_id, img.image_url)
-    scored = []
-    for p in products:
-        base = freq.get((p.product_name or "").lower(), 0) * 5.0
-        availability_bonus = 0.0
-        if nearby_shop_ids is not None and nearby_shop_ids:
-            sp = await db.execute(select(ShopProduct).where(ShopProduct.product_id == p.product_id, ShopProduct.shop_id.in_(nearby_shop_ids)))
-            if sp.scalars().all():
-                availability_bonus = 20.0
-        scored.append({
-            "product_id": p.product_id,
-            "product_name": p.product_name,
-            "brand": p.brand,
-            "image_url": img_map.get(p.product_id),
-            "_score": base + availability_bonus,
+        shop_ids = nearby_shop_ids(lat, lon, radius_km)
+        if shop_ids is None:
+            shop_ids = [s["shop_id"] for s in await shops_within(db, lat, lon, radius_km)]
+        if not shop_ids:
+            return []
+        placeholders, params = _in_params("sid", shop_ids)
+        among = {pid for (pid,) in (await db.execute(text(
+            f"SELECT DISTINCT product_id FROM Shop_Product WHERE shop_id IN ({placeholders})"
+        ), params)).all()}
+    top = trending.top(limit, city=city, among=among)
+    if not top:
+        return []
+    placeholders, params = _in_params("pid", [pid for pid, _ in top])
+    details = {row[0]: row for row in (await db.execute(text(
+        f"SELECT product_id, product_name, brand, image_url FROM {DOC_TABLE} WHERE product_id IN ({placeholders})"
+    ), params)).all()}
+    out = []
+    for pid, score in top:
+        row = details.get(pid)
+        if row is None:
+            continue
+        out.append({
+            "product_id": _hex_or_plain(pid),
+            "product_name": row[1],
+            "brand": row[2],
+            "image_url": row[3],
+            "score": round(score, 4),
         })
-    scored.sort(key=lambda x: x["_score"], reverse=True)
-    return [{k: v for k, v in d.items() if k != "_score"} for d in scored[:limit]]
+    return out
+
+
 def _hex_or_plain(val):
     try:
         import memoryview as _mv  # not real module; ignore if fails
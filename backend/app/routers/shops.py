@@ -1,4 +1,3 @@
-from math import radians, sin, cos, sqrt, atan2
 import os
 import time
 from collections import deque
@@ -7,11 +6,24 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 from sqlalchemy.orm import selectinload
 from app.db.session import get_session
+from app.db.geo import shops_within
+from app.db.phonetic import add_phonetic_keys
+from app.db.bulk_import import apply_batch
 from app.core.auth import get_current_owner, ensure_owner_of_shop
 from app.core.config import settings
-from app.models import Shop, ShopAddress, ShopProduct, Product, ShopOwner, ProductImage
+from app.models import Shop, ShopProduct, Product, ShopOwner, ProductImage
 from app.core.imagekit import ImageKitClient
-from app.models.shop import ShopCreate, ShopRead, ShopRegister, ShopProductAdd, ShopInventoryUpdate
+from app.core.trigram import index_shop
+from app.core.suggest import suggest_shop
+from app.core.search_indexes import products_created
+from app.core.geo_engine import refresh_shop_location
+from app.core.query_cache import query_cache, invalidate_listing
+from app.core.pagination import decode_cursor, is_paginated, keyset_where, page_size, respond, trim_page
+from app.core.singleflight import coalesce
+from app.core.versions import bump_version, conditional
+from app.core.shop_ranking import rank_best
+from app.core.bulk_import import ImportReport, RowError, detect_format, iter_records, parse_row
+from app.models.shop import ShopCreate, ShopRead, ShopRegister, ShopProductAdd, ShopInventoryUpdate, ShopInventoryBatch
 from app.routers.realtime import notify_shop_update
 from sqlalchemy import update
 from datetime import datetime
@@ -70,6 +82,7 @@ async def create_shop(payload: ShopCreate, db: AsyncSession = Depends(get_sessio
     db.add(shop)
     await db.commit()
     await db.refresh(shop)
+    bump_version("shops")
     return shop
 
 
@@ -178,6 +191,10 @@ async def register_shop(payload: ShopRegister, db: AsyncSession = Depends(get_se
         )
 
     await db.commit()
+    bump_version("shops")
+    index_shop(row[0], row[1])
+    suggest_shop(row[1])
+    await refresh_shop_location(db, row[0])
     sid = row[0]
     if isinstance(sid, (bytes, bytearray)):
         sid = sid.hex()
@@ -185,63 +202,61 @@ async def register_shop(payload: ShopRegister, db: AsyncSession = Depends(get_se
 
 
 @router.get("/")
-async def list_shops(db: AsyncSession = Depends(get_session)):
-    res = await db.execute(select(Shop))
+@conditional("shops")
+async def list_shops(limit: int | None = None, cursor: str | None = None, db: AsyncSession = Depends(get_session)):
+    paginated = is_paginated(limit, cursor)
+    where, params = keyset_where(("created_at", "shop_id"), decode_cursor(cursor))
+    sql = "SELECT shop_id, shop_name, shop_image, created_at FROM Shops"
+    if where:
+        sql += f" WHERE {where}"
+    sql += " ORDER BY created_at DESC, shop_id DESC"
+    if paginated:
+        sql += " LIMIT :lim"
+        params["lim"] = page_size(limit) + 1
+    rows = (await db.execute(text(sql), params)).all()
+    next_cursor = None
+    if paginated:
+        rows, next_cursor = trim_page(rows, page_size(limit), lambda r: (r[3], r[0]))
     items = []
-    for s in res.scalars().all():
-        sid = s.shop_id
+    for sid, name, img, _ in rows:
         if isinstance(sid, (bytes, bytearray)):
             sid = sid.hex()
         items.append({
             "shop_id": sid,
-            "shop_name": s.shop_name,
-            "shop_image": s.shop_image,
+            "shop_name": name,
+            "shop_image": img,
         })
-    return items
-
-
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
+    return respond(items, next_cursor, paginated)
 
 
 @router.get("/nearby")
-async def nearby_shops(lat: float, lon: float, radius_km: float = 5.0, db: AsyncSession = Depends(get_session)):
-    res = await db.execute(select(Shop, ShopAddress).join(ShopAddress, ShopAddress.shop_id == Shop.shop_id, isouter=True))
-    rows = res.all()
+@coalesce
+async def nearby_shops(lat: float, lon: float, radius_km: float = 5.0, sort: str = "distance", db: AsyncSession = Depends(get_session)):
+    if sort not in ("distance", "best"):
+        raise HTTPException(status_code=422, detail="sort must be 'distance' or 'best'")
+    shops = await shops_within(db, float(lat), float(lon), radius_km)
     out = []
-    for shop, addr in rows:
-        if not addr or addr.latitude is None or addr.longitude is None:
-            continue
-        try:
-            lat1 = float(addr.latitude)
-            lon1 = float(addr.longitude)
-        except Exception:
-            # skip invalid coordinates
-            continue
-        distance = haversine(lat1, lon1, float(lat), float(lon))
-        if distance <= radius_km:
-            sid = shop.shop_id
-            if isinstance(sid, (bytes, bytearray)):
-                sid = sid.hex()
-            out.append({
-                "shop_id": sid,
-                "shop_name": shop.shop_name,
-                "distance_km": round(distance, 2),
-                "city": addr.city,
-                "area": addr.area,
-                "shop_image": shop.shop_image,
-                "lat": lat1,
-                "lon": lon1,
-            })
-    return sorted(out, key=lambda x: x["distance_km"])
+    for shop in shops:
+        sid = shop["shop_id"]
+        if isinstance(sid, (bytes, bytearray)):
+            sid = sid.hex()
+        out.append({
+            "shop_id": sid,
+            "shop_name": shop["shop_name"],
+            "distance_km": round(shop["distance_km"], 2),
+            "city": shop["city"],
+            "area": shop["area"],
+            "shop_image": shop["shop_image"],
+            "lat": shop["lat"],
+            "lon": shop["lon"],
+        })
+    if sort == "best":
+        out = await rank_best(db, out, [shop["shop_id"] for shop in shops], distance=[shop["distance_km"] for shop in shops])
+    return out
 
 
 @router.get("/by_city")
+@coalesce
 async def shops_by_city(city: str, db: AsyncSession = Depends(get_session)):
     from sqlalchemy import text
     norm = city.strip()
@@ -309,15 +324,30 @@ async def owner_products_hex(db: AsyncSession = Depends(get_session), owner=Depe
     return out
 
 @router.get("/{shop_id}/products")
-async def shop_products(shop_id: str = Path(..., pattern=r"^[0-9a-fA-F]{32}$"), db: AsyncSession = Depends(get_session)):
+@conditional("shop_products", "shop_id")
+async def shop_products(shop_id: str = Path(..., pattern=r"^[0-9a-fA-F]{32}$"), limit: int | None = None, cursor: str | None = None, db: AsyncSession = Depends(get_session)):
     sid_bytes = bytes.fromhex(shop_id)
-    rows = (await db.execute(text(
-        "SELECT sp.product_id, p.product_name, sp.price, sp.stock "
+    paginated = is_paginated(limit, cursor)
+    # a shop can list the same product twice, so the listing row id breaks ties
+    where, params = keyset_where(("p.created_at", "p.product_id", "sp.shop_product_id"), decode_cursor(cursor))
+    params["sid"] = sid_bytes
+    sql = (
+        "SELECT sp.product_id, p.product_name, sp.price, sp.stock, p.created_at, sp.shop_product_id "
         "FROM Shop_Product sp JOIN Products p ON sp.product_id = p.product_id "
         "WHERE sp.shop_id = :sid"
-    ), {"sid": sid_bytes})).all()
+    )
+    if where:
+        sql += f" AND {where}"
+    sql += " ORDER BY p.created_at DESC, p.product_id DESC, sp.shop_product_id DESC"
+    if paginated:
+        sql += " LIMIT :lim"
+        params["lim"] = page_size(limit) + 1
+    rows = (await db.execute(text(sql), params)).all()
+    next_cursor = None
+    if paginated:
+        rows, next_cursor = trim_page(rows, page_size(limit), lambda r: (r[4], r[0], r[5]))
     out = []
-    for pid, name, price, stock in rows:
+    for pid, name, price, stock, _, _ in rows:
         out.append({
             "product_id": (pid.hex() if isinstance(pid, (bytes, bytearray)) else pid),
             "product_name": name,
@@ -325,7 +355,7 @@ async def shop_products(shop_id: str = Path(..., pattern=r"^[0-9a-fA-F]{32}$"),
             "stock": stock,
             "image_url": None,
         })
-    return out
+    return respond(out, next_cursor, paginated)
 
 
 @router.post("/{shop_id}/products")
@@ -357,6 +387,8 @@ async def add_product_to_shop(
         except Exception:
             pass
         await db.commit()
+        bump_version("shop_products", sid_bytes)
+        await invalidate_listing(db, sid_bytes, pid_bytes)
         return {"shop_id": shop_id, "product_id": (pid.hex() if isinstance(pid, (bytes, bytearray)) else pid), "price": payload.price, "stock": payload.stock}
     # Fallback integer handling
     shop_id_int = int(shop_id)
@@ -379,6 +411,8 @@ async def add_product_to_shop(
     except Exception:
         pass
     await db.commit()
+    bump_version("shop_products", shop_id_int)
+    await invalidate_listing(db, shop_id_int, payload.product_id)
     return {"shop_id": shop_id_int, "product_id": payload.product_id, "price": payload.price, "stock": payload.stock}
 
 @router.patch("/{shop_id}/products/{product_id}/inventory")
@@ -401,6 +435,8 @@ async def update_shop_product_inventory(
     if payload.stock is not None:
         sp.stock = payload.stock
     await db.commit()
+    bump_version("shop_products", shop_id)
+    await invalidate_listing(db, shop_id, product_id)
     return {
         "shop_id": shop_id,
         "product_id": product_id,
@@ -428,6 +464,8 @@ async def delete_product_from_shop(
             raise HTTPException(status_code=403, detail="Not authorized for this shop")
         await db.execute(text("DELETE FROM Shop_Product WHERE shop_id=:sid AND product_id=:pid"), {"sid": sid_bytes, "pid": pid_bytes})
         await db.commit()
+        bump_version("shop_products", sid_bytes)
+        query_cache.invalidate_products(pid_bytes)
         try:
             await notify_shop_update(shop_id, {"event": "product_removed", "shop_id": shop_id, "product_id": product_id})
         except Exception:
@@ -445,6 +483,8 @@ async def delete_product_from_shop(
         raise HTTPException(status_code=404, detail="Product not linked to this shop")
     await db.delete(sp)
     await db.commit()
+    bump_version("shop_products", shop_id_int)
+    query_cache.invalidate_products(product_id_int)
     try:
         await notify_shop_update(shop_id_int, {"event": "product_removed", "shop_id": shop_id_int, "product_id": product_id_int})
     except Exception:
@@ -484,6 +524,7 @@ async def create_product_for_shop(
     product = Product(product_name=product_name, category_key=cat_key, brand=brand, description=description, color=color)
     db.add(product)
     await db.flush()
+    await add_phonetic_keys(db, product.product_id, product_name, brand)
 
     # Image handling policy: accept local file upload and store via ImageKit
     image_url = None
@@ -544,6 +585,8 @@ async def create_product_for_shop(
     db.add(sp)
 
     await db.commit()
+    bump_version("shop_products", shop_id)
+    products_created((product.product_id, product_name, brand))
     return {
         "shop_id": shop_id,
         "product_id": product.product_id,
@@ -553,6 +596,83 @@ async def create_product_for_shop(
         "image_url": image_url,
     }
 
+@router.post("/{shop_id}/products/import")
+async def import_shop_catalog(
+    shop_id: str,
+    request: Request,
+    format: str | None = None,
+    db: AsyncSession = Depends(get_session),
+    owner=Depends(get_current_owner),
+):
+    # body is streamed: text/csv with a header row, or application/x-ndjson
+    fmt = detect_format(format, request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass format=csv|ndjson")
+    try:
+        sid_bytes = bytes.fromhex(shop_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid shop id format")
+    oid_bytes = bytes.fromhex(owner.get("owner_id"))
+    chk = (await db.execute(text("SELECT owner_id FROM Shops WHERE shop_id = :sid"), {"sid": sid_bytes})).first()
+    if not chk or chk[0] != oid_bytes:
+        raise HTTPException(status_code=403, detail="Not authorized for this shop")
+    report = ImportReport(settings.import_max_errors)
+    size = max(1, settings.import_batch_size)
+    batch = []
+    try:
+        async for line, record in iter_records(request.stream(), fmt):
+            report.rows += 1
+            try:
+                if isinstance(record, RowError):
+                    raise record
+                batch.append((line, parse_row(record)))
+            except RowError as e:
+                report.error(line, str(e))
+                continue
+            if len(batch) >= size:
+                await _import_batch(db, sid_bytes, batch, report)
+                batch = []
+    except RowError as e:
+        # only a bad CSV header gets here, before any batch was written
+        raise HTTPException(status_code=422, detail=str(e))
+    if batch:
+        await _import_batch(db, sid_bytes, batch, report)
+    try:
+        from app.models import Log
+        db.add(Log(user_id=None, action_type="catalog_import", description=f"sid={shop_id}, rows={report.rows}, errors={report.error_count}", status_code=200))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+    try:
+        await notify_shop_update(shop_id, {"event": "catalog_import", "shop_id": shop_id, "rows": report.rows})
+    except Exception:
+        pass
+    return report.result()
+
+
+async def _import_batch(db: AsyncSession, sid_bytes: bytes, batch: list, report: ImportReport) -> None:
+    report.batches += 1
+    try:
+        result = await apply_batch(db, sid_bytes, batch)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        import logging
+        logging.exception("catalog import batch failed for shop %s", sid_bytes.hex())
+        for line, _ in batch:
+            report.error(line, "batch failed; none of its rows were written")
+        return
+    bump_version("shop_products", sid_bytes)
+    for line, message in result["errors"]:
+        report.error(line, message)
+    report.products_created += len(result["created"])
+    report.listings_created += result["listings_created"]
+    report.listings_updated += result["listings_updated"]
+    products_created(*result["created"])
+    if result["listed"]:
+        await invalidate_listing(db, sid_bytes, *result["listed"])
+
+
 @router.post("/manage/{shop_id}/products/create")
 async def create_product_for_shop_hex(
     shop_id: str,
@@ -576,11 +696,14 @@ async def create_product_for_shop_hex(
     if not prow:
         raise HTTPException(status_code=500, detail="Failed to create product")
     pid = prow[0]
+    await add_phonetic_keys(db, pid, prow[1], payload.get("brand"))
     await db.execute(text(
         "INSERT INTO Shop_Product (shop_product_id, shop_id, product_id, price, stock, created_at) "
         "VALUES (randomblob(16), :sid, :pid, :price, :stock, CURRENT_TIMESTAMP)"
     ), {"sid": sid_bytes, "pid": pid, "price": payload.get("price"), "stock": payload.get("stock")})
     await db.commit()
+    bump_version("shop_products", sid_bytes)
+    products_created((pid, prow[1], payload.get("brand")))
     return {"product_id": (pid.hex() if isinstance(pid, (bytes, bytearray)) else pid), "product_name": prow[1], "shop_id": shop_id}
 
 
@@ -653,6 +776,8 @@ async def upload_shop_image(
     # Persist on Shop (hex-safe update)
     await db.execute(text("UPDATE Shops SET shop_image = :img WHERE shop_id = :sid"), {"img": image_url, "sid": sid_bytes})
     await db.commit()
+    bump_version("shop", sid_bytes)
+    bump_version("shops")
 
     return {
         "shop_id": shop_id,
@@ -663,6 +788,7 @@ async def upload_shop_image(
     }
 
 @router.get("/{shop_id}")
+@conditional("shop", "shop_id")
 async def shop_detail(shop_id: str, db: AsyncSession = Depends(get_session)):
     try:
         sid_bytes = bytes.fromhex(shop_id)
@@ -739,8 +865,58 @@ async def update_shop_product_hex(shop_id: str, product_id: str, payload: dict,
     except Exception:
         pass
     await db.commit()
+    bump_version("shop_products", sid_bytes)
+    await invalidate_listing(db, sid_bytes, pid_bytes)
     return {"ok": True}
 
+@router.put("/manage/{shop_id}/products")
+async def update_shop_products_batch(shop_id: str, payload: ShopInventoryBatch, db: AsyncSession = Depends(get_session), owner=Depends(get_current_owner)):
+    try:
+        sid_bytes = bytes.fromhex(shop_id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid shop id format")
+    oid_bytes = bytes.fromhex(owner.get("owner_id"))
+    chk = (await db.execute(text("SELECT owner_id FROM Shops WHERE shop_id = :sid"), {"sid": sid_bytes})).first()
+    if not chk or chk[0] != oid_bytes:
+        raise HTTPException(status_code=403, detail="Not authorized for this shop")
+    # one row per product, the last item for a product wins; omitted fields keep their value
+    items = {}
+    for item in payload.items:
+        items[bytes.fromhex(item.product_id)] = {"sid": sid_bytes, "pid": bytes.fromhex(item.product_id), "price": item.price, "stock": item.stock}
+    keys = {f"pid{i}": pid for i, pid in enumerate(items)}
+    in_clause = ", ".join(":" + k for k in keys)
+    listed = {bytes(pid) for (pid,) in (await db.execute(text(
+        f"SELECT DISTINCT product_id FROM Shop_Product WHERE shop_id = :sid AND product_id IN ({in_clause})"
+    ), {**keys, "sid": sid_bytes})).all()}
+    rows = [row for pid, row in items.items() if pid in listed]
+    updated = {}
+    if rows:
+        await db.execute(text(
+            "UPDATE Shop_Product SET price = COALESCE(:price, price), stock = COALESCE(:stock, stock), "
+            "updated_at = CURRENT_TIMESTAMP WHERE shop_id = :sid AND product_id = :pid"
+        ), rows)
+        # report the stored values, since omitted fields were left as they were
+        for pid, price, stock in (await db.execute(text(
+            f"SELECT product_id, price, stock FROM Shop_Product WHERE shop_id = :sid AND product_id IN ({in_clause})"
+        ), {**keys, "sid": sid_bytes})).all():
+            updated[bytes(pid)] = {"product_id": bytes(pid).hex(), "price": float(price) if price is not None else None, "stock": stock}
+        try:
+            from app.models import Log
+            db.add(Log(user_id=None, action_type="shop_product_batch_update", description=f"sid={shop_id}, updated={len(rows)}", status_code=200))
+        except Exception:
+            pass
+        await db.commit()
+        bump_version("shop_products", sid_bytes)
+        await invalidate_listing(db, sid_bytes, *updated)
+        try:
+            await notify_shop_update(shop_id, {"event": "inventory_updated", "shop_id": shop_id, "items": list(updated.values())})
+        except Exception:
+            pass
+    return {
+        "updated": list(updated.values()),
+        "not_listed": [pid.hex() for pid in items if pid not in listed],
+    }
+
 @router.delete("/manage/{shop_id}/products/{product_id}")
 async def delete_shop_product_hex(shop_id: str, product_id: str, db: AsyncSession = Depends(get_session), owner=Depends(get_current_owner)):
     sid_bytes = bytes.fromhex(shop_id)
@@ -755,4 +931,6 @@ async def delete_shop_product_hex(shop_id: str, product_id: str, db: AsyncSessio
     except Exception:
         pass
     await db.commit()
+    bump_version("shop_products", sid_bytes)
+    query_cache.invalidate_products(pid_bytes)
     return {"ok": True}
@@ -1,29 +1,46 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import text
 from app.db.session import get_session
 from app.models import User, UserRead
 from app.core.auth import get_current_user
+from app.core.pagination import decode_cursor, is_paginated, keyset_where, page_size, respond, trim_page
 
 
 router = APIRouter()
 
 @router.get("/")
-async def list_users(db: AsyncSession = Depends(get_session)):
-    res = await db.execute(select(User))
+async def list_users(limit: int | None = None, cursor: str | None = None, db: AsyncSession = Depends(get_session)):
+    paginated = is_paginated(limit, cursor)
+    where, params = keyset_where(("created_at", "user_id"), decode_cursor(cursor))
+    sql = "SELECT user_id, name, email, phone, created_at FROM Users"
+    if where:
+        sql += f" WHERE {where}"
+    sql += " ORDER BY created_at DESC, user_id DESC"
+    if paginated:
+        sql += " LIMIT :lim"
+        params["lim"] = page_size(limit) + 1
+    rows = (await db.execute(text(sql), params)).all()
+    next_cursor = None
+    if paginated:
+        rows, next_cursor = trim_page(rows, page_size(limit), lambda r: (r[4], r[0]))
     items = []
-    for u in res.scalars().all():
-        uid = u.user_id
+    for uid, name, email, phone, created_at in rows:
         if isinstance(uid, (bytes, bytearray)):
             uid = uid.hex()
+        try:
+            created = datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
+        except ValueError:
+            created = created_at
         items.append({
             "user_id": uid,
-            "name": u.name,
-            "email": u.email,
-            "phone": u.phone,
-            "created_at": u.created_at,
+            "name": name,
+            "email": email,
+            "phone": phone,
+            "created_at": created,
         })
-    return items
+    return respond(items, next_cursor, paginated)
 
 
 # Purchases endpoint removed to comply with db.txt (no PurchaseHistory)
@@ -4,7 +4,12 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.middleware.metrics import metrics_middleware, get_metrics_summary
-from app.db.session import init_db
+from app.db.session import init_db, load_search_indexes
+from app.core.trending import start_trending_persistence, stop_trending_persistence
+from app.db.history_writer import history_writer
+from app.core.query_cache import query_cache
+from app.core.singleflight import single_flight
+from app.core.versions import versions
 from app.routers import auth, users, shops, products, reviews, search, admin, uploads, owners, verification, realtime
 from jose import jwt, JWTError
 
@@ -57,6 +62,15 @@ async def cors_and_admin_preflight(request: Request, call_next):
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    await load_search_indexes()
+    start_trending_persistence()
+    history_writer.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await history_writer.stop()
+    await stop_trending_persistence()
 
 
 # Middleware: secure and log all admin endpoint access attempts
@@ -116,4 +130,9 @@ async def read_root():
 
 @app.get("/api/metrics", tags=["monitoring"])
 async def metrics():
-    return get_metrics_summary()
+    summary = get_metrics_summary()
+    summary["search_history"] = history_writer.stats()
+    summary["query_cache"] = query_cache.stats()
+    summary["single_flight"] = single_flight.stats()
+    summary["conditional_get"] = versions.stats()
+    return summary
@@ -0,0 +1,101 @@
+"""
+Shared fixtures: the app runs against a throwaway copy of `nearbuy.db`.
+
+`DATABASE_URL` is pointed at the copy before anything under `app` is imported,
+so the engine, startup seeding and in-memory indexes never touch the checked-in
+database. Tests that need their own rows create them with the `make_shop` /
+`make_product` factories, which leave the in-memory indexes up to date.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+_TMP_DIR = Path(tempfile.mkdtemp(prefix="nearbuy-tests-"))
+DB_PATH = _TMP_DIR / "nearbuy.db"
+for suffix in ("", "-wal", "-shm"):
+    src = BACKEND_DIR / f"nearbuy.db{suffix}"
+    if src.exists():
+        shutil.copy(src, _TMP_DIR / f"nearbuy.db{suffix}")
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH.as_posix()}"
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as c:
+        yield c
+    shutil.rmtree(_TMP_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def sql():
+    """Run one statement on the test database and return its rows."""
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+
+    def run(query: str, params=()):
+        rows = conn.execute(query, params).fetchall()
+        conn.commit()
+        return rows
+
+    yield run
+    conn.close()
+
+
+@pytest.fixture
+def make_shop(client, sql):
+    """Create a shop with its own owner; returns `(shop_id_hex, owner_headers)`.
+
+    Rows are inserted directly (shop registration hashes a password, which is
+    beside the point here) and the in-memory search indexes are reloaded the way
+    startup builds them, so the shop is visible to every read path.
+    """
+    from app.core.security import create_access_token
+    from app.db.session import load_search_indexes
+
+    def make(name: str | None = None, city: str = "Testpur", lat: float | None = 23.25, lon: float | None = 77.41):
+        oid, sid = uuid.uuid4().bytes, uuid.uuid4().bytes
+        sql(
+            "INSERT INTO Shop_Owners (owner_id, owner_name, phone, email, password_hash, created_at) "
+            "VALUES (?, 'Test Owner', ?, ?, 'x', CURRENT_TIMESTAMP)",
+            (oid, oid.hex()[:10], f"owner-{oid.hex()}@example.com"),
+        )
+        sql(
+            "INSERT INTO Shops (shop_id, shop_name, owner_id, created_at, city) VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)",
+            (sid, name or f"Test Shop {sid.hex()[:8]}", oid, city),
+        )
+        sql(
+            "INSERT INTO Shop_Address (address_id, shop_id, city, latitude, longitude, created_at) "
+            "VALUES (randomblob(16), ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (sid, city, lat, lon),
+        )
+        client.portal.call(load_search_indexes)
+        token = create_access_token(oid.hex(), role="owner")
+        return sid.hex(), {"Authorization": f"Bearer {token}"}
+
+    return make
+
+
+@pytest.fixture
+def make_product(client):
+    """Create a product listed in `shop`; returns its hex id."""
+    def make(shop, name: str, brand: str | None = None, price: float | None = 10.0, stock: int | None = 5, **fields):
+        sid, headers = shop
+        resp = client.post(f"/api/shops/manage/{sid}/products/create", headers=headers, json={
+            "product_name": name, "brand": brand, "price": price, "stock": stock, **fields,
+        })
+        assert resp.status_code == 200, resp.text
+        return resp.json()["product_id"]
+
+    return make
@@ -0,0 +1,32 @@
+import uuid
+
+
+def test_batch_lookup_returns_found_and_missing(client, sql, make_shop, make_product):
+    shop = make_shop()
+    a = make_product(shop, "Lookly Pen", brand="Inkco", color="blue")
+    b = make_product(shop, "Lookly Pencil")
+    for url in ("https://img/first.jpg", "https://img/second.jpg"):
+        sql("INSERT INTO Product_Images (image_id, product_id, image_url) VALUES (randomblob(16), ?, ?)", (bytes.fromhex(a), url))
+    absent = uuid.uuid4().hex
+
+    ids = [a, f" {b.upper()} ", absent, a, ""]
+    by_get = client.get("/api/products/batch", params={"ids": ",".join(ids)}).json()
+    by_post = client.post("/api/products/batch", json={"ids": ids}).json()
+    assert by_get == by_post
+    assert set(by_get["items"]) == {a, b.upper()}
+    assert by_get["missing"] == [absent]
+    assert by_get["items"][a] == {
+        "product_id": a, "product_name": "Lookly Pen", "brand": "Inkco", "color": "blue",
+        "description": None, "image_url": "https://img/first.jpg",
+    }
+    assert by_get["items"][b.upper()]["image_url"] is None
+    # the same image the detail endpoint shows, whatever ids the images got
+    assert client.get(f"/api/products/id/{a}").json()["image_url"] == "https://img/first.jpg"
+
+
+def test_batch_lookup_limits(client):
+    assert client.get("/api/products/batch").json() == {"items": {}, "missing": []}
+    assert client.get("/api/products/batch", params={"ids": "abc,xyz"}).status_code == 422
+    too_many = [uuid.uuid4().hex for _ in range(301)]
+    assert client.post("/api/products/batch", json={"ids": too_many}).status_code == 422
+    assert client.post("/api/products/batch", json={"ids": too_many[:300]}).json()["missing"] == too_many[:300]
@@ -0,0 +1,51 @@
+import uuid
+
+
+def _put(client, sid, headers, items):
+    return client.put(f"/api/shops/manage/{sid}/products", headers=headers, json={"items": items})
+
+
+def test_batch_updates_listed_products_in_one_call(client, sql, make_shop, make_product):
+    shop = make_shop()
+    sid, headers = shop
+    a = make_product(shop, "Batchly Tea", price=100.0, stock=5)
+    b = make_product(shop, "Batchly Coffee", price=200.0, stock=7)
+    stranger = uuid.uuid4().hex
+    logs = sql("SELECT COUNT(*) FROM Log WHERE action_type = 'shop_product_batch_update'")[0][0]
+
+    resp = _put(client, sid, headers, [
+        {"product_id": a, "price": 90.0},
+        {"product_id": b.upper(), "stock": 3},
+        {"product_id": a, "stock": 0},  # last item for a product wins
+        {"product_id": stranger, "price": 1.0},
+    ])
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert sorted(body["updated"], key=lambda x: x["price"]) == [
+        {"product_id": a, "price": 100.0, "stock": 0},
+        {"product_id": b, "price": 200.0, "stock": 3},
+    ]
+    assert body["not_listed"] == [stranger]
+    assert sql("SELECT COUNT(*) FROM Log WHERE action_type = 'shop_product_batch_update'")[0][0] == logs + 1
+
+
+def test_batch_update_refreshes_cached_shop_pages(client, make_shop, make_product):
+    shop = make_shop()
+    sid, headers = shop
+    pid = make_product(shop, "Batchly Honey", price=300.0, stock=2)
+    first = client.get(f"/api/shops/{sid}/products")
+    etag = first.headers["ETag"]
+    assert _put(client, sid, headers, [{"product_id": pid, "price": 250.0}]).status_code == 200
+    again = client.get(f"/api/shops/{sid}/products", headers={"If-None-Match": etag})
+    assert again.status_code == 200
+    assert [p["price"] for p in again.json() if p["product_id"] == pid] == [250.0]
+
+
+def test_batch_update_rejections(client, make_shop, make_product):
+    shop, other = make_shop(), make_shop()
+    sid, headers = shop
+    pid = make_product(shop, "Batchly Jam")
+    assert _put(client, sid, other[1], [{"product_id": pid, "stock": 1}]).status_code == 403
+    assert _put(client, "not-hex", headers, [{"product_id": pid, "stock": 1}]).status_code == 422
+    for items in ([], [{"product_id": "xyz"}], [{"product_id": "ab"}], [{"product_id": ""}], [{"product_id": pid + "00"}], [{"product_id": pid, "price": -1}], [{"product_id": pid}] * 1001):
+        assert _put(client, sid, headers, items).status_code == 422
@@ -0,0 +1,39 @@
+import pytest
+
+
+def _list(sql, shop, pid, price, stock=5):
+    sql(
+        "INSERT INTO Shop_Product (shop_product_id, shop_id, product_id, price, stock, created_at) "
+        "VALUES (randomblob(16), ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (bytes.fromhex(shop[0]), bytes.fromhex(pid), price, stock),
+    )
+
+
+def _best(client, **params):
+    resp = client.get("/api/search/best_price", params={"lat": 41.0, "lon": 12.0, "radius_km": 5, **params})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_cheapest_and_nearest_offer_per_product(client, sql, make_shop, make_product):
+    here = make_shop(lat=41.0, lon=12.0)
+    near = make_shop(lat=41.0, lon=12.02)  # ~1.7 km
+    further = make_shop(lat=41.0, lon=12.04)
+    away = make_shop(lat=41.5, lon=12.0)  # outside the radius
+    umbrella = make_product(here, "Ombrelux Umbrella", price=30.0)
+    _list(sql, near, umbrella, 20.0)
+    _list(sql, further, umbrella, 15.0, stock=0)
+    _list(sql, away, umbrella, 1.0)
+    soap = make_product(here, "Ombrelux Soap", price=5.0)
+
+    rows = _best(client)
+    assert [r["product_id"] for r in rows] == [soap, umbrella]
+    best = rows[1]
+    assert (best["shop_id"], best["price"], best["shop_count"]) == (near[0], 20.0, 2)
+    assert best["distance_km"] == pytest.approx(1.686, abs=0.01)
+    assert (best["nearest_shop_id"], best["nearest_price"], best["nearest_distance_km"]) == (here[0], 30.0, 0.0)
+    assert rows[0]["shop_count"] == 1
+
+    assert [r["product_id"] for r in _best(client, q="umbrella")] == [umbrella]
+    assert [r["product_id"] for r in _best(client, limit=1)] == [soap]
+    assert _best(client, lat=-80.0, lon=0.0) == []
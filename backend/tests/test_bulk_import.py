@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core import bulk_import
+from app.core.bulk_import import RowError, detect_format, iter_records, parse_row
+
+
+def _records(chunks, fmt):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [(line, rec if isinstance(rec, dict) else str(rec)) async for line, rec in iter_records(stream(), fmt)]
+
+    return asyncio.run(collect())
+
+
+def test_detect_format():
+    assert detect_format("CSV", "application/json") == "csv"
+    assert detect_format("xml", "text/csv") is None
+    assert detect_format(None, "application/x-ndjson; charset=utf-8") == "ndjson"
+    assert detect_format(None, "application/json") is None
+
+
+def test_csv_records_survive_any_chunking():
+    body = 'product_name,brand,price\n"Rice, Basmati",Kohinoor,120\n"Multi\nline",,5\n\nTea,Tata,1,extra\n'.encode()
+    expected = [
+        (2, {"product_name": "Rice, Basmati", "brand": "Kohinoor", "price": "120"}),
+        (3, {"product_name": "Multi\nline", "brand": "", "price": "5"}),
+        (6, "expected 3 columns, got 4"),
+    ]
+    assert _records([body], "csv") == expected
+    assert _records([body[i:i + 1] for i in range(len(body))], "csv") == expected
+
+
+def test_csv_header_and_quote_errors():
+    with pytest.raises(RowError, match="unknown column"):
+        _records([b"product_name,weight\nSoap,1\n"], "csv")
+    assert _records([b'product_name\n"Soap\n'], "csv") == [(2, "unterminated quoted field")]
+    # a UTF-8 BOM and a character split across chunks decode cleanly
+    body = "﻿product_name\nChâi\n".encode()
+    cut = body.index("â".encode()) + 1
+    assert _records([body[:cut], body[cut:]], "csv") == [(2, {"product_name": "Châi"})]
+
+
+def test_ndjson_records_and_errors(monkeypatch):
+    monkeypatch.setattr(bulk_import, "MAX_RECORD_CHARS", 40)
+    lines = [json.dumps({"product_name": "Soap"}), "{oops", "[1, 2]", json.dumps({"product_name": "x" * 50}), json.dumps({"stock": 1})]
+    assert _records(["\n".join(lines).encode()], "ndjson") == [
+        (1, {"product_name": "Soap"}),
+        (2, "invalid JSON"),
+        (3, "expected a JSON object"),
+        (4, "record too long"),
+        (5, {"stock": 1}),
+    ]
+
+
+def test_parse_row_validation():
+    row = parse_row({"product_id": "AB" * 16, "price": " 12.345 ", "stock": "3", "category_id": "snacks", "brand": " "})
+    assert row["product_id"] == bytes.fromhex("ab" * 16)
+    assert (row["price"], row["stock"], row["category_key"], row["brand"]) == (12.35, 3, "snacks", None)
+    for record, message in (
+        ({"brand": "Tata"}, "product_id or product_name is required"),
+        ({"product_id": "xyz"}, "invalid product_id"),
+        ({"product_name": "Soap", "price": "cheap"}, "invalid price"),
+        ({"product_name": "Soap", "price": "nan"}, "price must be a non-negative number"),
+        ({"product_name": "Soap", "stock": "-1"}, "stock must be non-negative"),
+        ({"product_name": "Soap", "category_id": "bad id!"}, "invalid category_id"),
+        ({"product_name": "S" * 201}, "product_name longer than 200 characters"),
+        ({"product_name": "Soap", "size": "L"}, "unknown column(s): size"),
+    ):
+        with pytest.raises(RowError) as exc:
+            parse_row(record)
+        assert str(exc.value) == message
+
+
+def _import(client, shop, body, content_type="text/csv", **params):
+    sid, headers = shop
+    return client.post(
+        f"/api/shops/{sid}/products/import", params=params, content=body.encode(),
+        headers={**headers, "Content-Type": content_type},
+    )
+
+
+def test_import_endpoint_creates_reuses_and_updates(client, sql, make_shop, make_product, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "import_batch_size", 2)
+    shop = make_shop()
+    listed = make_product(shop, "Importa Oats", brand="Grainly", price=90.0, stock=1)
+    body = (
+        "product_id,product_name,brand,price,stock\n"
+        f"{listed},,,85,\n"
+        ",Importa Ghee,Dairyco,450,4\n"
+        ",importa ghee,DAIRYCO,440,\n"
+        ",,,1,1\n"
+        ",Importa Jam,,abc,1\n"
+    )
+    resp = _import(client, shop, body)
+    assert resp.status_code == 200, resp.text
+    report = resp.json()
+    assert {k: report[k] for k in ("rows", "imported", "products_created", "listings_created", "listings_updated", "batches")} == {
+        "rows": 5, "imported": 3, "products_created": 1, "listings_created": 1, "listings_updated": 2, "batches": 2,
+    }
+    assert report["errors"] == [
+        {"line": 5, "error": "product_id or product_name is required"},
+        {"line": 6, "error": "invalid price"},
+    ]
+    assert sql("SELECT price, stock FROM Shop_Product WHERE product_id = ?", (bytes.fromhex(listed),)) == [(85, 1)]
+    assert sql(
+        "SELECT sp.price, sp.stock FROM Shop_Product sp JOIN Products p ON p.product_id = sp.product_id "
+        "WHERE p.product_name = 'Importa Ghee'"
+    ) == [(440, 4)]
+    names = [p["product_name"] for p in client.get("/api/search/products", params={"q": "importa ghee"}).json()]
+    # the second ghee row reused the product the first one created
+    assert names.count("Importa Ghee") == 1
+
+
+def test_import_endpoint_rejections(client, make_shop):
+    shop, other = make_shop(), make_shop()
+    assert _import(client, shop, "product_name\nSoap\n", content_type="application/json").status_code == 415
+    assert _import(client, (shop[0], other[1]), "product_name\nSoap\n").status_code == 403
+    resp = _import(client, shop, "name\nSoap\n")
+    assert resp.status_code == 422 and "unknown column" in resp.json()["detail"]
+    ndjson = _import(client, shop, '{"product_name": "Importa Salt", "price": 20}\n', content_type="text/plain", format="ndjson")
+    assert ndjson.status_code == 200 and ndjson.json()["listings_created"] == 1
@@ -0,0 +1,35 @@
+from app.core.facets import FacetCounter, price_bucket
+
+
+def test_price_buckets():
+    assert [price_bucket(p) for p in (0, 99.99, 100, 4999, 10000, "250", None, "n/a")] == [0, 0, 1, 3, 5, 1, None, None]
+
+
+def test_counter_groups_case_insensitively_and_counts_each_product_once():
+    counter = FacetCounter()
+    counter.add(b"1", "Amul", "White", "Dairy", 55)
+    counter.add(b"2", "amul ", None, "Dairy", 480)
+    counter.add(b"3", "Mother Dairy", "white", "", None)
+    counter.add(b"2", "Amul", "Red", "Dairy", 480)
+    assert counter.result() == {
+        "brand": [{"value": "Amul", "count": 2}, {"value": "Mother Dairy", "count": 1}],
+        "color": [{"value": "White", "count": 2}],
+        "category": [{"value": "Dairy", "count": 2}],
+        "price": [{"min": 0, "max": 100, "count": 1}, {"min": 100, "max": 500, "count": 1}],
+    }
+    assert counter.product_ids == {b"1", b"2", b"3"}
+
+
+def test_facets_cover_every_page(client, make_shop, make_product):
+    shop = make_shop()
+    for i, (brand, price) in enumerate((("Facetta", 50), ("Facetta", 150), ("Otherly", 20000))):
+        make_product(shop, f"Zephyrine Mug {i}", brand=brand, price=price)
+    params = {"q": "zephyrine", "facets": "true", "limit": 1}
+    first = client.get("/api/search/products", params=params).json()
+    assert len(first["items"]) == 1
+    assert first["facets"]["brand"] == [{"value": "Facetta", "count": 2}, {"value": "Otherly", "count": 1}]
+    assert [b["count"] for b in first["facets"]["price"]] == [1, 1, 1]
+    second = client.get("/api/search/products", params={**params, "cursor": first["next_cursor"]}).json()
+    assert second["facets"] == first["facets"]
+    # without facets=true a bare list comes back as before
+    assert isinstance(client.get("/api/search/products", params={"q": "zephyrine"}).json(), list)
@@ -0,0 +1,48 @@
+from app.db.fts import build_match
+
+
+def _fts_names(sql, match):
+    return [name for (name,) in sql(
+        "SELECT p.product_name FROM Products_fts JOIN Products p ON p.rowid = Products_fts.rowid "
+        "WHERE Products_fts MATCH ?", (match,)
+    )]
+
+
+def test_build_match_prefixes_every_token():
+    assert build_match("Surf  exc") == '"surf"* AND "exc"*'
+    assert build_match("  ") is None
+
+
+def test_triggers_follow_product_writes(client, sql):
+    sql(
+        "INSERT INTO Products (product_id, product_name, brand, description, color, created_at) "
+        "VALUES (randomblob(16), 'Zorblax Kettle', 'Qwerty', NULL, NULL, CURRENT_TIMESTAMP)"
+    )
+    assert _fts_names(sql, "zorblax") == ["Zorblax Kettle"]
+    sql("UPDATE Products SET product_name = 'Vantrix Kettle' WHERE product_name = 'Zorblax Kettle'")
+    assert _fts_names(sql, "zorblax") == []
+    assert _fts_names(sql, "vantrix") == ["Vantrix Kettle"]
+    sql("DELETE FROM Products WHERE product_name = 'Vantrix Kettle'")
+    assert _fts_names(sql, "vantrix") == []
+
+
+def test_search_uses_prefixes_and_bm25_weights(make_shop, make_product, client):
+    shop = make_shop()
+    in_name = make_product(shop, "Plumbrook Soap")
+    in_description = make_product(shop, "Bath Bar", description="smells like plumbrook")
+    resp = client.get("/api/search/products", params={"q": "plumbro"})
+    assert resp.status_code == 200
+    ids = [item["product_id"] for item in resp.json()]
+    # a name hit outweighs a description hit
+    assert ids.index(in_name) < ids.index(in_description)
+
+
+def test_empty_query_lists_every_product(client, sql, make_shop, make_product):
+    pid = make_product(make_shop(), "Emptyq Basket")
+    (total,) = sql("SELECT COUNT(*) FROM Products")[0]
+    everything = client.get("/api/search/products", params={"q": ""}).json()
+    assert len(everything) == total and pid in [p["product_id"] for p in everything]
+    # the location-less nearby search falls back to the same listing
+    assert client.get("/api/search/products_nearby").json() == everything
+    body = client.get("/api/search/products", params={"q": " ", "limit": 2}).json()
+    assert len(body["items"]) == min(2, total) and (body["next_cursor"] is not None) == (total > 2)
@@ -0,0 +1,85 @@
+import uuid
+
+import pytest
+
+from app.core.geo_engine import geo_engine
+from app.db.geo import bounding_box, haversine, shops_within
+from app.db.session import SessionLocal
+
+
+def _within(client, lat, lon, radius_km):
+    async def run():
+        async with SessionLocal() as db:
+            return await shops_within(db, lat, lon, radius_km)
+    return client.portal.call(run)
+
+
+def _rtree_ids(sql, sid):
+    return sql(
+        "SELECT r.id FROM Shop_Address_rtree r JOIN Shop_Address a ON a.rowid = r.id WHERE a.shop_id = ?", (sid,)
+    )
+
+
+def test_bounding_box_covers_the_radius():
+    min_lat, max_lat, min_lon, max_lon = bounding_box(23.25, 77.41, 10.0)
+    assert haversine(23.25, 77.41, max_lat, 77.41) > 10.0
+    assert haversine(23.25, 77.41, 23.25, min_lon) > 10.0
+    assert min_lat < 23.25 < max_lat and min_lon < 77.41 < max_lon
+
+
+def test_rtree_triggers_follow_address_writes(client, sql):
+    sid = uuid.uuid4().bytes
+    sql("INSERT INTO Shops (shop_id, shop_name, created_at) VALUES (?, 'Rtree Shop', CURRENT_TIMESTAMP)", (sid,))
+    sql("INSERT INTO Shop_Address (address_id, shop_id, latitude, longitude) VALUES (randomblob(16), ?, NULL, NULL)", (sid,))
+    assert _rtree_ids(sql, sid) == []
+    sql("UPDATE Shop_Address SET latitude = 12.5, longitude = 76.5 WHERE shop_id = ?", (sid,))
+    assert len(_rtree_ids(sql, sid)) == 1
+    sql("DELETE FROM Shop_Address WHERE shop_id = ?", (sid,))
+    assert _rtree_ids(sql, sid) == []
+
+
+def test_rtree_lookup_filters_by_exact_distance(client, make_shop, monkeypatch):
+    near, _ = make_shop(lat=10.0, lon=60.0)
+    edge, _ = make_shop(lat=10.0, lon=60.09)  # ~9.8 km east, inside the box and the radius
+    corner, _ = make_shop(lat=10.085, lon=60.085)  # inside the box, ~13 km away
+    monkeypatch.setattr(geo_engine, "loaded", False)
+    hits = _within(client, 10.0, 60.0, 10.0)
+    assert [h["shop_id"].hex() for h in hits] == [near, edge]
+    assert hits[0]["distance_km"] == pytest.approx(0.0)
+    assert corner not in [h["shop_id"].hex() for h in hits]
+
+
+def test_engine_radius_and_k_nearest_match_haversine():
+    from app.core.geo_engine import GeoEngine
+
+    engine = GeoEngine(capacity=2)
+    points = {1: (22.72, 75.86), 2: (22.75, 75.90), 3: (23.26, 77.41), 4: (22.70, 75.80)}
+    for rid, (lat, lon) in points.items():
+        engine.upsert(rid, f"shop{rid}", lat, lon)
+    hits = engine.within(22.72, 75.86, radius_km=10.0)
+    assert [rid for rid, _, _ in hits] == [1, 2, 4]
+    for rid, _, d in hits:
+        assert d == pytest.approx(haversine(22.72, 75.86, *points[rid]), rel=1e-6)
+    assert [rid for rid, _, _ in engine.within(22.72, 75.86, k=2)] == [1, 2]
+    engine.remove(1)
+    engine.upsert(2, "shop2", None, None)
+    assert [rid for rid, _, _ in engine.within(22.72, 75.86, radius_km=10.0)] == [4]
+    assert len(engine) == 2
+
+
+def test_engine_and_rtree_agree(client, make_shop, monkeypatch):
+    for lat, lon in ((-5.0, 40.0), (-5.02, 40.03), (-5.05, 39.96), (-5.4, 40.0)):
+        make_shop(lat=lat, lon=lon)
+    from_engine = _within(client, -5.0, 40.0, 8.0)
+    monkeypatch.setattr(geo_engine, "loaded", False)
+    from_rtree = _within(client, -5.0, 40.0, 8.0)
+    assert len(from_engine) == 3
+    assert [h["shop_id"] for h in from_engine] == [h["shop_id"] for h in from_rtree]
+    for a, b in zip(from_engine, from_rtree):
+        assert a["distance_km"] == pytest.approx(b["distance_km"], rel=1e-6)
+
+
+def test_nearby_endpoint_sees_new_shop_locations(client, make_shop):
+    sid, _ = make_shop(lat=-33.0, lon=151.0)
+    resp = client.get("/api/shops/nearby", params={"lat": -33.0, "lon": 151.0, "radius_km": 1})
+    assert [s["shop_id"] for s in resp.json()] == [sid]
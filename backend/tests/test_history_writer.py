@@ -0,0 +1,72 @@
+import asyncio
+import uuid
+
+from app.db.history_writer import HistoryWriter
+
+
+def _history(sql, item):
+    return sql("SELECT lower(hex(user_id)) FROM Search_History WHERE search_item = ?", (item,))
+
+
+def _user(sql):
+    return sql("SELECT lower(hex(user_id)) FROM Users LIMIT 1")[0][0]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    writer = HistoryWriter(max_size=2, batch_size=10, flush_seconds=1.0)
+    assert [writer.enqueue(1, f"q{i}") for i in range(3)] == [True, True, False]
+    assert writer.stats() == {
+        "pending": 2, "capacity": 2, "enqueued": 2, "written": 0, "dropped": 1, "failed": 0, "flushes": 0,
+    }
+
+
+def test_stop_flushes_and_isolates_bad_rows(client, sql):
+    uid = _user(sql)
+    item = f"flush-{uuid.uuid4().hex[:8]}"
+    writer = HistoryWriter(max_size=10, batch_size=10, flush_seconds=60.0)
+
+    async def run():
+        writer.start()
+        writer.enqueue(bytes.fromhex(uid), item)
+        writer.enqueue(uuid.uuid4().bytes, item)  # no such user
+        writer.enqueue(bytes.fromhex(uid), item)
+        await writer.stop()
+
+    client.portal.call(run)
+    assert _history(sql, item) == [(uid,), (uid,)]
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"], stats["pending"]) == (2, 1, 0)
+
+
+def test_background_task_writes_full_batches(client, sql):
+    uid = bytes.fromhex(_user(sql))
+    item = f"batch-{uuid.uuid4().hex[:8]}"
+    writer = HistoryWriter(max_size=10, batch_size=2, flush_seconds=60.0)
+
+    async def run():
+        writer.start()
+        for _ in range(2):
+            writer.enqueue(uid, item)
+        for _ in range(100):
+            if writer.written:
+                break
+            await asyncio.sleep(0.01)
+        written = writer.written
+        await writer.stop()
+        return written
+
+    # the batch is written long before flush_seconds runs out
+    assert client.portal.call(run) == 2
+    assert len(_history(sql, item)) == 2
+
+
+def test_search_rejects_bad_user_ids_before_queueing(client, sql):
+    from app.db.history_writer import history_writer
+
+    before = history_writer.stats()["enqueued"]
+    for bad in ("not-a-user", "zz" * 16, uuid.uuid4().hex, "12345"):
+        resp = client.get("/api/search/products", params={"q": "soap", "user_id": bad})
+        assert resp.status_code == 422, bad
+    assert history_writer.stats()["enqueued"] == before
+    assert client.get("/api/search/products", params={"q": "soap", "user_id": _user(sql)}).status_code == 200
+    assert history_writer.stats()["enqueued"] == before + 1
@@ -0,0 +1,40 @@
+import uuid
+
+from app.core.phonetic import phonetic_key, phonetic_keys
+from app.db.phonetic import PHONETIC_TABLE, sync_phonetic_keys
+
+
+def test_spelling_variants_share_a_key():
+    for a, b in (("surf", "sarf"), ("maggi", "maggie"), ("atta", "aata"), ("dhania", "dhaniya"),
+                 ("kshitij", "xitij"), ("chawal", "chaval"), ("phool", "fool")):
+        assert phonetic_key(a) == phonetic_key(b), (a, b)
+    assert phonetic_key("surf") == "SRF"
+    assert phonetic_key("ghee") != phonetic_key("cheese")
+    assert phonetic_key("") == phonetic_key("123") == ""
+
+
+def test_short_words_and_keys_are_skipped():
+    # "om" is too short to key, "tea" keys to a lone "T"
+    assert phonetic_keys("Om 5kg Tea Masala") == {"MSL"}
+
+
+def test_search_matches_words_typed_as_they_sound(client, make_shop, make_product):
+    pid = make_product(make_shop(), "Kshitij Chawal")
+    ids = [p["product_id"] for p in client.get("/api/search/products", params={"q": "xitij chaval"}).json()]
+    assert pid in ids
+
+
+def test_startup_sync_keys_products_written_directly(client, sql):
+    from app.db.session import engine
+
+    pid = uuid.uuid4().bytes
+    sql("INSERT INTO Products (product_id, product_name, brand, created_at) VALUES (?, 'Bhindi Fresh', 'Kheti', CURRENT_TIMESTAMP)", (pid,))
+    assert sql(f"SELECT COUNT(*) FROM {PHONETIC_TABLE} WHERE product_id = ?", (pid,)) == [(0,)]
+
+    async def sync():
+        async with engine.begin() as conn:
+            return await sync_phonetic_keys(conn)
+
+    assert client.portal.call(sync) >= 3
+    keys = {k for (k,) in sql(f"SELECT pkey FROM {PHONETIC_TABLE} WHERE product_id = ?", (pid,))}
+    assert keys == phonetic_keys("Bhindi Fresh Kheti")
@@ -0,0 +1,31 @@
+def _hits(sql, pid):
+    rows = sql("SELECT hits FROM Product_Popularity WHERE product_id = ?", (bytes.fromhex(pid),))
+    return rows[0][0] if rows else None
+
+
+def _search(sql, term, times=1):
+    for _ in range(times):
+        sql("INSERT INTO Search_History (history_id, user_id, search_item, timestamp) VALUES (randomblob(16), NULL, ?, CURRENT_TIMESTAMP)", (term,))
+
+
+def test_triggers_count_searches_per_product(make_shop, make_product, sql):
+    pid = make_product(make_shop(), "Glimmerfold Tea")
+    assert _hits(sql, pid) == 0
+    _search(sql, "  GLIMMERFOLD tea ", times=2)
+    assert _hits(sql, pid) == 2
+    assert sql("SELECT hits FROM Search_Terms WHERE term = 'glimmerfold tea'") == [(2,)]
+    sql("DELETE FROM Search_History WHERE search_item = '  GLIMMERFOLD tea '")
+    assert _hits(sql, pid) == 0
+
+
+def test_new_product_inherits_earlier_searches(make_shop, make_product, sql):
+    _search(sql, "Pendrowle Biscuits", times=3)
+    pid = make_product(make_shop(), "Pendrowle Biscuits")
+    assert _hits(sql, pid) == 3
+
+
+def test_popular_reads_the_rollup(client, make_shop, make_product, sql):
+    pid = make_product(make_shop(), "Ostravine Juice")
+    _search(sql, "ostravine juice", times=500)
+    top = client.get("/api/search/popular", params={"limit": 3}).json()
+    assert top[0]["product_id"] == pid
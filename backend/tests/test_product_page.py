@@ -0,0 +1,39 @@
+import uuid
+
+
+def test_page_bundles_detail_images_offers_and_reviews(client, sql, make_shop, make_product):
+    near = make_shop(lat=48.85, lon=2.35)
+    far = make_shop(lat=48.85, lon=2.45)
+    pid = make_product(far, "Pageant Vase", brand="Claywork", price=40.0)
+    sql(
+        "INSERT INTO Shop_Product (shop_product_id, shop_id, product_id, price, stock, created_at) "
+        "VALUES (randomblob(16), ?, ?, 55.0, 2, CURRENT_TIMESTAMP)", (bytes.fromhex(near[0]), bytes.fromhex(pid)),
+    )
+    for url in ("https://img/vase.jpg", "https://img/vase-side.jpg"):
+        sql("INSERT INTO Product_Images (image_id, product_id, image_url) VALUES (randomblob(16), ?, ?)", (bytes.fromhex(pid), url))
+    for rating, created in ((3, "2024-01-01 10:00:00"), (5, "2024-02-01 10:00:00")):
+        sql(
+            "INSERT INTO Product_Reviews (review_id, user_id, product_id, rating, review_text, created_at) "
+            "SELECT randomblob(16), user_id, ?, ?, 'ok', ? FROM Users LIMIT 1", (bytes.fromhex(pid), rating, created),
+        )
+
+    page = client.get(f"/api/products/{pid}/page", params={"reviews_limit": 1}).json()
+    assert page["product"] == {
+        "product_id": pid, "product_name": "Pageant Vase", "brand": "Claywork", "color": None,
+        "description": None, "image_url": "https://img/vase.jpg",
+    }
+    assert page["images"] == ["https://img/vase.jpg", "https://img/vase-side.jpg"]
+    assert page["product"] == client.get(f"/api/products/id/{pid}").json()
+    assert [o["price"] for o in page["offers"]] == [40.0, 55.0]
+    assert page["reviews"]["rating_avg"] == 4.0 and page["reviews"]["rating_count"] == 2
+    assert [r["rating"] for r in page["reviews"]["items"]] == [5]
+
+    # with a location the offers come nearest first
+    located = client.get(f"/api/products/{pid}/page", params={"lat": 48.85, "lon": 2.35}).json()
+    assert [o["shop_id"] for o in located["offers"]] == [near[0], far[0]]
+    assert located["offers"] == client.get(f"/api/products/{pid}/prices", params={"sort": "distance", "lat": 48.85, "lon": 2.35}).json()
+
+
+def test_page_errors(client):
+    assert client.get(f"/api/products/{uuid.uuid4().hex}/page").status_code == 404
+    assert client.get("/api/products/not-an-id/page").status_code == 422
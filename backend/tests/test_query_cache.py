@@ -0,0 +1,96 @@
+from app.core import query_cache as qc
+from app.core.query_cache import CATALOG_TAG, QueryCache, city_tag, normalize_query
+
+
+def test_lru_evicts_the_least_recently_read_entry():
+    cache = QueryCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(qc.time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl_seconds=30)
+    cache.put("k", "v", product_ids=[b"p"], tags=("t",))
+    now[0] += 29
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["expirations"] == 1
+    # the reverse maps went with the entry
+    assert cache.invalidate_products(b"p") == cache.invalidate_tags("t") == 0
+
+
+def test_zero_ttl_disables_the_cache():
+    cache = QueryCache(ttl_seconds=0)
+    cache.put("k", "v")
+    assert cache.get("k") is None and len(cache) == 0
+
+
+def test_invalidation_by_product_and_tag():
+    cache = QueryCache()
+    cache.put("soap", 1, product_ids=[b"p1", b"p2"], tags=(CATALOG_TAG,))
+    cache.put("oil", 2, product_ids=[b"p3"], tags=(CATALOG_TAG, city_tag(" Indore ")))
+    cache.put("rice", 3, product_ids=[b"p4"])
+    # row values can come back from the driver as memoryview
+    assert cache.invalidate_products(memoryview(b"p2")) == 1
+    assert cache.get("soap") is None and cache.get("oil") == 2
+    assert cache.invalidate_tags("city:indore") == 1
+    assert cache.get("oil") is None and cache.get("rice") == 3
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_normalize_query_folds_case_and_spacing():
+    assert normalize_query("  Surf   EXCEL ") == "surf excel"
+    assert normalize_query(None) == ""
+
+
+def _in_city(client, city):
+    resp = client.get("/api/products/in_city", params={"city": city})
+    assert resp.status_code == 200, resp.text
+    return [p["product_id"] for p in resp.json()]
+
+
+def test_listing_writes_refresh_cached_city_listings(client, make_shop, make_product):
+    shop = make_shop(city="Cachepur")
+    sid, headers = shop
+    pid = make_product(shop, "Cachewood Broom", stock=0)
+    assert pid not in _in_city(client, "Cachepur")
+    hits = qc.query_cache.hits
+    assert pid not in _in_city(client, "cachepur")
+    assert qc.query_cache.hits == hits + 1
+
+    resp = client.put(f"/api/shops/manage/{sid}/products/{pid}", headers=headers, json={"price": 12.0, "stock": 3})
+    assert resp.status_code == 200, resp.text
+    assert pid in _in_city(client, "Cachepur")
+
+    resp = client.delete(f"/api/shops/manage/{sid}/products/{pid}", headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert pid not in _in_city(client, "Cachepur")
+
+
+def _search_ids(client, q):
+    resp = client.get("/api/search/products", params={"q": q})
+    assert resp.status_code == 200, resp.text
+    return [p["product_id"] for p in resp.json()]
+
+
+def test_listing_writes_refresh_cached_listing_filters(client, make_shop, make_product):
+    shop = make_shop(city="Tagpur")
+    sid, headers = shop
+    pid = make_product(shop, "Frostelle Tumbler", price=10.0, stock=0)
+    assert _search_ids(client, "frostelle price:<1") == []
+    assert _search_ids(client, "frostelle city:tagpur instock") == []
+
+    resp = client.put(f"/api/shops/manage/{sid}/products", headers=headers, json={
+        "items": [{"product_id": pid, "price": 0.5, "stock": 4}],
+    })
+    assert resp.status_code == 200, resp.text
+    # neither cached result held the product, so only the tags can drop them
+    assert _search_ids(client, "frostelle price:<1") == [pid]
+    assert _search_ids(client, "frostelle city:TAGPUR instock") == [pid]
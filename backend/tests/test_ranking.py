@@ -0,0 +1,65 @@
+import random
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.pagination import encode_cursor
+from app.core.ranking import TopK
+
+
+def _rows(n=137, seed=3):
+    rng = random.Random(seed)
+    # few distinct scores, so the id decides most of the order
+    return [((rng.randint(0, 5), b"%04d" % i), f"row{i}") for i in range(n)]
+
+
+def test_pages_match_a_full_sort():
+    rows = _rows()
+    expected = [row for _, row in sorted(rows, reverse=True)]
+    seen, cursor = [], None
+    while True:
+        top = TopK(limit=20, cursor=cursor)
+        for key, row in rows:
+            top.push(key, row)
+        page, cursor = top.page()
+        seen += [row for _, row in page]
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_unpaginated_keeps_every_row():
+    rows = _rows(n=400)
+    top = TopK()
+    for key, row in rows:
+        top.push(key, row)
+    page, cursor = top.page()
+    assert cursor is None and len(page) == 400
+    assert top.stats_header(len(page)) == "scanned=400; returned=400"
+
+
+def test_equal_keys_keep_arrival_order():
+    top = TopK(limit=2)
+    for row in ("first", "second", "third"):
+        top.push((1.0, "same"), row)
+    page, cursor = top.page()
+    assert [row for _, row in page] == ["first", "second"]
+    assert cursor == encode_cursor((1.0, "same"))
+
+
+def test_cursor_of_the_wrong_shape_is_rejected():
+    top = TopK(limit=5, cursor=encode_cursor(("not-a-score", "id")))
+    with pytest.raises(HTTPException) as exc:
+        top.push((1.0, "id"), "row")
+    assert exc.value.status_code == 400
+
+
+def test_search_reports_rows_scanned(client, make_shop, make_product):
+    shop = make_shop()
+    for i in range(4):
+        make_product(shop, f"Trelmont Tile {i}")
+    resp = client.get("/api/search/products", params={"q": "trelmont", "limit": 3})
+    assert resp.headers["X-Search-Rows"] == "scanned=4; returned=3"
+    body = resp.json()
+    rest = client.get("/api/search/products", params={"q": "trelmont", "limit": 3, "cursor": body["next_cursor"]}).json()
+    assert len(rest["items"]) == 1 and rest["next_cursor"] is None
@@ -0,0 +1,54 @@
+import uuid
+
+from app.db.search_doc import DOC_TABLE
+
+
+def _doc(sql, pid):
+    rows = sql(
+        f"SELECT product_name, category_name, image_url, min_price, max_price, in_stock_shops, rating_avg, rating_count "
+        f"FROM {DOC_TABLE} WHERE product_id = ?", (pid,)
+    )
+    return rows[0] if rows else None
+
+
+def test_triggers_keep_the_document_current(client, sql, make_shop):
+    shops = [bytes.fromhex(make_shop()[0]) for _ in range(2)]
+    cid, pid = uuid.uuid4().bytes, uuid.uuid4().bytes
+    sql("INSERT INTO Product_Categories (category_id, category_name, created_at) VALUES (?, 'Docware', CURRENT_TIMESTAMP)", (cid,))
+    sql(
+        "INSERT INTO Products (product_id, product_name, category_id, created_at) VALUES (?, 'Docket Lamp', ?, CURRENT_TIMESTAMP)",
+        (pid, cid),
+    )
+    assert _doc(sql, pid) == ("Docket Lamp", "Docware", None, None, None, 0, None, 0)
+
+    for sid, price, stock in ((shops[0], 40.0, 0), (shops[1], 55.0, 2)):
+        sql(
+            "INSERT INTO Shop_Product (shop_product_id, shop_id, product_id, price, stock, created_at) "
+            "VALUES (randomblob(16), ?, ?, ?, ?, CURRENT_TIMESTAMP)", (sid, pid, price, stock),
+        )
+    sql("UPDATE Shop_Product SET stock = 3 WHERE shop_id = ? AND product_id = ?", (shops[0], pid))
+    sql("INSERT INTO Product_Images (image_id, product_id, image_url) VALUES (randomblob(16), ?, 'https://img/1.jpg')", (pid,))
+    sql("INSERT INTO Product_Images (image_id, product_id, image_url) VALUES (randomblob(16), ?, 'https://img/2.jpg')", (pid,))
+    for rating in (4, 5):
+        sql(
+            "INSERT INTO Product_Reviews (review_id, user_id, product_id, rating, created_at) "
+            "SELECT randomblob(16), user_id, ?, ?, CURRENT_TIMESTAMP FROM Users LIMIT 1", (pid, rating),
+        )
+    sql("UPDATE Product_Categories SET category_name = 'Docware Lighting' WHERE category_id = ?", (cid,))
+    sql("UPDATE Products SET product_name = 'Docket Desk Lamp' WHERE product_id = ?", (pid,))
+    assert _doc(sql, pid) == ("Docket Desk Lamp", "Docware Lighting", "https://img/1.jpg", 40, 55, 2, 4.5, 2)
+
+    sql("DELETE FROM Shop_Product WHERE shop_id = ? AND product_id = ?", (shops[1], pid))
+    assert _doc(sql, pid)[3:6] == (40, 40, 1)
+    sql("DELETE FROM Product_Reviews WHERE product_id = ?", (pid,))
+    sql("DELETE FROM Product_Images WHERE product_id = ?", (pid,))
+    sql("DELETE FROM Shop_Product WHERE product_id = ?", (pid,))
+    sql("DELETE FROM Products WHERE product_id = ?", (pid,))
+    assert _doc(sql, pid) is None
+
+
+def test_search_results_come_from_the_document(client, make_shop, make_product):
+    pid = make_product(make_shop(), "Docket Kettle", brand="Docketware", price=12.5)
+    body = client.get("/api/search/products", params={"q": "docket kettle", "facets": "true"}).json()
+    assert pid in [item["product_id"] for item in body["items"]]
+    assert {b["value"]: b["count"] for b in body["facets"]["brand"]}.get("Docketware") == 1
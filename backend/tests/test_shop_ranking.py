@@ -0,0 +1,58 @@
+from datetime import datetime, time
+
+import numpy as np
+import pytest
+
+from app.core.shop_ranking import ShopFeatures, _minutes, _scaled
+
+
+MONDAY = datetime(2024, 1, 1)
+
+
+def test_scaling_and_times():
+    assert _scaled(np.array([2.0, 4.0, np.nan, 3.0]), lower_is_better=True).tolist() == [1.0, 0.0, 0.0, 0.5]
+    assert _scaled(np.array([7.0, 7.0]), lower_is_better=False).tolist() == [1.0, 1.0]
+    assert [_minutes(v) for v in ("09:30:00.000000", time(21, 5), None, "closed")] == [570, 1265, -1, -1]
+
+
+@pytest.fixture
+def features(client, sql, make_shop):
+    from app.db.session import engine
+
+    day, late, unknown = (bytes.fromhex(make_shop()[0]) for _ in range(3))
+    sql("INSERT INTO Shop_Timings (timing_id, shop_id, day, open_time, close_time) VALUES (randomblob(16), ?, 'Monday', '09:00:00', '21:00:00')", (day,))
+    sql("INSERT INTO Shop_Timings (timing_id, shop_id, day, open_time, close_time) VALUES (randomblob(16), ?, ' monday', '22:00:00', '02:00:00')", (late,))
+    features = ShopFeatures()
+
+    async def load():
+        async with engine.connect() as conn:
+            await features.load(conn)
+
+    client.portal.call(load)
+    return features, [day, late, unknown]
+
+
+def test_open_now_handles_overnight_hours(features):
+    features, shops = features
+    assert features.open_now(shops, MONDAY.replace(hour=10)).tolist() == [True, False, False]
+    assert features.open_now(shops, MONDAY.replace(hour=23, minute=30)).tolist() == [False, True, False]
+    assert features.open_now(shops, MONDAY.replace(hour=21, minute=1)).tolist() == [False, False, False]
+    assert features.open_now([b"no such shop"], MONDAY).tolist() == [False]
+
+
+def test_score_weighs_only_the_features_given(features):
+    features, shops = features
+    score, is_open = features.score(shops, distance=[0.5, 1.0, np.nan], now=MONDAY.replace(hour=10))
+    assert is_open.tolist() == [True, False, False]
+    # weights: distance 3, rating 1 (unrated shops score 0.5), open 2
+    assert score.tolist() == pytest.approx([(3 + 0.5 + 2) / 6, 0.5 / 6, 0.5 / 6])
+    score, _ = features.score(shops, price=[30, 10, 20], stock=[20, 0, 5], now=MONDAY.replace(hour=23))
+    assert score.argmax() == 1
+
+
+def test_nearby_best_sort_attaches_scores(client, make_shop):
+    near, _ = make_shop(lat=-20.0, lon=57.5)
+    far, _ = make_shop(lat=-20.0, lon=57.53)
+    rows = client.get("/api/shops/nearby", params={"lat": -20.0, "lon": 57.5, "radius_km": 5, "sort": "best"}).json()
+    assert [r["shop_id"] for r in rows] == [near, far]
+    assert rows[0]["score"] > rows[1]["score"] and isinstance(rows[0]["is_open"], bool)
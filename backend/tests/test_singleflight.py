@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+from app.core import singleflight
+from app.core.singleflight import SingleFlight, coalesce
+
+
+@pytest.fixture
+def flight(monkeypatch):
+    fresh = SingleFlight()
+    monkeypatch.setattr(singleflight, "single_flight", fresh)
+    return fresh
+
+
+def _endpoint(calls, gate, fail=False):
+    @coalesce
+    async def lookup(q: str, page: int = 1, response: Response = None):
+        calls.append((q, page))
+        await gate.wait()
+        if fail:
+            raise ValueError(q)
+        response.headers["X-Rows"] = q
+        response.headers["Access-Control-Allow-Origin"] = "https://leader.example"
+        return {"q": q, "page": page}
+
+    return lookup
+
+
+def test_identical_calls_share_one_execution(flight):
+    calls = []
+
+    async def run():
+        gate = asyncio.Event()
+        lookup = _endpoint(calls, gate)
+        responses = [Response() for _ in range(4)]
+        tasks = [asyncio.create_task(lookup("soap", response=r)) for r in responses[:3]]
+        tasks.append(asyncio.create_task(lookup("soap", page=2, response=responses[3])))
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks), responses
+
+    results, responses = asyncio.run(run())
+    assert calls == [("soap", 1), ("soap", 2)]
+    assert results[:3] == [{"q": "soap", "page": 1}] * 3
+    assert [r.headers.get("X-Rows") for r in responses] == ["soap"] * 4
+    # CORS headers stay with the caller they were set for
+    assert [r.headers.get("Access-Control-Allow-Origin") for r in responses[1:3]] == [None, None]
+    stats = flight.stats()
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (2, 2, 0)
+
+
+def test_followers_get_the_leaders_error(flight):
+    calls = []
+
+    async def run():
+        gate = asyncio.Event()
+        lookup = _endpoint(calls, gate, fail=True)
+        tasks = [asyncio.create_task(lookup("oil", response=Response())) for _ in range(3)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()["endpoints"]["test_singleflight.lookup"]["errors"] == 1
+
+
+def test_a_cancelled_leader_hands_over_to_a_follower(flight):
+    calls = []
+
+    async def run():
+        gate = asyncio.Event()
+        lookup = _endpoint(calls, gate)
+        leader = asyncio.create_task(lookup("rice", response=Response()))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(lookup("rice", response=Response()))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        gate.set()
+        return await follower
+
+    assert asyncio.run(run()) == {"q": "rice", "page": 1}
+    assert calls == [("rice", 1), ("rice", 1)]
+
+
+def test_calls_with_unhashable_arguments_run_alone(flight):
+    seen = []
+
+    @coalesce
+    async def owned(q: str, owner: dict):
+        seen.append(q)
+        await asyncio.sleep(0)
+        return q
+
+    async def run():
+        return await asyncio.gather(*(owned("x", {"id": 1}) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["x"] * 3
+    assert len(seen) == 3 and flight.stats()["executions"] == 0
+
+
+def test_metrics_report_single_flight(client):
+    assert "single_flight" in client.get("/api/metrics").json()
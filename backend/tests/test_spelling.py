@@ -0,0 +1,44 @@
+from urllib.parse import unquote
+
+from app.core.spelling import SpellDictionary, edit_distance
+
+
+def test_edit_distance_counts_transpositions_and_stops_early():
+    assert edit_distance("masala", "msaala", 2) == 1
+    assert edit_distance("atta", "attaa", 2) == 1
+    assert edit_distance("biscuit", "bsicuti", 2) == 2
+    assert edit_distance("ghee", "butter", 2) == 3
+
+
+def test_corrections_prefer_distance_then_frequency():
+    spell = SpellDictionary()
+    for text in ("basmati rice", "rice bran oil", "ricotta", "spice mix"):
+        spell.add_text(text)
+    spell.add_word("rich", count=5)
+    assert spell.correct_word("basmti") == "basmati"
+    # "rice" and "rich" are both one edit away, the more frequent wins
+    assert spell.correct_word("ricw") == "rich"
+    assert spell.correct_word("brna") == "bran"
+    assert spell.suggest("basmti  rice") == "basmati rice"
+    assert spell.suggest("rice bran") is None
+
+
+def test_short_words_and_quantities_are_left_alone():
+    spell = SpellDictionary()
+    spell.add_text("milk powder 500g")
+    assert len(spell) == 2
+    # two edits is too many for a four-letter word
+    assert spell.correct_word("mlik") == "milk"
+    assert spell.correct_word("mxyk") == "mxyk"
+    assert spell.correct_word("5000g") == "5000g"
+    assert spell.suggest("powdr 500gm") == "powder 500gm"
+
+
+def test_search_suggests_a_correction_for_sparse_results(client, make_shop, make_product):
+    make_product(make_shop(), "Zanthorix Pickle")
+    resp = client.get("/api/search/products", params={"q": "zanthorix pikkle"})
+    assert resp.status_code == 200
+    assert unquote(resp.headers["X-Search-Suggestion"]) == "zanthorix pickle"
+    body = client.get("/api/search/products", params={"q": "zanthorix pikkle instock", "limit": 5}).json()
+    assert body["suggestion"] == "zanthorix pickle instock"
+    assert "X-Search-Suggestion" not in client.get("/api/search/products", params={"q": "zanthorix pickle"}).headers
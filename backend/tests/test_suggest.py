@@ -0,0 +1,76 @@
+import random
+import uuid
+
+from app.core import suggest as suggest_mod
+from app.core.suggest import PrefixIndex
+
+
+def _texts(hits):
+    return [text for text, _, _ in hits]
+
+
+def test_completions_come_heaviest_first_and_respect_kinds():
+    index = PrefixIndex()
+    index.build([
+        ("Surf Excel", "product", 5), ("Surf", "brand", 9), ("Sunfeast", "brand", 7),
+        ("Surya Stores", "shop", 1), ("Maggi", "product", 20),
+        # a duplicate name keeps the first spelling and the larger weight
+        ("surf excel ", "product", 8),
+    ])
+    assert index.complete("su", k=10) == [
+        ("Surf", "brand", 9.0), ("Surf Excel", "product", 8.0), ("Sunfeast", "brand", 7.0), ("Surya Stores", "shop", 1.0),
+    ]
+    assert _texts(index.complete("SURF ", k=1)) == ["Surf"]
+    assert _texts(index.complete("su", kinds=("shop",))) == ["Surya Stores"]
+    assert index.complete("", k=5) == index.complete("su", k=0) == []
+
+
+def test_top_k_matches_a_full_sort():
+    rng = random.Random(7)
+    entries = [(f"{rng.choice('abc')}{rng.choice('abc')}{i}", "product", rng.randint(0, 50)) for i in range(500)]
+    index = PrefixIndex()
+    index.build(entries)
+    for prefix in ("a", "ab", "c", "cc"):
+        expected = sorted((e for e in entries if e[0].startswith(prefix)), key=lambda e: (-e[2], e[0]))[:15]
+        assert [w for _, _, w in index.complete(prefix, k=15)] == [float(w) for _, _, w in expected]
+
+
+def test_added_names_are_found_before_and_after_the_pending_fold(monkeypatch):
+    monkeypatch.setattr(suggest_mod, "_MAX_PENDING", 3)
+    index = PrefixIndex()
+    index.build([("Tea Gold", "product", 2)])
+    index.add("Tea Bags", "product", 5)
+    assert _texts(index.complete("tea")) == ["Tea Bags", "Tea Gold"]
+    for name in ("Tea Leaf", "Tea Masala", "Tea Rusk"):
+        index.add(name, "product")
+    assert index._pending == {}
+    assert len(index) == 5
+    assert _texts(index.complete("tea", k=2)) == ["Tea Bags", "Tea Gold"]
+
+
+def test_bump_reorders_in_place():
+    index = PrefixIndex()
+    index.build([("Dal Makhani", "product", 3), ("Dal Tadka", "product", 1)])
+    index.add("Dal Fry", "product")
+    for _ in range(3):
+        index.bump("dal  tadka")
+    index.bump("Dal Fry", amount=10)
+    assert index.complete("dal") == [
+        ("Dal Fry", "product", 10.0), ("Dal Tadka", "product", 4.0), ("Dal Makhani", "product", 3.0),
+    ]
+
+
+def test_searches_raise_the_suggestion_weight(client, make_shop, make_product, sql):
+    name = f"Qorvex {uuid.uuid4().hex[:6]}"
+    make_product(make_shop(), name, brand="Qorvexco")
+    (uid,) = sql("SELECT lower(hex(user_id)) FROM Users LIMIT 1")[0]
+
+    def score():
+        hits = client.get("/api/search/suggest", params={"prefix": name, "kind": "product"}).json()
+        return [h["score"] for h in hits if h["text"] == name][0]
+
+    before = score()
+    assert client.get("/api/search/products", params={"q": name, "user_id": uid}).status_code == 200
+    assert score() == before + 1
+    kinds = {h["kind"] for h in client.get("/api/search/suggest", params={"prefix": "qorvex", "kind": "brand"}).json()}
+    assert kinds == {"brand"}
@@ -0,0 +1,61 @@
+from app.core.synonyms import SynonymTable
+from app.db.fts import build_match
+
+
+def _table():
+    table = SynonymTable()
+    table.load_lines([
+        "# comment",
+        "[synonyms]",
+        "curd, dahi, yogurt",
+        "okra, bhindi, lady finger  # trailing comment",
+        "dahi, mishti doi",
+        "lonely",
+        "[units]",
+        "kg, kilo = 1000 g",
+        "g, gm, gram = 1 g",
+        "l, litre = 1000 ml",
+        "ml = 1 ml",
+        "bad line",
+    ])
+    return table
+
+
+def _slots(table, text):
+    return table.expand(text.split())
+
+
+def test_groups_take_the_longest_term_and_merge_overlaps():
+    table = _table()
+    assert sorted(table.terms()) == ["bhindi", "curd", "dahi", "lady finger", "mishti doi", "okra", "yogurt"]
+    assert _slots(table, "lady finger fresh") == [
+        ((("okra",), ("bhindi",), ("lady", "finger")), False), ((("fresh",),), False),
+    ]
+    # "dahi" is in both groups and keeps the union
+    assert _slots(table, "dahi")[0][0] == (("curd",), ("dahi",), ("yogurt",), ("mishti", "doi"))
+    assert _slots(table, "curd")[0][0] == (("curd",), ("dahi",), ("yogurt",))
+
+
+def test_quantities_expand_to_every_whole_spelling():
+    table = _table()
+    alts, exact = _slots(table, "1kg")[0]
+    assert exact and {("1kg",), ("1", "kg"), ("1000g",), ("1000", "g")} <= set(alts)
+    for spelled in ("1 kilo", "1000 gm"):
+        assert {("1000g",), ("1kg",)} <= set(_slots(table, spelled)[0][0]), spelled
+    assert ("500ml",) in _slots(table, "0.5l")[0][0]
+    # unknown units and bare numbers stay plain tokens
+    assert _slots(table, "5 pcs") == [((("5",),), False), ((("pcs",),), False)]
+
+
+def test_match_expression_uses_the_shipped_file(client):
+    # the app loads app/data/search_synonyms.txt at startup
+    match = build_match("dahi 1kg")
+    assert match.startswith('("curd"* OR "dahi"* OR "yogurt"*')
+    assert '"1kg"' in match and '"1000g"' in match and '"1000g"*' not in match
+
+
+def test_search_finds_products_by_synonym_and_unit(client, make_shop, make_product):
+    shop = make_shop()
+    yogurt = make_product(shop, "Creamvale Yogurt 1000g")
+    for q in ("creamvale dahi", "creamvale curd 1 kg"):
+        assert yogurt in [p["product_id"] for p in client.get("/api/search/products", params={"q": q}).json()], q
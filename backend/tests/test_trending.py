@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from app.core.trending import TrendingEngine
+
+HOUR = 3600.0
+
+
+def test_scores_halve_every_half_life():
+    engine = TrendingEngine(half_life_hours=2.0)
+    t = engine.t0
+    engine.record("a", now=t)
+    assert engine.score("a", now=t) == pytest.approx(1.0)
+    assert engine.score("a", now=t + 2 * HOUR) == pytest.approx(0.5)
+    assert engine.score("a", now=t + 4 * HOUR) == pytest.approx(0.25)
+
+
+def test_recent_searches_outrank_older_ones():
+    engine = TrendingEngine(half_life_hours=1.0)
+    t = engine.t0
+    for _ in range(3):
+        engine.record("old", now=t)
+    engine.record("new", now=t + 2 * HOUR)
+    engine.record("new", now=t + 2 * HOUR)
+    assert [pid for pid, _ in engine.top(2, now=t + 2 * HOUR)] == ["new", "old"]
+
+
+def test_landmark_rebase_keeps_scores():
+    engine = TrendingEngine(half_life_hours=1.0)
+    t = engine.t0
+    engine.record("a", now=t)
+    later = t + 100 * HOUR  # far enough to force a rebase on the next record
+    before = engine.score("a", now=later)
+    engine.record("b", now=later)
+    assert engine.t0 == later
+    assert engine.score("a", now=later) == pytest.approx(before)
+    assert engine.score("b", now=later) == pytest.approx(1.0)
+
+
+def test_city_scopes_and_among_filter():
+    engine = TrendingEngine()
+    engine.record("a", cities=["Indore", "indore "])
+    engine.record("b", cities=["Bhopal"])
+    assert [pid for pid, _ in engine.top(5, city="INDORE")] == ["a"]
+    assert {pid for pid, _ in engine.top(5)} == {"a", "b"}
+    assert [pid for pid, _ in engine.top(5, among={"b"})] == ["b"]
+
+
+def test_persisted_scores_reload_decayed():
+    engine = TrendingEngine(half_life_hours=1.0)
+    t = engine.t0
+    engine.record("a", now=t)
+    rows = engine.drain_dirty(now=t + HOUR)
+    assert engine.drain_dirty() == []
+    reloaded = TrendingEngine(half_life_hours=1.0)
+    for scope, pid, score, updated_at in rows:
+        reloaded.load(scope, pid, score, updated_at)
+    assert reloaded.score("a", now=t + 2 * HOUR) == pytest.approx(0.25)
+
+
+def test_recorded_searches_show_up_in_trending(client, make_shop, make_product, sql, monkeypatch):
+    from app.db.history_writer import history_writer
+
+    monkeypatch.setattr(history_writer, "flush_seconds", 0.01)
+    pid = make_product(make_shop(city="Trendpur"), "Brightwick Candle")
+    (uid,) = sql("SELECT lower(hex(user_id)) FROM Users LIMIT 1")[0]
+    for _ in range(50):
+        assert client.get("/api/search/products", params={"q": "brightwick candle", "user_id": uid}).status_code == 200
+
+    def top(**params):
+        return [p["product_id"] for p in client.get("/api/search/trending", params=params).json()]
+
+    # the hits are credited when the write-behind queue flushes, not during the request
+    for _ in range(200):
+        if top(city="trendpur"):
+            break
+        time.sleep(0.01)
+    assert top(city="trendpur") == [pid]
+    assert pid in top(limit=5)
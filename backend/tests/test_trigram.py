@@ -0,0 +1,63 @@
+import uuid
+
+from app.core.trigram import TrigramIndex, similarity
+from app.db.session import load_search_indexes
+
+
+def test_index_finds_typos_and_respects_kinds():
+    index = TrigramIndex()
+    index.add("product", 1, "Surf Excel")
+    index.add("brand", 1, "Unilever")
+    index.add("shop", 2, "Surf Point")
+    hits = index.search("surf exel", kinds=("product",))
+    assert [key for _, key, _, _ in hits] == [1]
+    index.remove("product", 1)
+    assert index.search("surf exel", kinds=("product",)) == []
+    assert similarity("maggi", "maggi") == 1.0
+
+
+def test_search_limit_none_returns_every_candidate():
+    index = TrigramIndex()
+    for i in range(300):
+        index.add("shop", i, f"Kirana {i}")
+    assert len(index.search("kirana", limit=200)) == 200
+    assert len(index.best_scores("kirana", kinds=("shop",), limit=None)) == 300
+
+
+def test_shop_search_keeps_substring_matches(client, make_shop):
+    sid, _ = make_shop(name="Bhuvanesh Kirana Bhandar")
+    # "ran" shares too few trigrams with the name to be a fuzzy candidate
+    assert sid in [s["shop_id"] for s in client.get("/api/search/shops", params={"q": "ran"}).json()]
+    assert sid in [s["shop_id"] for s in client.get("/api/search/shops", params={"q": "bhuvnesh kirana"}).json()]
+
+
+def test_shop_search_pages_past_candidate_limit(client, sql):
+    tag = uuid.uuid4().hex[:6]
+    for i in range(230):
+        sid = uuid.uuid4().bytes
+        sql("INSERT INTO Shops (shop_id, shop_name, created_at) VALUES (?, ?, CURRENT_TIMESTAMP)", (sid, f"Zq{tag} Mart {i}"))
+        sql("INSERT INTO Shop_Address (address_id, shop_id, city) VALUES (randomblob(16), ?, 'Testpur')", (sid,))
+    client.portal.call(load_search_indexes)
+    seen, cursor = [], None
+    while True:
+        params = {"q": f"zq{tag} mart", "limit": 100}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/search/shops", params=params).json()
+        seen += [s["shop_id"] for s in body["items"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 230
+
+
+def test_created_products_join_the_in_memory_indexes(client, make_shop, make_product):
+    shop = make_shop()
+    make_product(shop, "Quillotine Masala", brand="Brandoza")
+    resp = client.post("/api/products/", headers=shop[1], json={"product_name": "Verbanox Pickle"})
+    assert resp.status_code == 200, resp.text
+    for prefix, name in (("quillo", "Quillotine Masala"), ("verbano", "Verbanox Pickle")):
+        assert name in [s["text"] for s in client.get("/api/search/suggest", params={"prefix": prefix}).json()]
+    # a typo the FTS prefix match misses
+    names = [p["product_name"] for p in client.get("/api/search/products", params={"q": "quilotine"}).json()]
+    assert "Quillotine Masala" in names
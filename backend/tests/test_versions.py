@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from app.core.versions import EntityVersions, bump_version
+
+
+@pytest.fixture
+def statements(client):
+    from app.db.session import engine
+
+    seen = []
+
+    def count(*args):
+        seen.append(args[2])
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    yield seen
+    event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+
+def test_tags_name_the_entity():
+    versions = EntityVersions()
+    pid = uuid.uuid4().bytes
+    assert versions.etag("product", pid) == versions.etag("product", pid.hex().upper())
+    assert versions.etag("product", pid) != versions.etag("product", uuid.uuid4().bytes)
+    assert pid.hex() in versions.etag("product", pid)
+    before = versions.etag("shops")
+    versions.bump("shops")
+    assert versions.etag("shops") != before
+
+
+def test_both_product_routes_answer_304_from_memory(client, make_shop, make_product, statements):
+    pid = make_product(make_shop(), "Etagly Lamp")
+    first = client.get(f"/api/products/id/{pid}")
+    alias = client.get(f"/api/products/{pid}")
+    assert first.status_code == alias.status_code == 200
+    etag = first.headers["ETag"]
+    assert alias.headers["ETag"] == etag and pid in etag
+
+    statements.clear()
+    for url in (f"/api/products/id/{pid}", f"/api/products/{pid.upper()}"):
+        resp = client.get(url, headers={"If-None-Match": etag})
+        assert resp.status_code == 304 and resp.headers["ETag"] == etag
+    assert statements == []
+
+
+def test_a_tag_never_answers_for_another_product(client, make_shop, make_product):
+    shop = make_shop()
+    a, b = make_product(shop, "Etagly Rug"), make_product(shop, "Etagly Mat")
+    tag_a = client.get(f"/api/products/id/{a}").headers["ETag"]
+    resp = client.get(f"/api/products/{b}", headers={"If-None-Match": tag_a})
+    assert resp.status_code == 200 and resp.json()["product_id"] == b
+    assert resp.headers["ETag"] != tag_a
+    for missing in (uuid.uuid4().hex, "12345"):
+        for header in (tag_a, "*"):
+            assert client.get(f"/api/products/id/{missing}", headers={"If-None-Match": header}).status_code == 404
+            assert client.get(f"/api/products/{missing}", headers={"If-None-Match": header}).status_code == 404
+
+
+def test_a_write_retires_the_tag(client, make_shop, make_product):
+    pid = make_product(make_shop(), "Etagly Clock")
+    etag = client.get(f"/api/products/id/{pid}").headers["ETag"]
+    bump_version("product", bytes.fromhex(pid))
+    # even "*" has to go back to the endpoint until the product is read again
+    resp = client.get(f"/api/products/{pid}", headers={"If-None-Match": "*"})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+    assert client.get(f"/api/products/id/{pid}", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304